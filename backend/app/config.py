@@ -13,8 +13,54 @@ class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 60 * 24 * 7  # 7 days
     
+    # Cache de usuários autenticados (token -> usuário)
+    auth_cache_ttl_seconds: int = 60
+    auth_cache_max_entries: int = 1000
+    
+    # Armazenamento das fotos: "cloudinary" ou "local" (disco, servido em /media)
+    storage_backend: str = "cloudinary"
+    local_storage_dir: str = "media"
+    local_storage_url: str = "/media"  # ou URL absoluta, ex: https://api.exemplo.com/media
+    
     # Cloudinary
     cloudinary_url: str = ""
+    upload_max_workers: int = 4  # uploads simultâneos (demais aguardam na fila)
+    upload_max_bytes: int = 15 * 1024 * 1024  # tamanho máximo de cada foto
+    
+    # Processamento das fotos antes do upload (redimensiona, recomprime, remove EXIF)
+    imagem_processar: bool = True
+    imagem_max_dimensao: int = 1600  # maior lado, em pixels
+    imagem_qualidade: int = 80
+    imagem_formato: str = "JPEG"  # JPEG ou WEBP
+    imagem_processos: int = 2  # processos do pool (Pillow segura o GIL)
+    imagem_thumb_dimensao: int = 320  # miniaturas exibidas nos detalhes da O.S
+    
+    # Fotos enviadas pelo bot como file_id do Telegram (baixadas em background)
+    telegram_bot_token: str = ""
+    telegram_api_url: str = "https://api.telegram.org"
+    fotos_telegram_intervalo_seconds: int = 5  # busca de pendentes / base do backoff
+    fotos_telegram_tentativas: int = 8  # depois disso a foto fica como "falhou"
+    fotos_telegram_simultaneas: int = 4
+    
+    # POST /os/batch: máximo de O.S por requisição
+    os_batch_max_itens: int = 500
+    
+    # Rotas de leitura async (asyncpg / aiosqlite) em vez do threadpool
+    db_async: bool = False
+    
+    # Threads para rotas/dependências sync (padrão do Starlette: 40)
+    threadpool_size: int = 40
+    
+    # Saúde do banco: circuit breaker do get_db e monitor em background
+    db_breaker_failure_threshold: int = 5
+    db_breaker_reset_seconds: int = 30
+    db_health_interval_seconds: int = 30
+    
+    # Cache do dashboard (segundos)
+    dashboard_cache_ttl_seconds: int = 15
+    
+    # Conferência dos rollups do dashboard contra as O.S (0 desliga)
+    rollup_verificacao_seconds: int = 600
     
     # API
     api_host: str = "0.0.0.0"
@@ -1,4 +1,9 @@
+import asyncio
+import threading
+import time
+from typing import Optional
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import get_settings
@@ -35,6 +40,122 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def _url_async(url: str) -> str:
+    """Same database, async driver: asyncpg (Postgres) / aiosqlite (local)"""
+    esquema, _, resto = url.partition("://")
+    if esquema.startswith("postgres"):
+        return f"postgresql+asyncpg://{resto}"
+    if esquema.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{resto}"
+    return url
+
+
+# Engine assíncrono opcional (DB_ASYNC=true), usado pelas rotas de leitura async
+async_engine = None
+AsyncSessionLocal = None
+if settings.db_async:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    
+    async_kwargs = dict(engine_kwargs)
+    if is_postgres:
+        # Pooler do Supabase em modo transação (porta 6543) não suporta os
+        # prepared statements que o asyncpg mantém por conexão
+        async_kwargs["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    
+    async_engine = create_async_engine(_url_async(settings.database_url), **async_kwargs)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the database is unreachable.
+    
+    - closed: requests go through; consecutive connection errors are counted
+    - open: after `limite_falhas` errors get_db answers 503 without touching
+      the pool (no request waits on a connect timeout)
+    - half-open: after `reset_segundos` one request is let through as a
+      trial; the health monitor closes the breaker as soon as a ping succeeds
+    """
+    
+    def __init__(self, limite_falhas: int, reset_segundos: float):
+        self.limite_falhas = limite_falhas
+        self.reset_segundos = reset_segundos
+        self._lock = threading.Lock()
+        self._falhas = 0
+        self._aberto_desde: Optional[float] = None
+        self._testando = False
+        self.ultimo_erro: Optional[str] = None
+    
+    @property
+    def aberto(self) -> bool:
+        return self._aberto_desde is not None
+    
+    def permitir(self) -> bool:
+        """True if a request may use the database now"""
+        with self._lock:
+            if self._aberto_desde is None:
+                return True
+            if not self._testando and time.monotonic() - self._aberto_desde >= self.reset_segundos:
+                self._testando = True
+                return True
+            return False
+    
+    def registrar_sucesso(self) -> None:
+        with self._lock:
+            if self._aberto_desde is not None:
+                print("[OK] Conexao com o banco restabelecida")
+            self._falhas = 0
+            self._aberto_desde = None
+            self._testando = False
+    
+    def registrar_falha(self, erro: Exception) -> None:
+        with self._lock:
+            self._falhas += 1
+            self.ultimo_erro = str(erro).splitlines()[0] if str(erro) else type(erro).__name__
+            if self._testando or (self._aberto_desde is None and self._falhas >= self.limite_falhas):
+                if self._aberto_desde is None:
+                    print(f"[AVISO] Banco indisponivel, circuito aberto: {self.ultimo_erro}")
+                self._aberto_desde = time.monotonic()
+            self._testando = False
+    
+    def estado(self) -> dict:
+        with self._lock:
+            if self._aberto_desde is None:
+                estado = "closed"
+            else:
+                estado = "half_open" if self._testando else "open"
+            return {"state": estado, "consecutive_failures": self._falhas, "last_error": self.ultimo_erro}
+
+
+db_breaker = CircuitBreaker(
+    limite_falhas=settings.db_breaker_failure_threshold,
+    reset_segundos=settings.db_breaker_reset_seconds,
+)
+
+
+def _erro_de_conexao(erro: Exception) -> bool:
+    """
+    Errors that mean the database (not the query) is the problem: the
+    connection dropped (connection_invalidated) or could not be opened at
+    all (raised outside any statement).
+    
+    Lock waits, deadlocks and serialization failures are OperationalError
+    too, but only mean write contention and must not open the breaker.
+    """
+    if not isinstance(erro, DBAPIError):
+        return False
+    return erro.connection_invalidated or erro.statement is None
+
+
+def _indisponivel(detalhe: str):
+    from fastapi import HTTPException, status
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"Erro ao conectar ao banco de dados: {detalhe}. Verifique sua conexão com a internet e o DATABASE_URL.",
+        headers={"Retry-After": str(int(settings.db_breaker_reset_seconds))},
+    )
+
+
 def get_db():
     """
     Dependency to get database session.
@@ -42,21 +163,68 @@ def get_db():
         @app.get("/items")
         def read_items(db: Session = Depends(get_db)):
             ...
+    
+    No per-request probe: stale connections are caught by pool_pre_ping on
+    checkout, and outages by the circuit breaker + background health monitor.
     """
-    db = None
+    if not db_breaker.permitir():
+        raise _indisponivel(f"circuito aberto ({db_breaker.ultimo_erro})")
+    
+    db = SessionLocal()
     try:
-        db = SessionLocal()
-        # Test connection
-        db.execute(text("SELECT 1"))
         yield db
     except Exception as e:
-        if db:
-            db.close()
-        from fastapi import HTTPException, status
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Erro ao conectar ao banco de dados: {str(e)}. Verifique sua conexão com a internet e o DATABASE_URL."
-        )
+        if _erro_de_conexao(e):
+            db_breaker.registrar_falha(e)
+            raise _indisponivel(str(e).splitlines()[0]) from e
+        # HTTPException and application errors propagate unchanged
+        raise
+    else:
+        db_breaker.registrar_sucesso()
     finally:
-        if db:
-            db.close()
+        db.close()
+
+
+async def get_async_db():
+    """
+    Async counterpart of get_db (DB_ASYNC=true): yields an AsyncSession.
+    
+    Routes run their sync query code through `await db.run_sync(...)`, so
+    the same helpers serve both modes without holding a threadpool slot.
+    """
+    if not db_breaker.permitir():
+        raise _indisponivel(f"circuito aberto ({db_breaker.ultimo_erro})")
+    
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            if _erro_de_conexao(e):
+                db_breaker.registrar_falha(e)
+                raise _indisponivel(str(e).splitlines()[0]) from e
+            raise
+        else:
+            db_breaker.registrar_sucesso()
+
+
+def verificar_conexao() -> bool:
+    """Ping the database once and feed the result to the circuit breaker"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        db_breaker.registrar_falha(e)
+        return False
+    db_breaker.registrar_sucesso()
+    return True
+
+
+async def monitorar_conexao(intervalo: float) -> None:
+    """
+    Background health monitor (started in the lifespan): one ping per
+    interval instead of one per request; pings every second while the
+    circuit is open so it closes as soon as the database is back.
+    """
+    while True:
+        await asyncio.sleep(1 if db_breaker.aberto else intervalo)
+        await asyncio.to_thread(verificar_conexao)
@@ -1,12 +1,15 @@
 # Fixed imports for SQLAlchemy text
 from fastapi import FastAPI, status
-from sqlalchemy import text
+from sqlalchemy import text, inspect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+import asyncio
+import anyio
 import os
 import time
+from urllib.parse import urlparse
 
 # Set Timezone to Brazil/Brasilia
 os.environ['TZ'] = 'America/Sao_Paulo'
@@ -16,10 +19,16 @@ if hasattr(time, 'tzset'):
 from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
 from .config import get_settings
-from .database import engine, Base, SessionLocal
+from .database import engine, async_engine, Base, SessionLocal, db_breaker, monitorar_conexao
 from .models.user import User
 from .services.auth_service import hash_password
-from .routes import auth, os as os_routes, relatorios, usuarios
+from .services.search_service import configurar_indice_busca
+from .services import rollup_service
+from .services.imagem_service import iniciar_pool, encerrar_pool
+from .services.fotos_telegram_service import worker_fotos_telegram
+from .routes import auth, os as os_routes, relatorios, usuarios, fotos
+from .services.storage_service import storage, LocalStorage, MidiaEstatica
+from .middleware import LimiteUploadMiddleware
 from datetime import datetime, timedelta
 
 settings = get_settings()
@@ -71,6 +80,35 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"[AVISO] Aviso ao criar tabelas: {e}")
     
+    # Índices adicionados depois da criação original das tabelas
+    try:
+        with engine.begin() as conn:
+            # Paginação por cursor (criado_em, id) em list_os
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_ordens_servico_criado_em_id ON ordens_servico (criado_em, id);"))
+            # Idempotência dos envios do bot (coluna nova em bancos antigos)
+            if "chave_envio" not in [c["name"] for c in inspect(conn).get_columns("ordens_servico")]:
+                conn.execute(text("ALTER TABLE ordens_servico ADD COLUMN chave_envio VARCHAR(64);"))
+            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_ordens_servico_chave_envio ON ordens_servico (chave_envio);"))
+        print("[OK] Indices verificados/criados!")
+    except Exception as e:
+        print(f"[AVISO] Aviso ao criar indices: {e}")
+    
+    # Índice de busca de O.S (tsvector/pg_trgm ou FTS5)
+    try:
+        configurar_indice_busca(engine)
+        print("[OK] Indice de busca verificado!")
+    except Exception as e:
+        print(f"[AVISO] Aviso ao configurar indice de busca: {e}")
+    
+    # Rollups do dashboard: backfill na primeira subida após a atualização e
+    # reparo se escritas fora das rotas (scripts, SQL manual) os desalinharam
+    try:
+        processadas = rollup_service.conferir()
+        if processadas is not None:
+            print(f"[OK] Rollups do dashboard reconstruidos ({processadas} O.S)")
+    except Exception as e:
+        print(f"[AVISO] Aviso ao reconstruir rollups do dashboard: {e}")
+    
     # Garante que usuários padrão existem
     db = SessionLocal()
     try:
@@ -110,7 +148,34 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
     
+    # Tamanho do threadpool das rotas/dependências sync
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+    
+    # Processos de imagem sobem agora, não no primeiro upload
+    iniciar_pool()
+    
+    # Monitor de saúde do banco (substitui o SELECT 1 por requisição)
+    monitor = asyncio.create_task(monitorar_conexao(settings.db_health_interval_seconds))
+    
+    # Fotos que o bot enviou como file_id do Telegram
+    fotos_telegram = asyncio.create_task(worker_fotos_telegram()) if settings.telegram_bot_token else None
+    
+    # Conferência periódica dos rollups do dashboard contra COUNT(*) das O.S
+    rollups = (
+        asyncio.create_task(rollup_service.monitorar_rollups(settings.rollup_verificacao_seconds))
+        if settings.rollup_verificacao_seconds else None
+    )
+    
     yield
+    
+    monitor.cancel()
+    if rollups:
+        rollups.cancel()
+    if fotos_telegram:
+        fotos_telegram.cancel()
+    encerrar_pool()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -122,6 +187,9 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Limite de upload (413 antes de receber o corpo); CORS envolve esta resposta
+app.add_middleware(LimiteUploadMiddleware, max_bytes=settings.upload_max_bytes)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -129,6 +197,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Has-More", "ETag"],
 )
 
 # Define API endpoints BEFORE mounting frontend (order matters!)
@@ -147,7 +216,7 @@ def api_status():
 @app.get("/health", status_code=status.HTTP_200_OK)
 def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
+    return {"status": "healthy", "database": db_breaker.estado()}
 
 
 @app.get("/keepalive", status_code=status.HTTP_200_OK)
@@ -480,9 +549,20 @@ def fix_bot():
 
 # Include routers (after root endpoints, before frontend)
 app.include_router(auth.router, prefix="/api/v1")
+if settings.db_async:
+    # Leituras no engine async; têm prioridade sobre as rotas sync equivalentes
+    app.include_router(os_routes.async_router, prefix="/api/v1", include_in_schema=False)
+    app.include_router(relatorios.async_router, prefix="/api/v1", include_in_schema=False)
+    app.include_router(usuarios.async_router, prefix="/api/v1", include_in_schema=False)
 app.include_router(os_routes.router, prefix="/api/v1")
 app.include_router(relatorios.router, prefix="/api/v1")
 app.include_router(usuarios.router, prefix="/api/v1")
+app.include_router(fotos.router, prefix="/api/v1")
+
+# Fotos do armazenamento local (STORAGE_BACKEND=local), antes do frontend
+if isinstance(storage, LocalStorage):
+    app.mount(urlparse(storage.url_base).path, MidiaEstatica(directory=storage.diretorio), name="media")
+    print(f"[OK] Fotos servidas de: {storage.diretorio}")
 
 # Serve Static Files (Frontend) - MUST be last to not catch API routes
 # Calculate absolute path to frontend directory
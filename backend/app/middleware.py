@@ -0,0 +1,38 @@
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+# Campos do formulário (observacoes...) e delimitadores do multipart
+MARGEM_MULTIPART = 64 * 1024
+
+
+class LimiteUploadMiddleware:
+    """
+    Reject multipart uploads whose Content-Length exceeds the limit with 413,
+    before the body is received and spooled.
+    
+    Requests without Content-Length (chunked) are checked by upload_image.
+    """
+    
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("POST", "PUT", "PATCH"):
+            headers = dict(scope["headers"])
+            tipo = headers.get(b"content-type", b"")
+            tamanho = headers.get(b"content-length", b"")
+            if (
+                tipo.startswith(b"multipart/form-data")
+                and tamanho.isdigit()
+                and int(tamanho) > self.max_bytes + MARGEM_MULTIPART
+            ):
+                resposta = JSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={"detail": f"Arquivo muito grande. Máximo: {self.max_bytes // 1024} KB"},
+                    headers={"Connection": "close"},
+                )
+                await resposta(scope, receive, send)
+                return
+        
+        await self.app(scope, receive, send)
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, Date, Float, UniqueConstraint
+from ..database import Base
+
+
+class DashboardRollup(Base):
+    """
+    Pre-aggregated dashboard counters.
+    
+    One row per (dia, status, cidade, motivo, tipo_os, técnico executor),
+    kept up to date by the OS routes. Missing dimensions are stored as ''
+    / 0 so the unique key also deduplicates them.
+    """
+    
+    __tablename__ = "dashboard_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    
+    # Dimensões
+    dia = Column(Date, nullable=False)  # Dia de criação da O.S
+    status = Column(String(20), nullable=False)
+    cidade = Column(String(100), nullable=False, default="")
+    motivo_abertura = Column(String(50), nullable=False, default="")
+    tipo_os = Column(String(20), nullable=False, default="normal")
+    tecnico_executor_id = Column(Integer, nullable=False, default=0)
+    
+    # Medidas
+    total = Column(Integer, nullable=False, default=0)
+    soma_espera_min = Column(Float, nullable=False, default=0)
+    qtd_espera = Column(Integer, nullable=False, default=0)
+    soma_execucao_min = Column(Float, nullable=False, default=0)
+    qtd_execucao = Column(Integer, nullable=False, default=0)
+    soma_total_min = Column(Float, nullable=False, default=0)
+    qtd_total = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint(
+            "dia", "status", "cidade", "motivo_abertura", "tipo_os", "tecnico_executor_id",
+            name="uq_dashboard_rollups_chave"
+        ),
+    )
+    
+    def __repr__(self):
+        return f"<DashboardRollup(dia={self.dia}, status='{self.status}', total={self.total})>"
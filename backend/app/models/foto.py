@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from ..database import Base
+
+
+class Foto(Base):
+    """Stored photo, keyed by the SHA-256 of the uploaded bytes (dedup index)"""
+    
+    __tablename__ = "fotos"
+    
+    sha256 = Column(String(64), primary_key=True)
+    url = Column(String, nullable=False)
+    tamanho = Column(Integer)  # bytes recebidos (antes do processamento)
+    criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<Foto(sha256='{self.sha256[:12]}', url='{self.url}')>"
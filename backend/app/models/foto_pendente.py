@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
+from datetime import datetime
+from ..database import Base
+
+
+class FotoPendente(Base):
+    """OS photo sent by the bot as a Telegram file_id, waiting to be fetched and stored"""
+    
+    __tablename__ = "fotos_pendentes"
+    
+    id = Column(Integer, primary_key=True)
+    os_id = Column(Integer, ForeignKey("ordens_servico.id", ondelete="CASCADE"), nullable=False)
+    campo = Column(String(30), nullable=False)  # foto_power_meter, foto_caixa ou print_os_cliente
+    file_id = Column(String(255), nullable=False)
+    
+    # Tentativas do worker (backoff exponencial até o limite)
+    tentativas = Column(Integer, default=0, nullable=False)
+    proxima_tentativa = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    ultimo_erro = Column(Text, nullable=True)
+    criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("os_id", "campo", name="uq_fotos_pendentes_os_campo"),
+    )
+    
+    def __repr__(self):
+        return f"<FotoPendente(os_id={self.os_id}, campo='{self.campo}', tentativas={self.tentativas})>"
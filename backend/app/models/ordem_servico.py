@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, Text, DateTime, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, Numeric, Text, DateTime, ForeignKey, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from typing import Optional
@@ -67,6 +67,12 @@ class OrdemServico(Base):
     # Observações
     observacoes = Column(Text, nullable=True)
     
+    # Texto desnormalizado para a busca (numero, cidade, pppoe, técnicos...)
+    busca_texto = Column(Text, nullable=True)
+    
+    # Chave de idempotência enviada pelo bot: reenvios não duplicam a O.S
+    chave_envio = Column(String(64), nullable=True)
+    
     # Constraints
     __table_args__ = (
         CheckConstraint(
@@ -77,6 +83,9 @@ class OrdemServico(Base):
             "tipo_os IN ('normal', 'rompimento', 'manutencao')",
             name="check_tipo_os_valido"
         ),
+        # Keyset pagination of list_os (newest first)
+        Index("ix_ordens_servico_criado_em_id", "criado_em", "id"),
+        Index("ix_ordens_servico_chave_envio", "chave_envio", unique=True),
     )
     
     # Relationships
@@ -90,6 +99,8 @@ class OrdemServico(Base):
         foreign_keys=[tecnico_executor_id],
         back_populates="ordens_executadas"
     )
+    # Fotos do bot ainda sendo baixadas do Telegram (removidas junto com a O.S)
+    fotos_pendentes = relationship("FotoPendente", cascade="all, delete-orphan")
     
     def __repr__(self):
         return f"<OrdemServico(numero='{self.numero_os}', status='{self.status}')>"
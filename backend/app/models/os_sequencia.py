@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer
+from ..database import Base
+
+
+class OsSequencia(Base):
+    """Per-year counter used to allocate OS numbers (OS-YYYY-NNN)"""
+    
+    __tablename__ = "os_sequencias"
+    
+    ano = Column(Integer, primary_key=True, autoincrement=False)
+    ultimo_numero = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<OsSequencia(ano={self.ano}, ultimo_numero={self.ultimo_numero})>"
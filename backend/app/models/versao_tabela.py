@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+from ..database import Base
+
+
+class VersaoTabela(Base):
+    """Change counter per table, used to build ETags without reading the rows"""
+    
+    __tablename__ = "versoes_tabela"
+    
+    tabela = Column(String(50), primary_key=True)
+    versao = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<VersaoTabela(tabela='{self.tabela}', versao={self.versao})>"
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, File, Form, UploadFile, status
+from ..models.user import User
+from ..schemas.foto import FotoResponse
+from ..services.auth_service import get_current_user
+from ..services.storage_service import salvar_foto, thumbnail_url
+
+router = APIRouter(prefix="/fotos", tags=["Fotos"])
+
+
+@router.post("", response_model=FotoResponse, status_code=status.HTTP_201_CREATED)
+async def upload_foto(
+    foto: UploadFile = File(...),
+    pasta: str = Form("os-sistema/telegram", pattern=r"^os-sistema(/[a-z0-9_-]+)*$"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Store a photo on the configured backend (Cloudinary or local storage)
+    
+    Used by the Telegram bot before creating an OS; the returned `url` goes in
+    foto_caixa / foto_power_meter / print_os_cliente.
+    """
+    url = await salvar_foto(foto, pasta=pasta)
+    return FotoResponse(url=url, thumb=thumbnail_url(url))
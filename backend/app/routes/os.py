@@ -1,79 +1,127 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile, Form
-from sqlalchemy.orm import Session, aliased
-from sqlalchemy import func, desc, or_
+from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile, Form, Response, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session, joinedload, load_only
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, tuple_, insert, update, case
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
-from datetime import datetime
-from ..database import get_db
+from datetime import datetime, timedelta
+import asyncio
+import base64
+import json
+from ..config import get_settings
+from ..database import get_db, get_async_db, SessionLocal
 from ..models.user import User
 from ..models.ordem_servico import OrdemServico
 from ..schemas.ordem_servico import (
     OrdemServicoCreate,
+    OrdemServicoBatchCreate,
+    OrdemServicoBatchItem,
+    OrdemServicoBatchResponse,
     OrdemServicoResponse,
     OrdemServicoListItem,
     OrdemServicoUpdate,
     OrdemServicoAssumirRequest,
+    OrdemServicoBatchAssumirRequest,
+    OrdemServicoBatchFinalizarRequest,
+    OrdemServicoBatchReatribuirRequest,
+    OrdemServicoBatchTransicaoItem,
+    OrdemServicoBatchTransicaoResponse,
     OrdemServicoFinalizarRequest,
     TecnicoInfo
 )
-from ..services.auth_service import get_current_user, require_role
-from ..services.cloudinary_service import upload_image
+from ..services.auth_service import (
+    get_current_user,
+    get_current_user_async,
+    get_user_from_token,
+    get_user_from_stream_ticket,
+    create_stream_ticket,
+    STREAM_TICKET_SECONDS,
+    require_role
+)
+from ..services.storage_service import salvar_foto, thumbnail_url
+from ..services.fotos_telegram_service import (
+    ERRO_SEM_TOKEN,
+    registrar_fotos_pendentes,
+    registrar_fotos_pendentes_lote,
+    acordar_worker
+)
+from ..services.numero_os_service import reservar_numeros, formatar_numero_os
+from ..services.search_service import aplicar_busca, indexar_os, indexar_lote, remover_indice_os, texto_busca
+from ..services import rollup_service
+from ..services.dashboard_cache import dashboard_cache
+from ..services.eventos_service import event_broker, resumo_os
+from ..services.etag_service import versao_atual, gerar_etag, nao_modificado, incrementar_versao
+
+settings = get_settings()
 
 router = APIRouter(prefix="/os", tags=["Ordens de Serviço"])
 
+# Versões async das rotas de leitura, incluídas antes de `router` com DB_ASYNC=true
+async_router = APIRouter(prefix="/os", tags=["Ordens de Serviço"])
 
-def _generate_numero_os(db: Session) -> str:
-    """Generate next OS number (OS-YYYY-NNN)"""
-    today = datetime.now()
-    year = today.year
-    
-    # Get last OS number for this year
-    last_os = (
-        db.query(OrdemServico)
-        .filter(OrdemServico.numero_os.like(f"OS-{year}-%"))
-        .order_by(desc(OrdemServico.numero_os))
-        .first()
-    )
-    
-    if last_os:
-        # Extract number from OS-YYYY-NNN
-        last_number = int(last_os.numero_os.split("-")[-1])
-        next_number = last_number + 1
-    else:
-        next_number = 1
-    
-    return f"OS-{year}-{next_number:03d}"
+# /os/stream: reconexão sugerida ao EventSource e intervalo do keepalive
+STREAM_RETRY_MS = 3000
+STREAM_KEEPALIVE_SECONDS = 15
 
 
-@router.post("", response_model=OrdemServicoResponse, status_code=status.HTTP_201_CREATED)
-def create_os(
-    os_data: OrdemServicoCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+def _encode_cursor(*partes) -> str:
     """
-    Create a new Ordem de Serviço (Service Order)
+    Opaque pagination cursor.
     
-    This endpoint is typically called by the Telegram bot when a field technician submits a new OS.
+    ("k", criado_em, id) marks a keyset position; ("o", offset) is used for
+    ranked search results, which are not ordered by criado_em.
     """
-    # Verify that the tecnico_campo exists
-    tecnico = db.query(User).filter(User.id == os_data.tecnico_campo_id).first()
-    if not tecnico:
+    raw = "|".join(str(p) for p in partes)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, tipo: str):
+    """Decode a cursor produced by _encode_cursor, checking its kind"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        partes = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        if partes[0] != tipo:
+            raise ValueError(partes[0])
+        if tipo == "k":
+            return datetime.fromisoformat(partes[1]), int(partes[2])
+        return int(partes[1])
+    except Exception:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Técnico de campo não encontrado"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginação inválido"
         )
+
+
+def _notificar_mudanca(tipo: str, os, antes: Optional[dict] = None):
+    """
+    Propagate a committed OS change: drop the cached dashboard and publish a
+    compact event to /os/stream subscribers.
     
-    # Generate OS number
-    numero_os = _generate_numero_os(db)
-    
+    `os` is an OrdemServico or an already built resumo_os() dict; `antes` is
+    the rollup snapshot taken before the change (gives the previous status).
+    """
+    dashboard_cache.invalidate()
+    resumo = os if isinstance(os, dict) else resumo_os(os)
+    event_broker.publicar(tipo, resumo, antes["status"] if antes else None)
+
+
+def _generate_numero_os(db: Session) -> str:
+    """Generate next OS number (OS-YYYY-NNN) from the per-year counter"""
+    year = datetime.now().year
+    return formatar_numero_os(reservar_numeros(db, ano=year), ano=year)
+
+
+def _colunas_nova_os(os_data: OrdemServicoCreate, numero_os: str) -> dict:
+    """Column values of a new OS (shared by create_os and create_os_batch)"""
     # Calcular prazo_fim se não fornecido
     prazo_fim = os_data.prazo_fim
     if os_data.tipo_os in ["rompimento", "manutencao"] and os_data.prazo_horas and not prazo_fim:
-        from datetime import timedelta
         prazo_fim = datetime.utcnow() + timedelta(hours=os_data.prazo_horas)
     
-    # Create OS
-    new_os = OrdemServico(
+    return dict(
         numero_os=numero_os,
         tecnico_campo_id=os_data.tecnico_campo_id,
         foto_power_meter=os_data.foto_power_meter if os_data.foto_power_meter else None,
@@ -91,24 +139,237 @@ def create_os(
         prazo_horas=os_data.prazo_horas,
         prazo_fim=prazo_fim,
         porta_placa_olt=os_data.porta_placa_olt,
+        chave_envio=os_data.chave_envio,
         status="aguardando"
     )
+
+
+def _os_por_chave(db: Session, chave_envio: Optional[str]) -> Optional[OrdemServico]:
+    """OS already created with this idempotency key, if any"""
+    if not chave_envio:
+        return None
+    return db.query(OrdemServico).filter(OrdemServico.chave_envio == chave_envio).first()
+
+
+def _chaves_existentes(db: Session, chaves: set) -> dict:
+    """id and numero_os of the OS already created for each of these keys"""
+    if not chaves:
+        return {}
+    return {
+        chave: {"id": os_id, "numero_os": numero_os}
+        for os_id, numero_os, chave in (
+            db.query(OrdemServico.id, OrdemServico.numero_os, OrdemServico.chave_envio)
+            .filter(OrdemServico.chave_envio.in_(chaves))
+        )
+    }
+
+
+@router.post("", response_model=OrdemServicoResponse, status_code=status.HTTP_201_CREATED)
+def create_os(
+    os_data: OrdemServicoCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create a new Ordem de Serviço (Service Order)
+    
+    This endpoint is typically called by the Telegram bot when a field technician submits a new OS.
+    
+    Resending a `chave_envio` already used returns the existing OS with 200.
+    """
+    existente = _os_por_chave(db, os_data.chave_envio)
+    if existente:
+        response.status_code = status.HTTP_200_OK
+        return _format_os_response(existente)
+    
+    # Verify that the tecnico_campo exists
+    tecnico = db.query(User).filter(User.id == os_data.tecnico_campo_id).first()
+    if not tecnico:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Técnico de campo não encontrado"
+        )
+    
+    # Generate OS number
+    numero_os = _generate_numero_os(db)
+    
+    # Create OS
+    new_os = OrdemServico(**_colunas_nova_os(os_data, numero_os))
+    # Fotos enviadas como file_id do Telegram: colunas "" até o worker salvar
+    if os_data.fotos_telegram:
+        registrar_fotos_pendentes(db, new_os, os_data.fotos_telegram)
     
     db.add(new_os)
-    db.commit()
+    try:
+        db.flush()
+        indexar_os(db, new_os)
+        rollup_service.aplicar(db, None, rollup_service.snapshot(new_os))
+        db.commit()
+    except IntegrityError:
+        # Reenvio simultâneo (ex.: o outbox do bot repete após um timeout):
+        # a outra requisição gravou a chave_envio entre a consulta e o INSERT
+        db.rollback()
+        existente = _os_por_chave(db, os_data.chave_envio)
+        if not existente:
+            raise
+        response.status_code = status.HTTP_200_OK
+        return _format_os_response(existente)
     db.refresh(new_os)
+    _notificar_mudanca("criada", new_os)
+    if os_data.fotos_telegram:
+        acordar_worker()
     
     return _format_os_response(new_os)
 
 
-@router.get("", response_model=List[OrdemServicoListItem])
-def list_os(
+@router.post("/batch", response_model=OrdemServicoBatchResponse)
+def create_os_batch(
+    lote: OrdemServicoBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create many Ordens de Serviço in one transaction (bulk imports, bot backlog)
+    
+    Technicians are checked in one query, the OS numbers come from one
+    contiguous block and the orders go in a single multi-row INSERT.
+    
+    Each order gets a result, in request order: 201 created, 200 when its
+    `chave_envio` was already used (returns that OS), 4xx when rejected.
+    A rejected order doesn't stop the others.
+    """
+    ordens = lote.ordens
+    if len(ordens) > settings.os_batch_max_itens:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {settings.os_batch_max_itens} O.S por lote"
+        )
+    
+    chaves = {o.chave_envio for o in ordens if o.chave_envio}
+    existentes = _chaves_existentes(db, chaves)
+    tecnicos = {
+        u.id: u
+        for u in db.query(User).filter(User.id.in_({o.tecnico_campo_id for o in ordens}))
+    }
+    
+    while True:
+        resultados = [None] * len(ordens)
+        novas = []  # (indice, os_data) a inserir
+        primeira_com_chave = {}  # chave_envio -> indice da ordem do lote que a cria
+        for indice, os_data in enumerate(ordens):
+            chave = os_data.chave_envio
+            if chave in existentes:
+                resultados[indice] = {"status_code": status.HTTP_200_OK, **existentes[chave]}
+            elif chave in primeira_com_chave:
+                continue  # repetida no próprio lote: resolvida depois do INSERT
+            elif os_data.tecnico_campo_id not in tecnicos:
+                resultados[indice] = {"status_code": status.HTTP_404_NOT_FOUND, "detail": "Técnico de campo não encontrado"}
+            elif os_data.fotos_telegram and not settings.telegram_bot_token:
+                resultados[indice] = {"status_code": status.HTTP_400_BAD_REQUEST, "detail": ERRO_SEM_TOKEN}
+            else:
+                if chave:
+                    primeira_com_chave[chave] = indice
+                novas.append((indice, os_data))
+        
+        if not novas:
+            break
+        try:
+            ano = datetime.now().year
+            primeiro = reservar_numeros(db, len(novas), ano=ano)
+            agora = datetime.utcnow()
+        
+            linhas = []
+            for deslocamento, (indice, os_data) in enumerate(novas):
+                linha = _colunas_nova_os(os_data, formatar_numero_os(primeiro + deslocamento, ano))
+                linha["criado_em"] = agora
+                # Fotos enviadas como file_id do Telegram: colunas "" até o worker salvar
+                for campo in os_data.fotos_telegram or {}:
+                    linha[campo] = ""
+                # O.S ainda sem executor: o texto de busca só depende do técnico de campo
+                linha["busca_texto"] = texto_busca(OrdemServico(**linha), tecnicos[os_data.tecnico_campo_id], None)
+                linhas.append(linha)
+        
+            # Um único INSERT de várias linhas (pela Table: o insert do ORM separa as
+            # linhas pelas colunas None). O RETURNING pode vir fora de ordem no SQLite,
+            # então os ids são casados pelo numero_os
+            ids = dict(
+                (numero_os, os_id)
+                for os_id, numero_os in db.execute(
+                    insert(OrdemServico.__table__).returning(OrdemServico.id, OrdemServico.numero_os),
+                    linhas
+                )
+            )
+        
+            criadas = [OrdemServico(id=ids[linha["numero_os"]], **linha) for linha in linhas]
+            indexar_lote(db, [(o.id, o.busca_texto) for o in criadas])
+            rollup_service.aplicar_lote(db, [(None, rollup_service.snapshot(o)) for o in criadas])
+            registrar_fotos_pendentes_lote(db, {
+                nova.id: os_data.fotos_telegram
+                for nova, (_, os_data) in zip(criadas, novas)
+                if os_data.fotos_telegram
+            })
+            # INSERT em massa não passa pelo flush do ORM, que incrementaria a versão (ETag)
+            incrementar_versao(db.connection())
+            db.commit()
+        except IntegrityError:
+            # Outro envio gravou uma das chaves depois da consulta acima: refaz a
+            # separação com as chaves atuais (essas viram 200) e tenta de novo
+            db.rollback()
+            atuais = _chaves_existentes(db, chaves)
+            if atuais.keys() <= existentes.keys():
+                raise
+            existentes = atuais
+            continue
+        break
+    
+    if novas:
+        for nova, (indice, _) in zip(criadas, novas):
+            resultados[indice] = {"status_code": status.HTTP_201_CREATED, "id": nova.id, "numero_os": nova.numero_os}
+            _notificar_mudanca("criada", nova)
+        if any(os_data.fotos_telegram for _, os_data in novas):
+            acordar_worker()
+    
+    for indice, os_data in enumerate(ordens):
+        if resultados[indice] is None:
+            primeira = resultados[primeira_com_chave[os_data.chave_envio]]
+            resultados[indice] = {"status_code": status.HTTP_200_OK, "id": primeira["id"], "numero_os": primeira["numero_os"]}
+    
+    codigos = [r["status_code"] for r in resultados]
+    return OrdemServicoBatchResponse(
+        criadas=codigos.count(status.HTTP_201_CREATED),
+        existentes=codigos.count(status.HTTP_200_OK),
+        rejeitadas=sum(1 for c in codigos if c >= 400),
+        resultados=[OrdemServicoBatchItem(indice=i, **r) for i, r in enumerate(resultados)]
+    )
+
+
+def _filtros_lista(
     tipo_os: Optional[str] = Query(None, description="Filtrar por tipo: normal, rompimento, manutencao"),
     status_filter: Optional[str] = Query(None, description="Filtrar por status"),
     tecnico_executor_id: Optional[int] = Query(None, description="Filtrar por técnico executor"),
     search: Optional[str] = Query(None, description="Buscar em todas as colunas"),
-    limit: int = Query(20, le=200),
+    limit: int = Query(20, ge=1, le=200),
     offset: int = 0,
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor)")
+) -> dict:
+    """Query parameters of list_os (shared by the sync and async routes)"""
+    return dict(
+        tipo_os=tipo_os,
+        status_filter=status_filter,
+        tecnico_executor_id=tecnico_executor_id,
+        search=search,
+        limit=limit,
+        offset=offset,
+        cursor=cursor,
+    )
+
+
+@router.get("", response_model=List[OrdemServicoListItem])
+def list_os(
+    request: Request,
+    response: Response,
+    filtros: dict = Depends(_filtros_lista),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -119,11 +380,54 @@ def list_os(
     - **tecnico_executor_id**: Filter by executor technician
     - **search**: Search in numero_os, cidade, pppoe_cliente, motivo_abertura, tecnico names
     - **limit**: Maximum number of results (max 200, default 20)
-    - **offset**: Pagination offset
+    - **offset**: Pagination offset (legacy; ignored when cursor is given)
+    - **cursor**: Keyset cursor returned in the X-Next-Cursor header of the previous page
+    
+    Pagination state is returned in the `X-Next-Cursor` and `X-Has-More` headers.
+    
+    Sends an ETag; a matching `If-None-Match` gets 304 without running the query.
     """
-    from sqlalchemy import or_
+    return _listar_os(db, request, response, current_user, **filtros)
+
+
+@async_router.get("", response_model=List[OrdemServicoListItem])
+async def list_os_async(
+    request: Request,
+    response: Response,
+    filtros: dict = Depends(_filtros_lista),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """list_os on the async engine (DB_ASYNC=true)"""
+    return await db.run_sync(lambda sync_db: _listar_os(sync_db, request, response, current_user, **filtros))
+
+
+def _listar_os(
+    db: Session,
+    request: Request,
+    response: Response,
+    current_user: User,
+    tipo_os: Optional[str],
+    status_filter: Optional[str],
+    tecnico_executor_id: Optional[int],
+    search: Optional[str],
+    limit: int,
+    offset: int,
+    cursor: Optional[str]
+):
+    # Versão da tabela + filtros + usuário (a visibilidade depende do papel)
+    etag = gerar_etag(versao_atual(db), "lista", request.url.query, current_user.id, current_user.role)
+    nao_mod = nao_modificado(request, etag)
+    if nao_mod:
+        return nao_mod
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
     
-    query = db.query(OrdemServico)
+    # Load both technicians in the same statement (avoids 2 extra SELECTs per row)
+    query = db.query(OrdemServico).options(
+        joinedload(OrdemServico.tecnico_campo),
+        joinedload(OrdemServico.tecnico_executor)
+    )
     
     # Apply filters
     if status_filter:
@@ -136,28 +440,9 @@ def list_os(
     if tipo_os:
         query = query.filter(OrdemServico.tipo_os == tipo_os)
     
-    # Search filter - busca em múltiplas colunas
+    # Search filter - índice de busca (tsvector/pg_trgm no Postgres, FTS5 no SQLite)
     if search:
-        search_term = f"%{search}%"
-        # Criar aliases para os joins de User
-        tecnico_campo_alias = aliased(User)
-        tecnico_executor_alias = aliased(User)
-        
-        query = query.outerjoin(tecnico_campo_alias, OrdemServico.tecnico_campo_id == tecnico_campo_alias.id).outerjoin(
-            tecnico_executor_alias, OrdemServico.tecnico_executor_id == tecnico_executor_alias.id
-        ).filter(
-            or_(
-                OrdemServico.numero_os.ilike(search_term),
-                OrdemServico.cidade.ilike(search_term),
-                OrdemServico.pppoe_cliente.ilike(search_term),
-                OrdemServico.motivo_abertura.ilike(search_term),
-                OrdemServico.porta_placa_olt.ilike(search_term),
-                tecnico_campo_alias.username.ilike(search_term),
-                tecnico_campo_alias.nome.ilike(search_term),
-                tecnico_executor_alias.username.ilike(search_term),
-                tecnico_executor_alias.nome.ilike(search_term)
-            )
-        ).distinct()
+        query, rank = aplicar_busca(query, db, search)
     
     # Role-based filtering
     if current_user.role == "execucao":
@@ -169,11 +454,34 @@ def list_os(
             (OrdemServico.tecnico_executor_id == current_user.id)
         )
     
-    # Order by creation date (newest first)
-    query = query.order_by(desc(OrdemServico.criado_em))
+    if search:
+        # Most relevant first; ranked pages are addressed by position
+        query = query.order_by(rank, desc(OrdemServico.criado_em), desc(OrdemServico.id))
+        if cursor:
+            offset = _decode_cursor(cursor, "o")
+        query = query.offset(offset)
+    else:
+        # Order by creation date (newest first), id breaks ties for a stable keyset
+        query = query.order_by(desc(OrdemServico.criado_em), desc(OrdemServico.id))
+        
+        # Pagination: keyset when a cursor is given, so page N costs the same as page 1
+        if cursor:
+            query = query.filter(tuple_(OrdemServico.criado_em, OrdemServico.id) < _decode_cursor(cursor, "k"))
+        elif offset:
+            query = query.offset(offset)
+    
+    # Fetch one extra row to know whether another page exists
+    results = query.limit(limit + 1).all()
+    has_more = len(results) > limit
+    results = results[:limit]
     
-    # Pagination
-    results = query.offset(offset).limit(limit).all()
+    response.headers["X-Has-More"] = "true" if has_more else "false"
+    if has_more:
+        if search:
+            response.headers["X-Next-Cursor"] = _encode_cursor("o", offset + limit)
+        else:
+            last = results[-1]
+            response.headers["X-Next-Cursor"] = _encode_cursor("k", last.criado_em.isoformat(), last.id)
     
     # Format response
     return [
@@ -197,16 +505,188 @@ def list_os(
     ]
 
 
+def _evento_para(evento: dict, user: User) -> Optional[dict]:
+    """
+    Event as `user` may see it: same visibility rule as list_os for the
+    execucao role (aguardando or their own OS), None if hidden.
+    
+    An OS that leaves an execucao user's view (assumed by someone else) is
+    sent as a bare `removida` with only its id, so the client drops it
+    without learning who took it.
+    """
+    os = evento["os"]
+    if user.role != "execucao" or os["status"] == "aguardando" or os["tecnico_executor_id"] == user.id:
+        return evento
+    if evento["status_anterior"] == "aguardando":
+        return {**evento, "tipo": "removida", "os": {"id": os["id"]}, "status_anterior": None}
+    return None
+
+
+def _formatar_evento(evento: dict) -> str:
+    dados = json.dumps(evento, ensure_ascii=False, default=str)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dados}\n\n"
+
+
+def _usuario_do_stream(ticket: Optional[str], token: Optional[str]) -> User:
+    # Short-lived session: the stream must not hold a pool connection open
+    db = SessionLocal()
+    try:
+        if ticket:
+            return get_user_from_stream_ticket(ticket, db)
+        return get_user_from_token(token, db)
+    finally:
+        db.close()
+
+
+@router.post("/stream/ticket")
+def criar_ticket_stream(current_user: User = Depends(get_current_user)):
+    """
+    Short-lived ticket to open /os/stream (EventSource can't send headers).
+    
+    Keeps the access token out of the stream URL, and so out of access logs
+    and proxies; the ticket only opens the stream and expires in a minute.
+    """
+    return {"ticket": create_stream_ticket(current_user), "expires_in": STREAM_TICKET_SECONDS}
+
+
+@router.get("/stream")
+async def stream_os(
+    request: Request,
+    ticket: Optional[str] = Query(None, description="Ticket de POST /os/stream/ticket (EventSource não envia headers)"),
+    last_event_id: Optional[int] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """
+    Server-Sent Events stream of OS changes (criada, assumida, finalizada,
+    atualizada, removida), so list and dashboard pages don't need to poll.
+    
+    Browsers authenticate with a ticket from POST /os/stream/ticket; other
+    clients may send the usual Bearer header instead.
+    
+    Reconnecting clients resume from Last-Event-ID; if the gap is no longer
+    in memory a `resync` event tells them to reload.
+    """
+    token = credentials.credentials if credentials else None
+    if not ticket and not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Ticket não informado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user = await run_in_threadpool(_usuario_do_stream, ticket, token)
+    
+    header_id = request.headers.get("last-event-id")
+    if last_event_id is None and header_id and header_id.isdigit():
+        last_event_id = int(header_id)
+    
+    assinante, pendentes, precisa_resync = event_broker.assinar(last_event_id)
+    
+    async def eventos():
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            if precisa_resync:
+                yield "event: resync\ndata: {}\n\n"
+            for evento in pendentes:
+                visivel = _evento_para(evento, user)
+                if visivel:
+                    yield _formatar_evento(visivel)
+            
+            while True:
+                try:
+                    evento = await asyncio.wait_for(assinante.fila.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Comentário SSE: mantém proxies/conexão vivos
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if evento is None:
+                    # Cliente lento: encerra, ele reconecta com Last-Event-ID
+                    break
+                visivel = _evento_para(evento, user)
+                if visivel:
+                    yield _formatar_evento(visivel)
+        finally:
+            event_broker.cancelar(assinante)
+    
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _pode_visualizar(status_os: str, tecnico_executor_id: Optional[int], user: User) -> bool:
+    """Execution can only view aguardando or their own OS"""
+    if user.role != "execucao":
+        return True
+    return status_os == "aguardando" or tecnico_executor_id == user.id
+
+
 @router.get("/{os_id}", response_model=OrdemServicoResponse)
 def get_os(
     os_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Get details of a specific Ordem de Serviço
+    
+    Sends an ETag; a matching `If-None-Match` gets 304.
     """
-    os = db.query(OrdemServico).filter(OrdemServico.id == os_id).first()
+    return _obter_os(db, request, response, os_id, current_user)
+
+
+# :int - não captura /os/stream (as rotas async são registradas antes)
+@async_router.get("/{os_id:int}", response_model=OrdemServicoResponse)
+async def get_os_async(
+    os_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """get_os on the async engine (DB_ASYNC=true)"""
+    return await db.run_sync(lambda sync_db: _obter_os(sync_db, request, response, os_id, current_user))
+
+
+def _etag_os(db: Session, os: OrdemServico) -> str:
+    """
+    ETag of GET /os/{id}: table version plus the deadline fields computed
+    from the clock (tempo_restante_min, prazo_vencido), which change with
+    no write to the table while a rompimento/manutenção deadline runs.
+    """
+    return gerar_etag(versao_atual(db), "os", os.id, os.tempo_restante_minutos, os.prazo_vencido)
+
+
+def _obter_os(db: Session, request: Request, response: Response, os_id: int, current_user: User):
+    if request.headers.get("if-none-match"):
+        # Revalidação: confere existência, permissão e prazo com uma leitura mínima
+        atual = (
+            db.query(OrdemServico)
+            .options(load_only(
+                OrdemServico.status,
+                OrdemServico.tecnico_executor_id,
+                OrdemServico.tipo_os,
+                OrdemServico.prazo_fim
+            ))
+            .filter(OrdemServico.id == os_id)
+            .first()
+        )
+        if atual and _pode_visualizar(atual.status, atual.tecnico_executor_id, current_user):
+            nao_mod = nao_modificado(request, _etag_os(db, atual))
+            if nao_mod:
+                return nao_mod
+    
+    os = (
+        db.query(OrdemServico)
+        .options(joinedload(OrdemServico.tecnico_campo), joinedload(OrdemServico.tecnico_executor))
+        .filter(OrdemServico.id == os_id)
+        .first()
+    )
     
     if not os:
         raise HTTPException(
@@ -215,17 +695,210 @@ def get_os(
         )
     
     # Check permissions
-    if current_user.role == "execucao":
-        # Execution can only view aguardando or their own OS
-        if os.status != "aguardando" and os.tecnico_executor_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Você não tem permissão para visualizar esta O.S"
-            )
+    if not _pode_visualizar(os.status, os.tecnico_executor_id, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Você não tem permissão para visualizar esta O.S"
+        )
     
+    response.headers["ETag"] = _etag_os(db, os)
+    response.headers["Cache-Control"] = "private, no-cache"
     return _format_os_response(os)
 
 
+def _tecnico_executor(db: Session, tecnico_executor_id: int) -> User:
+    """The new executor of an OS, who must have role 'execucao' or 'admin'"""
+    tecnico = db.query(User).filter(User.id == tecnico_executor_id).first()
+    if not tecnico or tecnico.role not in ["execucao", "admin"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Técnico executor inválido"
+        )
+    return tecnico
+
+
+def _transicao_lote(
+    db: Session,
+    os_ids: List[int],
+    status_esperado: str,
+    acao: str,
+    valores: dict,
+    tipo_evento: str,
+    novo_executor: Optional[User] = None,
+    executor_obrigatorio: Optional[int] = None
+) -> OrdemServicoBatchTransicaoResponse:
+    """
+    Apply one transition to many OS with a single conditional UPDATE.
+    
+    The OS are read in one query (locked on Postgres) for the per-id checks
+    and the rollup snapshots. The UPDATE repeats the conditions, so an OS
+    changed by someone else in between is reported as 409, not overwritten.
+    
+    `novo_executor` also refreshes the search text; `executor_obrigatorio`
+    limits the transition to the OS of that executor (403 for the others).
+    """
+    ids = list(dict.fromkeys(os_ids))
+    if len(ids) > settings.os_batch_max_itens:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {settings.os_batch_max_itens} O.S por lote"
+        )
+    
+    encontradas = {
+        o.id: o
+        for o in db.query(OrdemServico).filter(OrdemServico.id.in_(ids)).with_for_update()
+    }
+    resultados = {}
+    elegiveis = []
+    for os_id in ids:
+        os = encontradas.get(os_id)
+        if os is None:
+            resultados[os_id] = {"status_code": status.HTTP_404_NOT_FOUND, "detail": "Ordem de serviço não encontrada"}
+        elif os.status != status_esperado:
+            resultados[os_id] = {
+                "status_code": status.HTTP_400_BAD_REQUEST,
+                "detail": f"Esta O.S não pode ser {acao}. Status atual: {os.status}"
+            }
+        elif executor_obrigatorio is not None and os.tecnico_executor_id != executor_obrigatorio:
+            resultados[os_id] = {"status_code": status.HTTP_403_FORBIDDEN, "detail": "Você só pode finalizar suas próprias O.S"}
+        else:
+            elegiveis.append(os)
+    
+    eventos = []
+    if elegiveis:
+        antes = {o.id: rollup_service.snapshot(o) for o in elegiveis}
+        condicoes = [OrdemServico.id.in_(antes), OrdemServico.status == status_esperado]
+        if executor_obrigatorio is not None:
+            condicoes.append(OrdemServico.tecnico_executor_id == executor_obrigatorio)
+        if novo_executor is not None:
+            # Texto de busca de cada O.S no mesmo UPDATE (CASE por id)
+            tecnicos_campo = {
+                u.id: u
+                for u in db.query(User).filter(User.id.in_({o.tecnico_campo_id for o in elegiveis}))
+            }
+            textos = {o.id: texto_busca(o, tecnicos_campo.get(o.tecnico_campo_id), novo_executor) for o in elegiveis}
+            valores = {**valores, "busca_texto": case(textos, value=OrdemServico.id)}
+        
+        alteradas = db.execute(
+            update(OrdemServico)
+            .where(*condicoes)
+            .values(**valores)
+            .returning(OrdemServico)
+            .execution_options(populate_existing=True)
+        ).scalars().all()
+        
+        if alteradas:
+            if novo_executor is not None:
+                indexar_lote(db, [(o.id, o.busca_texto) for o in alteradas])
+            rollup_service.aplicar_lote(db, [(antes[o.id], rollup_service.snapshot(o)) for o in alteradas])
+            # UPDATE em massa não passa pelo flush do ORM, que incrementaria a versão (ETag)
+            incrementar_versao(db.connection())
+        
+        for os in alteradas:
+            resultados[os.id] = {"status_code": status.HTTP_200_OK}
+            eventos.append((resumo_os(os), antes[os.id]))
+        for os in elegiveis:
+            if os.id not in resultados:
+                resultados[os.id] = {
+                    "status_code": status.HTTP_409_CONFLICT,
+                    "detail": "A O.S foi alterada durante a operação, tente novamente"
+                }
+    
+    resumos = {resumo["id"]: resumo for resumo, _ in eventos}
+    itens = [
+        OrdemServicoBatchTransicaoItem(
+            os_id=os_id,
+            numero_os=encontradas[os_id].numero_os if os_id in encontradas else None,
+            status=resumos[os_id]["status"] if os_id in resumos else getattr(encontradas.get(os_id), "status", None),
+            **resultados[os_id]
+        )
+        for os_id in ids
+    ]
+    db.commit()
+    for resumo, antes_os in eventos:
+        _notificar_mudanca(tipo_evento, resumo, antes_os)
+    
+    return OrdemServicoBatchTransicaoResponse(
+        alteradas=len(eventos),
+        rejeitadas=len(ids) - len(eventos),
+        resultados=itens
+    )
+
+
+@router.patch("/batch/assumir", response_model=OrdemServicoBatchTransicaoResponse)
+def assumir_os_batch(
+    request: OrdemServicoBatchAssumirRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin", "execucao"))
+):
+    """
+    Assume many Ordens de Serviço at once (same rules as assumir_os)
+    
+    Each OS must be in 'aguardando'; every id gets its own result
+    (200, or 404/400/409 with the reason).
+    """
+    tecnico = _tecnico_executor(db, request.tecnico_executor_id)
+    return _transicao_lote(
+        db, request.os_ids, "aguardando", "assumida",
+        valores={
+            "status": "em_andamento",
+            "tecnico_executor_id": tecnico.id,
+            "iniciado_em": datetime.utcnow(),
+        },
+        tipo_evento="assumida",
+        novo_executor=tecnico
+    )
+
+
+@router.patch("/batch/finalizar", response_model=OrdemServicoBatchTransicaoResponse)
+def finalizar_os_batch(
+    request: OrdemServicoBatchFinalizarRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin", "execucao"))
+):
+    """
+    Finalize many Ordens de Serviço at once (same rules as finalizar_os)
+    
+    Each OS must be 'em_andamento'; role 'execucao' can only finalize their
+    own OS. All of them get the same foto_comprovacao (and observacoes).
+    """
+    valores = {
+        "status": "concluido",
+        "foto_comprovacao": request.foto_comprovacao,
+        "concluido_em": datetime.utcnow(),
+    }
+    if request.observacoes:
+        valores["observacoes"] = request.observacoes
+    
+    return _transicao_lote(
+        db, request.os_ids, "em_andamento", "finalizada",
+        valores=valores,
+        tipo_evento="finalizada",
+        executor_obrigatorio=current_user.id if current_user.role == "execucao" else None
+    )
+
+
+@router.patch("/batch/reatribuir", response_model=OrdemServicoBatchTransicaoResponse)
+def reatribuir_os_batch(
+    request: OrdemServicoBatchReatribuirRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin"))
+):
+    """
+    Move many Ordens de Serviço in progress to another executor (Admin only)
+    
+    Only OS 'em_andamento' are moved: waiting ones are assumed and concluded
+    ones keep who executed them.
+    """
+    tecnico = _tecnico_executor(db, request.tecnico_executor_id)
+    return _transicao_lote(
+        db, request.os_ids, "em_andamento", "reatribuída",
+        valores={"tecnico_executor_id": tecnico.id},
+        tipo_evento="atualizada",
+        novo_executor=tecnico
+    )
+
+
 @router.patch("/{os_id}/assumir", response_model=OrdemServicoResponse)
 def assumir_os(
     os_id: int,
@@ -263,12 +936,16 @@ def assumir_os(
         )
     
     # Update OS
+    antes = rollup_service.snapshot(os)
     os.status = "em_andamento"
     os.tecnico_executor_id = request.tecnico_executor_id
     os.iniciado_em = datetime.utcnow()
+    indexar_os(db, os)
+    rollup_service.aplicar(db, antes, rollup_service.snapshot(os))
     
     db.commit()
     db.refresh(os)
+    _notificar_mudanca("assumida", os, antes)
     
     return _format_os_response(os)
 
@@ -309,6 +986,7 @@ def finalizar_os(
         )
     
     # Update OS
+    antes = rollup_service.snapshot(os)
     os.status = "concluido"
     os.foto_comprovacao = request.foto_comprovacao
     os.concluido_em = datetime.utcnow()
@@ -316,24 +994,18 @@ def finalizar_os(
     if request.observacoes:
         os.observacoes = request.observacoes
     
+    rollup_service.aplicar(db, antes, rollup_service.snapshot(os))
     db.commit()
     db.refresh(os)
+    _notificar_mudanca("finalizada", os, antes)
     
     return _format_os_response(os)
 
 
-@router.patch("/{os_id}/finalizar-com-foto", response_model=OrdemServicoResponse)
-async def finalizar_os_com_foto(
-    os_id: int,
-    foto_comprovacao: UploadFile = File(...),
-    observacoes: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_role("admin", "execucao"))
-):
+def _validar_finalizacao(db: Session, os_id: int, current_user: User):
     """
-    Finalize an Ordem de Serviço with direct file upload (change status to concluido)
-    
-    This replaces the need for a pre-uploaded image URL.
+    Check the OS can be finalized by this user; returns the rollup snapshot
+    and the executor to re-check in the conditional UPDATE.
     """
     os = db.query(OrdemServico).filter(OrdemServico.id == os_id).first()
     
@@ -357,23 +1029,102 @@ async def finalizar_os_com_foto(
             detail="Você só pode finalizar suas próprias O.S"
         )
     
-    # Upload photo to Cloudinary
-    foto_url = await upload_image(foto_comprovacao, folder="os-sistema/comprovacao")
+    antes = rollup_service.snapshot(os)
+    executor = os.tecnico_executor_id
     
-    # Update OS
-    os.status = "concluido"
-    os.foto_comprovacao = foto_url
-    os.concluido_em = datetime.utcnow()
+    # Encerra a leitura antes do upload: a conexão volta ao pool em vez de
+    # ficar presa durante os segundos de envio da foto
+    db.rollback()
+    return antes, executor
+
+
+def _concluir_com_foto(db: Session, os_id: int, executor: Optional[int], antes: dict, valores: dict) -> Optional[dict]:
+    """
+    Conditional transition to concluido after the upload; returns the OS
+    response, or None (rolled back) if it is no longer em_andamento with
+    the same executor.
+    """
+    # Durante o upload outra requisição pode ter finalizado, reatribuído ou
+    # removido a O.S
+    os = db.execute(
+        update(OrdemServico)
+        .where(
+            OrdemServico.id == os_id,
+            OrdemServico.status == "em_andamento",
+            OrdemServico.tecnico_executor_id.is_not_distinct_from(executor)
+        )
+        .values(**valores)
+        .returning(OrdemServico)
+        .execution_options(populate_existing=True)
+    ).scalars().first()
     
-    if observacoes:
-        os.observacoes = observacoes
+    if os is None:
+        db.rollback()
+        return None
     
+    rollup_service.aplicar(db, antes, rollup_service.snapshot(os))
+    # UPDATE direto não passa pelo flush do ORM, que incrementaria a versão (ETag)
+    incrementar_versao(db.connection())
     db.commit()
     db.refresh(os)
-    
+    _notificar_mudanca("finalizada", os, antes)
     return _format_os_response(os)
 
 
+def _erro_finalizacao_concorrente(db: Session, os_id: int) -> HTTPException:
+    """Why the conditional UPDATE of finalizar_os_com_foto matched nothing"""
+    atual = db.query(OrdemServico.status).filter(OrdemServico.id == os_id).first()
+    if not atual:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ordem de serviço não encontrada"
+        )
+    if atual.status != "em_andamento":
+        return HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Esta O.S não pode ser finalizada. Status atual: {atual.status}"
+        )
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A O.S foi reatribuída durante o envio da foto, tente novamente"
+    )
+
+
+@router.patch("/{os_id}/finalizar-com-foto", response_model=OrdemServicoResponse)
+async def finalizar_os_com_foto(
+    os_id: int,
+    foto_comprovacao: UploadFile = File(...),
+    observacoes: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin", "execucao"))
+):
+    """
+    Finalize an Ordem de Serviço with direct file upload (change status to concluido)
+    
+    This replaces the need for a pre-uploaded image URL.
+    
+    The Session is sync: database steps run in the threadpool, only the
+    upload is awaited on the event loop. If the OS changes during the
+    upload the photo is kept (dedup may share its URL).
+    """
+    antes, executor = await run_in_threadpool(_validar_finalizacao, db, os_id, current_user)
+    
+    # Upload photo (Cloudinary or local storage)
+    foto_url = await salvar_foto(foto_comprovacao, pasta="os-sistema/comprovacao")
+    
+    valores = {"status": "concluido", "foto_comprovacao": foto_url, "concluido_em": datetime.utcnow()}
+    if observacoes:
+        valores["observacoes"] = observacoes
+    resposta = await run_in_threadpool(_concluir_com_foto, db, os_id, executor, antes, valores)
+    
+    if resposta is None:
+        # A foto enviada fica no storage: o conteúdo é deduplicado e a mesma
+        # URL pode já ter sido entregue a outro envio ainda não gravado
+        raise await run_in_threadpool(_erro_finalizacao_concorrente, db, os_id)
+    
+    return resposta
+
+
 @router.patch("/{os_id}", response_model=OrdemServicoResponse)
 def update_os(
     os_id: int,
@@ -395,6 +1146,7 @@ def update_os(
         )
     
     # Update fields
+    antes = rollup_service.snapshot(os)
     if os_update.status is not None:
         os.status = os_update.status
     
@@ -403,9 +1155,12 @@ def update_os(
     
     if os_update.tecnico_executor_id is not None:
         os.tecnico_executor_id = os_update.tecnico_executor_id
+        indexar_os(db, os)
     
+    rollup_service.aplicar(db, antes, rollup_service.snapshot(os))
     db.commit()
     db.refresh(os)
+    _notificar_mudanca("atualizada", os, antes)
     
     return _format_os_response(os)
 
@@ -427,8 +1182,13 @@ def delete_os(
             detail="Ordem de serviço não encontrada"
         )
     
+    antes = rollup_service.snapshot(os)
+    resumo = resumo_os(os)
+    remover_indice_os(db, os.id)
+    rollup_service.aplicar(db, antes, None)
     db.delete(os)
     db.commit()
+    _notificar_mudanca("removida", resumo, antes)
     
     return None
 
@@ -463,6 +1223,10 @@ def _format_os_response(os: OrdemServico) -> OrdemServicoResponse:
         telegram_phone=os.telegram_phone,
         foto_comprovacao=os.foto_comprovacao,
         observacoes=os.observacoes,
+        foto_power_meter_thumb=thumbnail_url(os.foto_power_meter),
+        foto_caixa_thumb=thumbnail_url(os.foto_caixa),
+        print_os_cliente_thumb=thumbnail_url(os.print_os_cliente),
+        foto_comprovacao_thumb=thumbnail_url(os.foto_comprovacao),
         criado_em=os.criado_em,
         iniciado_em=os.iniciado_em,
         concluido_em=os.concluido_em,
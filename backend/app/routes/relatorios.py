@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func
-from typing import List
-from ..database import get_db
+from typing import Optional
+from collections import defaultdict
+from ..database import get_db, get_async_db
 from ..models.user import User
-from ..models.ordem_servico import OrdemServico
+from ..models.dashboard_rollup import DashboardRollup
 from ..schemas.relatorios import (
     DashboardResponse,
     DashboardTotais,
@@ -12,13 +14,24 @@ from ..schemas.relatorios import (
     TecnicoStats,
     CidadeStats
 )
-from ..services.auth_service import get_current_user
+from ..services.auth_service import get_current_user, get_current_user_async
+from ..services.dashboard_cache import dashboard_cache
+from ..services.etag_service import versao_atual, gerar_etag, nao_modificado
 
 router = APIRouter(prefix="/relatorios", tags=["Relatórios"])
 
+# Versões async das rotas de leitura, incluídas antes de `router` com DB_ASYNC=true
+async_router = APIRouter(prefix="/relatorios", tags=["Relatórios"])
+
+
+def _media(soma: float, quantidade: int) -> Optional[float]:
+    return soma / quantidade if quantidade else None
+
 
 @router.get("/dashboard", response_model=DashboardResponse)
 def get_dashboard(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -29,96 +42,144 @@ def get_dashboard(
     - Total counts by status
     - Average times (espera, execução, total)
     - Statistics per technician
+    
+    Served from a short-TTL cache that the OS routes invalidate on every change.
+    Sends an ETag (table version); a matching `If-None-Match` gets 304.
+    """
+    versao = versao_atual(db)
+    etag = gerar_etag(versao, "dashboard")
+    nao_mod = nao_modificado(request, etag)
+    if nao_mod:
+        return nao_mod
+    
+    versao_cache, dashboard = dashboard_cache.get(lambda: (versao, _calcular_dashboard(db)))
+    if versao_cache < versao:
+        # Valor em cache anterior à versão atual (mudança feita por outro worker)
+        dashboard_cache.invalidate()
+        versao_cache, dashboard = dashboard_cache.get(lambda: (versao, _calcular_dashboard(db)))
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return dashboard
+
+
+@async_router.get("/dashboard", response_model=DashboardResponse)
+async def get_dashboard_async(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """get_dashboard on the async engine (DB_ASYNC=true)"""
+    versao = await db.run_sync(versao_atual)
+    etag = gerar_etag(versao, "dashboard")
+    nao_mod = nao_modificado(request, etag)
+    if nao_mod:
+        return nao_mod
+    
+    async def calcular():
+        return versao, await db.run_sync(_calcular_dashboard)
+    
+    versao_cache, dashboard = await dashboard_cache.get_async(calcular)
+    if versao_cache < versao:
+        dashboard_cache.invalidate()
+        versao_cache, dashboard = await dashboard_cache.get_async(calcular)
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return dashboard
+
+
+@router.get("/dashboard/cache")
+def get_dashboard_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit/miss counters of the dashboard cache"""
+    return dashboard_cache.stats()
+
+
+def _calcular_dashboard(db: Session) -> DashboardResponse:
     """
-    # Total counts by status
-    totais_query = (
+    Build the dashboard from the dashboard_rollups table (O(days x dimensions)),
+    which the OS routes keep up to date, instead of scanning every order.
+    """
+    R = DashboardRollup
+    linhas = (
         db.query(
-            OrdemServico.status,
-            func.count(OrdemServico.id).label("count")
+            R.status,
+            R.cidade,
+            R.motivo_abertura,
+            R.tecnico_executor_id,
+            func.sum(R.total).label("total"),
+            func.sum(R.soma_espera_min).label("soma_espera_min"),
+            func.sum(R.qtd_espera).label("qtd_espera"),
+            func.sum(R.soma_execucao_min).label("soma_execucao_min"),
+            func.sum(R.qtd_execucao).label("qtd_execucao"),
+            func.sum(R.soma_total_min).label("soma_total_min"),
+            func.sum(R.qtd_total).label("qtd_total"),
         )
-        .group_by(OrdemServico.status)
+        .group_by(R.status, R.cidade, R.motivo_abertura, R.tecnico_executor_id)
         .all()
     )
     
-    totais_dict = {row.status: row.count for row in totais_query}
-    total_geral = sum(totais_dict.values())
+    por_status = defaultdict(int)
+    por_motivo = defaultdict(int)
+    cidades = defaultdict(int)
+    tempos = defaultdict(float)
+    tecnicos = {}
     
-    # Counts by motive
-    motivo_sem_sinal = db.query(OrdemServico).filter(OrdemServico.motivo_abertura == "Caixa sem sinal").count()
-    motivo_ampliacao = db.query(OrdemServico).filter(OrdemServico.motivo_abertura == "Ampliação de atendimento").count()
-    motivo_sinal_alto = db.query(OrdemServico).filter(OrdemServico.motivo_abertura == "Sinal Alto").count()
-
-    totais = DashboardTotais(
-        aguardando=totais_dict.get("aguardando", 0),
-        em_andamento=totais_dict.get("em_andamento", 0),
-        concluido=totais_dict.get("concluido", 0),
-        total=total_geral,
-        motivo_sem_sinal=motivo_sem_sinal,
-        motivo_ampliacao=motivo_ampliacao,
-        motivo_sinal_alto=motivo_sinal_alto
-    )
+    for row in linhas:
+        if not row.total:
+            continue
+        por_status[row.status] += row.total
+        por_motivo[row.motivo_abertura] += row.total
+        if row.cidade:
+            cidades[row.cidade] += row.total
+        
+        # Average times (only for completed OS)
+        if row.status == "concluido":
+            for campo in ("soma_espera_min", "qtd_espera", "soma_execucao_min",
+                          "qtd_execucao", "soma_total_min", "qtd_total"):
+                tempos[campo] += getattr(row, campo) or 0
+            if row.tecnico_executor_id:
+                stats = tecnicos.setdefault(row.tecnico_executor_id, [0, 0.0, 0])
+                stats[0] += row.total
+                stats[1] += row.soma_execucao_min or 0
+                stats[2] += row.qtd_execucao or 0
     
-    # Average times (only for completed OS)
-    avg_times = (
-        db.query(
-            func.avg(
-                func.extract('epoch', OrdemServico.iniciado_em - OrdemServico.criado_em) / 60
-            ).label("tempo_espera"),
-            func.avg(
-                func.extract('epoch', OrdemServico.concluido_em - OrdemServico.iniciado_em) / 60
-            ).label("tempo_execucao"),
-            func.avg(
-                func.extract('epoch', OrdemServico.concluido_em - OrdemServico.criado_em) / 60
-            ).label("tempo_total")
-        )
-        .filter(OrdemServico.status == "concluido")
-        .first()
+    totais = DashboardTotais(
+        aguardando=por_status["aguardando"],
+        em_andamento=por_status["em_andamento"],
+        concluido=por_status["concluido"],
+        total=sum(por_status.values()),
+        motivo_sem_sinal=por_motivo["Caixa sem sinal"],
+        motivo_ampliacao=por_motivo["Ampliação de atendimento"],
+        motivo_sinal_alto=por_motivo["Sinal Alto"]
     )
     
     metricas = DashboardMetricas(
-        tempo_medio_espera_min=float(avg_times.tempo_espera) if avg_times.tempo_espera else None,
-        tempo_medio_execucao_min=float(avg_times.tempo_execucao) if avg_times.tempo_execucao else None,
-        tempo_medio_total_min=float(avg_times.tempo_total) if avg_times.tempo_total else None
+        tempo_medio_espera_min=_media(tempos["soma_espera_min"], tempos["qtd_espera"]),
+        tempo_medio_execucao_min=_media(tempos["soma_execucao_min"], tempos["qtd_execucao"]),
+        tempo_medio_total_min=_media(tempos["soma_total_min"], tempos["qtd_total"])
     )
     
-    # Stats per technician
-    tecnico_stats = (
-        db.query(
-            User.nome,
-            func.count(OrdemServico.id).label("total"),
-            func.avg(
-                func.extract('epoch', OrdemServico.concluido_em - OrdemServico.iniciado_em) / 60
-            ).label("tempo_medio")
-        )
-        .join(OrdemServico, OrdemServico.tecnico_executor_id == User.id)
-        .filter(OrdemServico.status == "concluido")
-        .group_by(User.id, User.nome)
-        .all()
-    )
+    # Stats per technician (names in one IN query)
+    nomes = {}
+    if tecnicos:
+        nomes = dict(db.query(User.id, User.nome).filter(User.id.in_(tecnicos.keys())).all())
     
     por_tecnico = [
         TecnicoStats(
-            tecnico_nome=row.nome or "Sem nome",
-            total_concluidas=row.total,
-            tempo_medio_execucao_min=float(row.tempo_medio) if row.tempo_medio else None
+            tecnico_nome=nomes[tecnico_id] or "Sem nome",
+            total_concluidas=total,
+            tempo_medio_execucao_min=_media(soma_execucao, qtd_execucao)
         )
-        for row in tecnico_stats
+        for tecnico_id, (total, soma_execucao, qtd_execucao) in tecnicos.items()
+        if tecnico_id in nomes
     ]
     
     # Stats per city
-    city_stats_query = (
-        db.query(
-            OrdemServico.cidade,
-            func.count(OrdemServico.id).label("total")
-        )
-        .filter(OrdemServico.cidade.is_not(None))
-        .group_by(OrdemServico.cidade)
-        .all()
-    )
-    
     por_cidade = [
-        CidadeStats(cidade=row.cidade, total=row.total)
-        for row in city_stats_query
+        CidadeStats(cidade=cidade, total=total)
+        for cidade, total in cidades.items()
     ]
     
     return DashboardResponse(
@@ -1,20 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..models.user import User
 from ..schemas.user import UserCreate, UserUpdate, UserResponse
-from ..services.auth_service import hash_password, require_role
+from ..services.auth_service import hash_password, require_role, require_role_async, invalidate_user
+from ..services.search_service import reindexar_por_tecnico
 
 router = APIRouter(prefix="/usuarios", tags=["Gestão de Usuários"])
 
+# Versões async das rotas de leitura, incluídas antes de `router` com DB_ASYNC=true
+async_router = APIRouter(prefix="/usuarios", tags=["Gestão de Usuários"])
+
+
+def _listar_usuarios(db: Session) -> List[User]:
+    return db.query(User).all()
+
 @router.get("", response_model=List[UserResponse])
 def list_usuarios(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role("admin"))
 ):
     """List all users (Admin only)"""
-    return db.query(User).all()
+    return _listar_usuarios(db)
+
+@async_router.get("", response_model=List[UserResponse])
+async def list_usuarios_async(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_role_async("admin"))
+):
+    """list_usuarios on the async engine (DB_ASYNC=true)"""
+    return await db.run_sync(_listar_usuarios)
 
 @router.post("", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 def create_usuario(
@@ -72,7 +89,12 @@ def update_usuario(
             raise HTTPException(status_code=400, detail="Nome de usuário já está em uso")
         user.username = user_data.username
 
+    # Nomes dos técnicos fazem parte do índice de busca das O.S
+    if user_data.nome is not None or user_data.username:
+        reindexar_por_tecnico(db, user.id)
+
     db.commit()
+    invalidate_user(user.id)
     db.refresh(user)
     return user
 
@@ -92,4 +114,5 @@ def delete_usuario(
         
     db.delete(user)
     db.commit()
+    invalidate_user(user_id)
     return None
@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class FotoResponse(BaseModel):
+    """Schema for a stored photo"""
+    url: str
+    thumb: Optional[str] = None
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Literal
 from decimal import Decimal
 
 class OrdemServicoBase(BaseModel):
@@ -14,7 +14,7 @@ class OrdemServicoCreate(BaseModel):
     """Schema for creating an OrdemServico"""
     tecnico_campo_id: int
     foto_power_meter: Optional[str] = None  # URL (opcional para rompimento/manutenção)
-    foto_caixa: str  # URL
+    foto_caixa: Optional[str] = None  # URL (obrigatória, ou o file_id em fotos_telegram)
     localizacao_lat: Optional[Decimal] = None
     localizacao_lng: Optional[Decimal] = None
     localizacao_precisao: Optional[Decimal] = None
@@ -28,6 +28,37 @@ class OrdemServicoCreate(BaseModel):
     prazo_horas: Optional[int] = None  # Apenas para rompimento/manutenção
     prazo_fim: Optional[datetime] = None  # Calculado no backend se não fornecido
     porta_placa_olt: Optional[str] = None  # Para rompimento e manutenções
+    chave_envio: Optional[str] = Field(None, max_length=64)  # Idempotência: reenvio devolve a O.S já criada
+    # Fotos ainda no Telegram (campo -> file_id): baixadas e salvas em background
+    fotos_telegram: Optional[Dict[Literal["foto_power_meter", "foto_caixa", "print_os_cliente"], str]] = None
+    
+    @model_validator(mode="after")
+    def exigir_foto_caixa(self):
+        if self.foto_caixa is None and "foto_caixa" not in (self.fotos_telegram or {}):
+            raise ValueError("foto_caixa é obrigatória (URL ou file_id em fotos_telegram)")
+        return self
+
+
+class OrdemServicoBatchCreate(BaseModel):
+    """Schema for creating many OrdemServico at once (POST /os/batch)"""
+    ordens: List[OrdemServicoCreate] = Field(..., min_length=1)
+
+
+class OrdemServicoBatchItem(BaseModel):
+    """Outcome of one order of a batch, in request order"""
+    indice: int
+    status_code: int  # 201 criada, 200 chave_envio já usada, 4xx rejeitada
+    id: Optional[int] = None
+    numero_os: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class OrdemServicoBatchResponse(BaseModel):
+    """Schema for returning the outcome of POST /os/batch"""
+    criadas: int
+    existentes: int
+    rejeitadas: int
+    resultados: List[OrdemServicoBatchItem]
 
 
 class OrdemServicoUpdate(BaseModel):
@@ -48,6 +79,41 @@ class OrdemServicoFinalizarRequest(BaseModel):
     observacoes: Optional[str] = None
 
 
+class OrdemServicoBatchAssumirRequest(BaseModel):
+    """Schema for assuming many OS at once"""
+    os_ids: List[int] = Field(..., min_length=1)
+    tecnico_executor_id: int
+
+
+class OrdemServicoBatchFinalizarRequest(BaseModel):
+    """Schema for finalizing many OS at once (same proof photo for all)"""
+    os_ids: List[int] = Field(..., min_length=1)
+    foto_comprovacao: str
+    observacoes: Optional[str] = None
+
+
+class OrdemServicoBatchReatribuirRequest(BaseModel):
+    """Schema for moving many OS in progress to another executor"""
+    os_ids: List[int] = Field(..., min_length=1)
+    tecnico_executor_id: int
+
+
+class OrdemServicoBatchTransicaoItem(BaseModel):
+    """Outcome of one OS of a bulk transition, in request order"""
+    os_id: int
+    status_code: int  # 200 alterada, 404/400/403 recusada, 409 mudou durante a operação
+    numero_os: Optional[str] = None
+    status: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class OrdemServicoBatchTransicaoResponse(BaseModel):
+    """Schema for returning the outcome of a bulk transition"""
+    alteradas: int
+    rejeitadas: int
+    resultados: List[OrdemServicoBatchTransicaoItem]
+
+
 class TecnicoInfo(BaseModel):
     """Simplified technician schema for responses"""
     id: int
@@ -83,6 +149,12 @@ class OrdemServicoResponse(BaseModel):
     foto_comprovacao: Optional[str] = None
     observacoes: Optional[str] = None
     
+    # Thumbnails of the photos above (None when there's no photo or no variant)
+    foto_power_meter_thumb: Optional[str] = None
+    foto_caixa_thumb: Optional[str] = None
+    print_os_cliente_thumb: Optional[str] = None
+    foto_comprovacao_thumb: Optional[str] = None
+    
     # Timestamps
     criado_em: datetime
     iniciado_em: Optional[datetime] = None
@@ -1,11 +1,16 @@
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..config import get_settings
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..models.user import User
 
 settings = get_settings()
@@ -39,6 +44,23 @@ def create_access_token(data: dict) -> str:
     return encoded_jwt
 
 
+# Ticket do /os/stream: o EventSource não envia headers e a credencial vai na
+# URL (logs de acesso, proxies). Em vez do JWT de acesso, um token curto que
+# só abre o stream e não é aceito nas demais rotas
+STREAM_TICKET_SECONDS = 60
+ESCOPO_STREAM = "stream"
+
+
+def create_stream_ticket(user: User) -> str:
+    """Short-lived JWT that only authorizes opening /os/stream"""
+    expire = datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS)
+    return jwt.encode(
+        {"sub": str(user.id), "escopo": ESCOPO_STREAM, "exp": expire},
+        settings.jwt_secret,
+        algorithm=settings.jwt_algorithm
+    )
+
+
 def decode_token(token: str) -> dict:
     """Decode and verify a JWT token"""
     try:
@@ -72,14 +94,108 @@ def authenticate_user(db: Session, username: str, password: str) -> User:
     return user
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get the current authenticated user from JWT token"""
-    token = credentials.credentials
+# Campos do usuário guardados no cache (sem password_hash)
+_CAMPOS_PRINCIPAL = ("id", "username", "role", "telegram_id", "nome", "created_at")
+
+
+def _copia_usuario(user: User) -> User:
+    """Transient copy of a user, safe to share across requests/sessions"""
+    return User(**{campo: getattr(user, campo) for campo in _CAMPOS_PRINCIPAL})
+
+
+class PrincipalCache:
+    """
+    Bounded LRU + TTL cache of token -> authenticated user.
+    
+    A hit skips both the JWT decode and the users query. Entries expire at
+    min(now + TTL, token exp); `invalidate_user` drops every token of a user
+    (called when the user is updated or deleted). Invalidation is
+    per-process, so with several workers the TTL bounds staleness.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, Tuple[User, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            entrada = self._entradas.get(token)
+            if entrada is None or time.time() >= entrada[1]:
+                if entrada is not None:
+                    del self._entradas[token]
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(token)
+            self.hits += 1
+            user = entrada[0]
+        return _copia_usuario(user)
+    
+    def put(self, token: str, user: User, token_exp: Optional[float]) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        expira_em = time.time() + self.ttl_seconds
+        if token_exp:
+            expira_em = min(expira_em, token_exp)
+        with self._lock:
+            self._entradas[token] = (_copia_usuario(user), expira_em)
+            self._entradas.move_to_end(token)
+            while len(self._entradas) > self.max_entries:
+                self._entradas.popitem(last=False)
+    
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in [t for t, (u, _) in self._entradas.items() if u.id == user_id]:
+                del self._entradas[token]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.auth_cache_max_entries,
+    ttl_seconds=settings.auth_cache_ttl_seconds,
+)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Forget cached sessions of a user (after update/delete)"""
+    principal_cache.invalidate_user(user_id)
+
+
+def get_user_from_token(token: str, db: Session) -> User:
+    """
+    Resolve the user of a JWT token (raises 401 if invalid).
+    
+    Returns a transient snapshot of the user (id, username, role, nome...),
+    served from the principal cache when possible.
+    """
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached
+    return _carregar_usuario(token, db)
+
+
+def _carregar_usuario(token: str, db: Session) -> User:
+    """Cache miss: decode the token, load the user and cache it"""
     payload = decode_token(token)
+    if payload.get("escopo"):
+        # Ticket do stream: não vale como token de acesso
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido",
+        )
     
+    user = _usuario_do_payload(payload, db)
+    principal_cache.put(token, user, payload.get("exp"))
+    return _copia_usuario(user)
+
+
+def _usuario_do_payload(payload: dict, db: Session) -> User:
     user_id: int = payload.get("sub")
     if user_id is None:
         raise HTTPException(
@@ -93,7 +209,46 @@ def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuário não encontrado",
         )
-    
+    return user
+
+
+def get_user_from_stream_ticket(ticket: str, db: Session) -> User:
+    """Resolve the user of a /os/stream ticket (raises 401 if invalid or expired)"""
+    payload = decode_token(ticket)
+    if payload.get("escopo") != ESCOPO_STREAM:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Ticket do stream inválido",
+        )
+    return _copia_usuario(_usuario_do_payload(payload, db))
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get the current authenticated user from JWT token"""
+    return get_user_from_token(credentials.credentials, db)
+
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """get_current_user for the async routes (DB_ASYNC=true)"""
+    token = credentials.credentials
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached
+    return await db.run_sync(lambda sync_db: _carregar_usuario(token, sync_db))
+
+
+def _checar_papel(user: User, allowed_roles) -> User:
+    if user.role not in allowed_roles:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Acesso negado. Papel necessário: {', '.join(allowed_roles)}",
+        )
     return user
 
 
@@ -106,11 +261,14 @@ def require_role(*allowed_roles: str):
             ...
     """
     def role_checker(user: User = Depends(get_current_user)) -> User:
-        if user.role not in allowed_roles:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Acesso negado. Papel necessário: {', '.join(allowed_roles)}",
-            )
-        return user
+        return _checar_papel(user, allowed_roles)
+    
+    return role_checker
+
+
+def require_role_async(*allowed_roles: str):
+    """require_role for the async routes (DB_ASYNC=true)"""
+    async def role_checker(user: User = Depends(get_current_user_async)) -> User:
+        return _checar_papel(user, allowed_roles)
     
     return role_checker
@@ -1,7 +1,16 @@
+import asyncio
+import io
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional
 import cloudinary
 import cloudinary.uploader
+import requests
+from cloudinary import utils
 from fastapi import UploadFile, HTTPException
 from ..config import get_settings
+from .imagem_service import preparar_imagem, tamanho_upload, checar_tamanho
 
 settings = get_settings()
 
@@ -9,11 +18,94 @@ settings = get_settings()
 if settings.cloudinary_url:
     cloudinary.config(cloudinary_url=settings.cloudinary_url)
 
+# O SDK do Cloudinary é síncrono: uploads rodam neste pool, fora do event loop.
+# Pool próprio (e limitado) para não ocupar o threadpool das rotas sync.
+_upload_executor = ThreadPoolExecutor(
+    max_workers=settings.upload_max_workers,
+    thread_name_prefix="cloudinary-upload"
+)
+
+# Bloco de leitura do arquivo durante o envio e timeout do POST
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_TIMEOUT = 120
+
+
+class _CorpoMultipart:
+    """
+    multipart/form-data body read on demand: the signed fields, then the file
+    in small blocks, then the closing boundary. http.client pulls it 8 KB at
+    a time, so an upload never holds the whole photo in memory (the SDK's
+    upload() reads the file and then builds a second full copy of the body).
+    """
+    
+    def __init__(self, campos: dict, arquivo: BinaryIO, nome_arquivo: str, tamanho: int):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        
+        preambulo = b"".join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{nome}"\r\n\r\n{valor}\r\n'.encode()
+            for nome, valor in campos.items()
+        )
+        preambulo += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{nome_arquivo}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        epilogo = f"\r\n--{boundary}--\r\n".encode()
+        
+        self.tamanho = len(preambulo) + tamanho + len(epilogo)
+        self._partes = [io.BytesIO(preambulo), arquivo, io.BytesIO(epilogo)]
+    
+    def __len__(self) -> int:
+        return self.tamanho
+    
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = UPLOAD_CHUNK_SIZE
+        while self._partes:
+            bloco = self._partes[0].read(n)
+            if bloco:
+                return bloco
+            self._partes.pop(0)
+        return b""
+
+
+def _enviar(arquivo: BinaryIO, nome_arquivo: str, tamanho: int, folder: str) -> dict:
+    """Signed streaming POST to the Cloudinary upload API (runs in the upload pool)"""
+    params = utils.build_upload_params(
+        folder=folder,
+        resource_type="image",
+        quality="auto:good",
+        fetch_format="auto"
+    )
+    params = utils.sign_request(utils.cleanup_params(params), {})
+    campos = {k: v for k, v in params.items() if v}
+    
+    corpo = _CorpoMultipart(campos, arquivo, nome_arquivo, tamanho)
+    resposta = requests.post(
+        utils.cloudinary_api_url("upload", resource_type="image"),
+        data=corpo,
+        headers={
+            "Content-Type": corpo.content_type,
+            "Content-Length": str(corpo.tamanho),
+            "User-Agent": cloudinary.get_user_agent(),
+        },
+        timeout=UPLOAD_TIMEOUT
+    )
+    
+    resultado = resposta.json()
+    if "error" in resultado:
+        raise RuntimeError(resultado["error"].get("message", resposta.status_code))
+    return resultado
+
 
 async def upload_image(file: UploadFile, folder: str = "os-sistema") -> str:
     """
     Upload an image to Cloudinary
     
+    Files over UPLOAD_MAX_BYTES are rejected with 413. The photo is first
+    resized/recompressed in the image process pool (see imagem_service), then
+    streamed from disk with a bounded buffer.
+    
     Args:
         file: The uploaded file
         folder: Cloudinary folder name
@@ -21,18 +113,33 @@ async def upload_image(file: UploadFile, folder: str = "os-sistema") -> str:
     Returns:
         str: The secure URL of the uploaded image
     """
+    tamanho = tamanho_upload(file)
+    checar_tamanho(tamanho)
+    
+    processada = None
     try:
-        # Read file content
-        contents = await file.read()
+        processada = await preparar_imagem(file)
+        if processada:
+            caminho, nome, tamanho = processada
+            arquivo = open(caminho, "rb")
+        else:
+            await file.seek(0)
+            arquivo, nome = file.file, file.filename or "foto"
         
-        # Upload to Cloudinary
-        result = cloudinary.uploader.upload(
-            contents,
-            folder=folder,
-            resource_type="image",
-            quality="auto:good",
-            fetch_format="auto"
-        )
+        # Upload to Cloudinary (blocking HTTP call -> upload pool)
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                _upload_executor,
+                _enviar,
+                arquivo,
+                nome,
+                tamanho,
+                folder
+            )
+        finally:
+            if processada:
+                arquivo.close()
         
         return result["secure_url"]
     
@@ -41,6 +148,31 @@ async def upload_image(file: UploadFile, folder: str = "os-sistema") -> str:
             status_code=500,
             detail=f"Erro ao fazer upload da imagem: {str(e)}"
         )
+    
+    finally:
+        if processada:
+            os.remove(processada[0])
+
+
+def thumbnail_url(image_url: Optional[str]) -> Optional[str]:
+    """
+    Derived URL of a reduced version of a Cloudinary image
+    
+    Cloudinary generates the variant on the first request and serves it from
+    the CDN afterwards, so nothing extra is uploaded or stored.
+    
+    Args:
+        image_url: The secure URL returned by upload_image
+        
+    Returns:
+        str: URL of the thumbnail, or None if the URL isn't a Cloudinary upload
+    """
+    if not image_url or "res.cloudinary.com" not in image_url or "/image/upload/" not in image_url:
+        return None
+    
+    dimensao = settings.imagem_thumb_dimensao
+    base, resto = image_url.split("/image/upload/", 1)
+    return f"{base}/image/upload/c_limit,w_{dimensao},h_{dimensao},q_auto,f_auto/{resto}"
 
 
 def delete_image(image_url: str) -> bool:
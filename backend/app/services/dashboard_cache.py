@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+from ..config import get_settings
+
+settings = get_settings()
+
+
+class _Calculo:
+    """One in-flight computation shared by concurrent cache misses"""
+    
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.resultado: Any = None
+        self.erro: Optional[BaseException] = None
+
+
+class DashboardCache:
+    """
+    In-process TTL cache for the dashboard payload.
+    
+    - Concurrent misses are coalesced into a single computation (single-flight)
+    - `invalidate()` is called by the OS routes after every committed change
+    - A result computed across an invalidation is returned but not cached
+    """
+    
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._valor: Any = None
+        self._expira_em = 0.0
+        self._geracao = 0
+        self._calculo: Optional[_Calculo] = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+    
+    def _entrar(self):
+        """Return (cached value, None) on a hit, else (None, (calculo, lider, geracao))"""
+        with self._lock:
+            if self._valor is not None and time.monotonic() < self._expira_em:
+                self.hits += 1
+                return self._valor, None
+            
+            calculo = self._calculo
+            if calculo is not None:
+                self.coalesced += 1
+                return None, (calculo, False, None)
+            
+            self.misses += 1
+            calculo = self._calculo = _Calculo()
+            return None, (calculo, True, self._geracao)
+    
+    def _concluir(self, calculo: _Calculo, geracao: int) -> None:
+        with self._lock:
+            if calculo.erro is None and geracao == self._geracao:
+                self._valor = calculo.resultado
+                self._expira_em = time.monotonic() + self.ttl_seconds
+            if self._calculo is calculo:
+                self._calculo = None
+        calculo.pronto.set()
+    
+    @staticmethod
+    def _resultado(calculo: _Calculo) -> Any:
+        if calculo.erro is not None:
+            raise calculo.erro
+        return calculo.resultado
+    
+    def get(self, calcular: Callable[[], Any]) -> Any:
+        """Return the cached value or compute it (once) with `calcular`"""
+        valor, pendente = self._entrar()
+        if pendente is None:
+            return valor
+        
+        calculo, lider, geracao = pendente
+        if not lider:
+            calculo.pronto.wait()
+            return self._resultado(calculo)
+        
+        try:
+            calculo.resultado = calcular()
+        except BaseException as e:
+            calculo.erro = e
+            raise
+        finally:
+            self._concluir(calculo, geracao)
+        
+        return calculo.resultado
+    
+    async def get_async(self, calcular: Callable[[], Awaitable[Any]]) -> Any:
+        """get() for async routes: `calcular` is awaited, waiting never blocks the loop"""
+        valor, pendente = self._entrar()
+        if pendente is None:
+            return valor
+        
+        calculo, lider, geracao = pendente
+        if not lider:
+            # The leader may be a worker thread or a task on this same loop
+            await asyncio.to_thread(calculo.pronto.wait)
+            return self._resultado(calculo)
+        
+        try:
+            calculo.resultado = await calcular()
+        except BaseException as e:
+            calculo.erro = e
+            raise
+        finally:
+            self._concluir(calculo, geracao)
+        
+        return calculo.resultado
+    
+    def invalidate(self) -> None:
+        """Drop the cached value (called after OS changes are committed)"""
+        with self._lock:
+            self._valor = None
+            self._geracao += 1
+            self._calculo = None
+            self.invalidations += 1
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ttl_seconds": self.ttl_seconds,
+                "cached": self._valor is not None and time.monotonic() < self._expira_em,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "invalidations": self.invalidations,
+            }
+
+
+dashboard_cache = DashboardCache(ttl_seconds=settings.dashboard_cache_ttl_seconds)
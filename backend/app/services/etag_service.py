@@ -0,0 +1,72 @@
+import hashlib
+from itertools import chain
+from typing import Optional
+from fastapi import Request, Response, status
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..models.ordem_servico import OrdemServico
+from ..models.versao_tabela import VersaoTabela
+
+TABELA_OS = "ordens_servico"
+
+
+def _insert_ignore(dialect_name: str):
+    """INSERT ... ON CONFLICT DO NOTHING for the current dialect"""
+    if dialect_name == "postgresql":
+        return postgresql.insert(VersaoTabela).on_conflict_do_nothing(index_elements=["tabela"])
+    return sqlite.insert(VersaoTabela).on_conflict_do_nothing(index_elements=["tabela"])
+
+
+def incrementar_versao(conn, tabela: str = TABELA_OS) -> None:
+    """
+    Bump the change counter of `tabela` in the caller's transaction.
+    
+    The UPDATE holds the row lock until commit, so versions become visible in
+    commit order (a timestamp like max(atualizado_em) could be committed out
+    of order and hide a change behind a stale 304).
+    """
+    incremento = (
+        update(VersaoTabela)
+        .where(VersaoTabela.tabela == tabela)
+        .values(versao=VersaoTabela.versao + 1)
+    )
+    if conn.execute(incremento).rowcount == 0:
+        conn.execute(_insert_ignore(conn.dialect.name).values(tabela=tabela, versao=0))
+        conn.execute(incremento)
+
+
+def versao_atual(db: Session, tabela: str = TABELA_OS) -> int:
+    """Current change counter of `tabela` (one primary-key lookup)"""
+    versao = db.execute(
+        select(VersaoTabela.versao).where(VersaoTabela.tabela == tabela)
+    ).scalar()
+    return versao or 0
+
+
+@event.listens_for(Session, "after_flush")
+def _versionar_ordens(session: Session, flush_context) -> None:
+    # Any flushed insert/update/delete of an OS (routes, rename reindex, ...)
+    # bumps the version in the same transaction. Bulk Core UPDATEs must call
+    # incrementar_versao themselves.
+    if any(isinstance(obj, OrdemServico) for obj in chain(session.new, session.dirty, session.deleted)):
+        incrementar_versao(session.connection())
+
+
+def gerar_etag(*partes) -> str:
+    """Strong ETag from the table version plus whatever shapes the response"""
+    chave = "|".join(str(p) for p in partes)
+    return '"' + hashlib.sha1(chave.encode()).hexdigest()[:20] + '"'
+
+
+def nao_modificado(request: Request, etag: str) -> Optional[Response]:
+    """Return a 304 response if the client's If-None-Match matches `etag`"""
+    cabecalho = request.headers.get("if-none-match")
+    if not cabecalho:
+        return None
+    
+    candidatos = [c.strip() for c in cabecalho.split(",")]
+    # If-None-Match usa comparação fraca: ignora o prefixo W/
+    if "*" in candidatos or etag in (c[2:] if c.startswith("W/") else c for c in candidatos):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List, Optional, Tuple
+from ..models.ordem_servico import OrdemServico
+
+# Eventos mantidos para reconexão (Last-Event-ID)
+HISTORICO_MAXIMO = 500
+
+# Eventos pendentes por cliente antes de ele ser desconectado (cliente lento)
+FILA_MAXIMA = 1000
+
+
+def resumo_os(os: OrdemServico) -> dict:
+    """Compact OS fields sent in change events"""
+    return {
+        "id": os.id,
+        "numero_os": os.numero_os,
+        "status": os.status,
+        "tipo_os": os.tipo_os,
+        "cidade": os.cidade,
+        "tecnico_executor_id": os.tecnico_executor_id,
+    }
+
+
+class _Assinante:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=FILA_MAXIMA)
+    
+    def entregar(self, evento: Optional[dict]) -> None:
+        # Runs on the subscriber's loop; None tells the stream to close
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Drop a slow client; it reconnects with Last-Event-ID
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait(None)
+
+
+class EventBroker:
+    """
+    In-process pub/sub of OS change events.
+    
+    `publicar` may be called from sync route handlers (threadpool) or from
+    the event loop; events are handed to each subscriber's loop thread-safely.
+    """
+    
+    def __init__(self, historico: int = HISTORICO_MAXIMO):
+        self._lock = threading.Lock()
+        self._ultimo_id = 0
+        self._historico = deque(maxlen=historico)
+        self._assinantes = set()
+    
+    def publicar(self, tipo: str, os: dict, status_anterior: Optional[str] = None) -> dict:
+        """Publish a change event (tipo: criada, assumida, finalizada, atualizada, removida)"""
+        with self._lock:
+            self._ultimo_id += 1
+            evento = {
+                "id": self._ultimo_id,
+                "tipo": tipo,
+                "os": os,
+                "status_anterior": status_anterior,
+                "em": datetime.utcnow().isoformat(),
+            }
+            self._historico.append(evento)
+            assinantes = list(self._assinantes)
+        
+        for assinante in assinantes:
+            try:
+                assinante.loop.call_soon_threadsafe(assinante.entregar, evento)
+            except RuntimeError:
+                # Loop already closed
+                self.cancelar(assinante)
+        return evento
+    
+    def assinar(self, ultimo_id: Optional[int] = None) -> Tuple[_Assinante, List[dict], bool]:
+        """
+        Subscribe the current event loop.
+        
+        Returns:
+            tuple: (subscriber, events after `ultimo_id` to replay,
+                    True if the gap can't be replayed and the client must resync)
+        """
+        assinante = _Assinante(asyncio.get_running_loop())
+        with self._lock:
+            self._assinantes.add(assinante)
+            if ultimo_id is None:
+                return assinante, [], False
+            
+            if ultimo_id > self._ultimo_id:
+                # Ids from before a server restart
+                return assinante, [], True
+            
+            pendentes = [e for e in self._historico if e["id"] > ultimo_id]
+            primeiro_disponivel = self._historico[0]["id"] if self._historico else self._ultimo_id + 1
+            perdeu_eventos = ultimo_id + 1 < primeiro_disponivel
+            return assinante, pendentes, perdeu_eventos
+    
+    def cancelar(self, assinante: _Assinante) -> None:
+        with self._lock:
+            self._assinantes.discard(assinante)
+
+
+event_broker = EventBroker()
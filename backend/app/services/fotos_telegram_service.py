@@ -0,0 +1,247 @@
+"""
+Photos sent by the Telegram bot as file_ids (`fotos_telegram` in POST /os).
+
+The OS is created at once with those photo columns set to "" (pending); a
+background worker started in the lifespan downloads each file from the Bot
+API, stores it through salvar_foto (dedup, processing, thumbnails) and fills
+the column in. Failures are retried with exponential backoff; once the
+attempts run out the column gets FOTO_FALHOU so clients stop waiting.
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from urllib.parse import quote
+from fastapi import UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..database import SessionLocal
+from ..models.foto_pendente import FotoPendente
+from ..models.ordem_servico import OrdemServico
+from .eventos_service import event_broker, resumo_os
+from .storage_service import salvar_foto
+
+settings = get_settings()
+
+# Bloco do download e quanto fica em memória antes de ir para disco
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_BYTES = 1024 * 1024
+
+# Uma pendente reservada some da fila por este tempo (outro worker não a pega)
+RESERVA_SECONDS = 120
+
+# Maior espera entre tentativas
+BACKOFF_MAX_SECONDS = 30 * 60
+
+# Conexão keep-alive com a Bot API, reaproveitada entre downloads
+_sessao = requests.Session()
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_acordar: Optional[asyncio.Event] = None
+
+
+# Valor da coluna da foto quando as tentativas acabam ("" = ainda pendente)
+FOTO_FALHOU = "falhou"
+
+# Resposta quando chegam file_ids mas o backend não tem o token do bot
+ERRO_SEM_TOKEN = "Servidor sem TELEGRAM_BOT_TOKEN: envie as URLs das fotos"
+
+
+def registrar_fotos_pendentes(db: Session, os_nova: OrdemServico, fotos: Dict[str, str]) -> None:
+    """Queue the Telegram photos of a new OS (committed by the caller)"""
+    if not settings.telegram_bot_token:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=ERRO_SEM_TOKEN)
+    for campo, file_id in fotos.items():
+        setattr(os_nova, campo, "")
+        os_nova.fotos_pendentes.append(FotoPendente(campo=campo, file_id=file_id))
+
+
+def registrar_fotos_pendentes_lote(db: Session, fotos_por_os: Dict[int, Dict[str, str]]) -> None:
+    """Queue the Telegram photos of OS already inserted in bulk (one executemany)"""
+    linhas = [
+        {"os_id": os_id, "campo": campo, "file_id": file_id}
+        for os_id, fotos in fotos_por_os.items()
+        for campo, file_id in fotos.items()
+    ]
+    if linhas:
+        db.execute(insert(FotoPendente), linhas)
+
+
+def acordar_worker() -> None:
+    """Make the worker look for pending photos now (safe from the threadpool)"""
+    if _loop is not None and _acordar is not None:
+        _loop.call_soon_threadsafe(_acordar.set)
+
+
+def _reservar(limite: int) -> List[dict]:
+    """Claim due pending photos; the conditional UPDATE keeps two workers off the same row"""
+    agora = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        candidatas = (
+            db.query(FotoPendente)
+            .filter(
+                FotoPendente.proxima_tentativa <= agora,
+                FotoPendente.tentativas < settings.fotos_telegram_tentativas
+            )
+            .order_by(FotoPendente.id)
+            .limit(limite)
+            .all()
+        )
+        reservadas = []
+        for pendente in candidatas:
+            reserva = db.execute(
+                update(FotoPendente)
+                .where(
+                    FotoPendente.id == pendente.id,
+                    FotoPendente.proxima_tentativa == pendente.proxima_tentativa
+                )
+                .values(proxima_tentativa=agora + timedelta(seconds=RESERVA_SECONDS))
+                .execution_options(synchronize_session=False)
+            )
+            if reserva.rowcount:
+                reservadas.append({
+                    "id": pendente.id,
+                    "os_id": pendente.os_id,
+                    "campo": pendente.campo,
+                    "file_id": pendente.file_id,
+                    "tentativas": pendente.tentativas,
+                })
+        db.commit()
+        return reservadas
+    finally:
+        db.close()
+
+
+def _baixar(file_id: str) -> Tuple[tempfile.SpooledTemporaryFile, int, str]:
+    """Download a Telegram file (getFile + file URL) into a spooled temp file"""
+    base = settings.telegram_api_url.rstrip("/")
+    token = settings.telegram_bot_token
+
+    resposta = _sessao.get(f"{base}/bot{token}/getFile", params={"file_id": file_id}, timeout=30)
+    try:
+        dados = resposta.json()
+    except ValueError:
+        resposta.raise_for_status()
+        raise
+    if not dados.get("ok"):
+        raise RuntimeError(f"getFile recusado: {dados.get('description')}")
+    caminho = dados["result"]["file_path"]
+
+    destino = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    tamanho = 0
+    try:
+        with _sessao.get(f"{base}/file/bot{token}/{caminho}", stream=True, timeout=60) as download:
+            download.raise_for_status()
+            for bloco in download.iter_content(DOWNLOAD_CHUNK_SIZE):
+                tamanho += len(bloco)
+                if tamanho > settings.upload_max_bytes:
+                    raise RuntimeError("Foto maior que o limite de upload")
+                destino.write(bloco)
+        destino.seek(0)
+        return destino, tamanho, caminho
+    except BaseException:
+        destino.close()
+        raise
+
+
+def _concluir(pendente: dict, url: str) -> None:
+    db = SessionLocal()
+    try:
+        os_alvo = db.get(OrdemServico, pendente["os_id"])
+        if os_alvo is not None:
+            setattr(os_alvo, pendente["campo"], url)
+            resumo = resumo_os(os_alvo)
+        db.query(FotoPendente).filter(FotoPendente.id == pendente["id"]).delete()
+        db.commit()  # o flush da O.S já incrementa a versão (ETag)
+    finally:
+        db.close()
+    if os_alvo is not None:
+        event_broker.publicar("atualizada", resumo)
+
+
+def _adiar(pendente: dict, erro: str) -> None:
+    tentativas = pendente["tentativas"] + 1
+    atraso = min(settings.fotos_telegram_intervalo_seconds * 2 ** tentativas, BACKOFF_MAX_SECONDS)
+    desistiu = tentativas >= settings.fotos_telegram_tentativas
+    resumo = None
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(FotoPendente)
+            .where(FotoPendente.id == pendente["id"])
+            .values(
+                tentativas=tentativas,
+                proxima_tentativa=datetime.utcnow() + timedelta(seconds=atraso),
+                ultimo_erro=erro[:500]
+            )
+        )
+        if desistiu:
+            # Estado final: a pendente fica com o erro, a O.S deixa de mostrar "em processamento"
+            os_alvo = db.get(OrdemServico, pendente["os_id"])
+            if os_alvo is not None and getattr(os_alvo, pendente["campo"]) == "":
+                setattr(os_alvo, pendente["campo"], FOTO_FALHOU)
+                resumo = resumo_os(os_alvo)
+        db.commit()  # o flush da O.S já incrementa a versão (ETag)
+    finally:
+        db.close()
+    if resumo is not None:
+        event_broker.publicar("atualizada", resumo)
+
+    descricao = f"Foto {pendente['campo']} da O.S {pendente['os_id']}"
+    if desistiu:
+        print(f"[AVISO] {descricao} desistida apos {tentativas} tentativas: {erro}")
+    else:
+        print(f"[AVISO] {descricao} falhou ({tentativas}a tentativa), nova em {atraso}s: {erro}")
+
+
+async def _resolver(pendente: dict) -> None:
+    try:
+        arquivo, tamanho, caminho = await run_in_threadpool(_baixar, pendente["file_id"])
+        try:
+            extensao = os.path.splitext(caminho)[1] or ".jpg"
+            upload = UploadFile(arquivo, size=tamanho, filename=f"{pendente['campo']}_{pendente['os_id']}{extensao}")
+            url = await salvar_foto(upload, pasta="os-sistema/telegram")
+        finally:
+            arquivo.close()
+        await run_in_threadpool(_concluir, pendente, url)
+    except Exception as e:
+        erro = e.detail if isinstance(e, HTTPException) else str(e)
+        # Erros do requests trazem a URL, que contém o token do bot
+        token = settings.telegram_bot_token
+        erro = str(erro).replace(token, "<token>").replace(quote(token, safe=""), "<token>")
+        try:
+            await run_in_threadpool(_adiar, pendente, erro)
+        except Exception as e_adiar:
+            print(f"[AVISO] Falha ao reagendar foto pendente {pendente['id']}: {e_adiar}")
+
+
+async def worker_fotos_telegram() -> None:
+    """Background loop (lifespan): resolves due pending photos a few at a time"""
+    global _loop, _acordar
+    _loop = asyncio.get_running_loop()
+    _acordar = asyncio.Event()
+
+    while True:
+        # Limpo antes de buscar: um aviso durante a busca não se perde
+        _acordar.clear()
+        try:
+            pendentes = await run_in_threadpool(_reservar, settings.fotos_telegram_simultaneas)
+        except Exception as e:
+            print(f"[AVISO] Fotos do Telegram: falha ao buscar pendentes: {e}")
+            pendentes = []
+
+        if pendentes:
+            await asyncio.gather(*(_resolver(p) for p in pendentes))
+            continue
+
+        try:
+            await asyncio.wait_for(_acordar.wait(), settings.fotos_telegram_intervalo_seconds)
+        except asyncio.TimeoutError:
+            pass
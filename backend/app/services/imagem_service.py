@@ -0,0 +1,204 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from fastapi import UploadFile, HTTPException, status
+from ..config import get_settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional: sem ele as fotos sobem como vieram
+    Image = None
+
+settings = get_settings()
+
+# Bloco de cópia do upload para o arquivo temporário lido pelo worker
+COPIA_CHUNK_SIZE = 64 * 1024
+
+_FORMATOS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+# Criado no primeiro uso (spawn: o processo da API tem threads)
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def processar_imagem(entrada: str, saida: str, max_dimensao: int, qualidade: int, formato: str) -> dict:
+    """
+    Downscale and re-encode an image file (runs in a worker process).
+
+    - Applies the EXIF orientation, then drops all metadata (EXIF/GPS)
+    - Fits the image in max_dimensao x max_dimensao (never upscales)
+    - Re-encodes as JPEG (progressive) or WebP with `qualidade`
+
+    Returns:
+        dict: byte sizes, final dimensions and CPU time of the conversion
+    """
+    inicio = time.process_time()
+    with Image.open(entrada) as original:
+        # JPEG: o libjpeg já decodifica em 1/2, 1/4 ou 1/8 da resolução
+        # (nunca abaixo do tamanho final), o que corta a maior parte do custo
+        escala = min(1.0, max_dimensao / max(original.size))
+        original.draft("RGB", (int(original.width * escala), int(original.height * escala)))
+        imagem = ImageOps.exif_transpose(original)
+        if imagem.mode not in ("RGB", "L"):
+            imagem = imagem.convert("RGB")
+        imagem.thumbnail((max_dimensao, max_dimensao), Image.LANCZOS)
+
+        opcoes = {"quality": qualidade}
+        if formato == "JPEG":
+            opcoes.update(optimize=True, progressive=True)
+        else:
+            opcoes.update(method=4)
+        # Sem exif=/icc_profile=: nenhum metadado é copiado para a saída
+        imagem.save(saida, formato, **opcoes)
+        largura, altura = imagem.size
+
+    return {
+        "bytes_antes": os.path.getsize(entrada),
+        "bytes_depois": os.path.getsize(saida),
+        "largura": largura,
+        "altura": altura,
+        "cpu_ms": (time.process_time() - inicio) * 1000,
+    }
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.imagem_processos,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def iniciar_pool() -> None:
+    """
+    Spawn the worker processes at startup (lifespan): each one imports the
+    app modules, ~1 s that would otherwise land on the first uploads
+    """
+    if Image is None or not settings.imagem_processar:
+        return
+    for _ in range(settings.imagem_processos):
+        _pool().submit(os.getpid)
+
+
+def encerrar_pool() -> None:
+    """Stop the worker processes (lifespan shutdown)"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+
+def tamanho_upload(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, io.SEEK_END)
+    tamanho = file.file.tell()
+    file.file.seek(0)
+    return tamanho
+
+
+def checar_tamanho(tamanho: int) -> None:
+    if tamanho > settings.upload_max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Imagem muito grande ({tamanho // 1024} KB). Máximo: {settings.upload_max_bytes // 1024} KB"
+        )
+
+
+async def _copiar_para_disco(file: UploadFile) -> str:
+    """Copy the upload to a named temp file, in chunks (the worker needs a path)"""
+    await file.seek(0)
+    fd, caminho = tempfile.mkstemp(prefix="os-foto-")
+    with os.fdopen(fd, "wb") as destino:
+        while True:
+            bloco = await file.read(COPIA_CHUNK_SIZE)
+            if not bloco:
+                break
+            destino.write(bloco)
+    return caminho
+
+
+async def preparar_imagem(file: UploadFile) -> Optional[Tuple[str, str, int]]:
+    """
+    Resize/recompress an uploaded photo in the process pool.
+
+    Returns:
+        tuple: (path of the processed file, file name, size) - the caller
+               deletes the file. None if processing is disabled, Pillow is
+               missing or the file isn't a readable image (upload the original).
+    """
+    if Image is None or not settings.imagem_processar:
+        return None
+
+    formato = settings.imagem_formato.upper()
+    extensao = _FORMATOS.get(formato)
+    if extensao is None:
+        print(f"[AVISO] IMAGEM_FORMATO invalido ({settings.imagem_formato}), enviando original")
+        return None
+
+    entrada = await _copiar_para_disco(file)
+    fd, saida = tempfile.mkstemp(prefix="os-foto-", suffix=extensao)
+    os.close(fd)
+    try:
+        loop = asyncio.get_running_loop()
+        info = await loop.run_in_executor(
+            _pool(),
+            processar_imagem,
+            entrada,
+            saida,
+            settings.imagem_max_dimensao,
+            settings.imagem_qualidade,
+            formato
+        )
+    except BrokenProcessPool as e:
+        # Worker morreu (ex.: OOM numa foto enorme): descarta o pool quebrado
+        # para o próximo upload criar outro
+        encerrar_pool()
+        os.remove(saida)
+        print(f"[AVISO] Pool de imagens reiniciado, enviando original: {e}")
+        return None
+    except Exception as e:
+        os.remove(saida)
+        print(f"[AVISO] Falha ao processar imagem, enviando original: {e}")
+        return None
+    finally:
+        os.remove(entrada)
+
+    nome = os.path.splitext(file.filename or "foto")[0] + extensao
+    return saida, nome, info["bytes_depois"]
+
+
+async def gerar_miniatura(entrada: str, saida: str) -> bool:
+    """
+    Write a IMAGEM_THUMB_DIMENSAO JPEG thumbnail of an image file, in the
+    process pool. Returns False (and logs) if it couldn't be generated.
+    """
+    if Image is None:
+        return False
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            _pool(),
+            processar_imagem,
+            entrada,
+            saida,
+            settings.imagem_thumb_dimensao,
+            70,
+            "JPEG"
+        )
+        return True
+    except BrokenProcessPool as e:
+        encerrar_pool()
+        print(f"[AVISO] Pool de imagens reiniciado, miniatura nao gerada: {e}")
+    except Exception as e:
+        print(f"[AVISO] Falha ao gerar miniatura: {e}")
+    if os.path.exists(saida):
+        os.remove(saida)
+    return False
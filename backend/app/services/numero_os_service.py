@@ -0,0 +1,65 @@
+from datetime import datetime
+from sqlalchemy import select, update, func, cast, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..models.ordem_servico import OrdemServico
+from ..models.os_sequencia import OsSequencia
+
+
+def _insert_ignore(dialect_name: str):
+    """INSERT ... ON CONFLICT DO NOTHING for the current dialect"""
+    if dialect_name == "postgresql":
+        return postgresql.insert(OsSequencia).on_conflict_do_nothing(index_elements=["ano"])
+    return sqlite.insert(OsSequencia).on_conflict_do_nothing(index_elements=["ano"])
+
+
+def _maior_numero_existente(db: Session, ano: int) -> int:
+    """Highest numeric suffix already used for the year (numeric, not string, order)"""
+    prefixo = f"OS-{ano}-"
+    maior = db.execute(
+        select(func.max(cast(func.substr(OrdemServico.numero_os, len(prefixo) + 1), Integer)))
+        .where(OrdemServico.numero_os.like(f"{prefixo}%"))
+    ).scalar()
+    return maior or 0
+
+
+def reservar_numeros(db: Session, quantidade: int = 1, ano: int = None) -> int:
+    """
+    Atomically reserve `quantidade` consecutive numbers for the year.
+    
+    The increment runs in the caller's transaction: the UPDATE takes the row
+    lock (Postgres) / write lock (SQLite) and holds it until the caller commits,
+    so call it right before inserting the OS to keep that window short.
+    
+    Returns:
+        int: The first reserved number
+    """
+    ano = ano or datetime.now().year
+    incremento = (
+        update(OsSequencia)
+        .where(OsSequencia.ano == ano)
+        .values(ultimo_numero=OsSequencia.ultimo_numero + quantidade)
+    )
+    
+    result = db.execute(incremento)
+    if result.rowcount == 0:
+        # First OS of the year: seed from existing orders, then increment
+        db.execute(
+            _insert_ignore(db.get_bind().dialect.name).values(
+                ano=ano,
+                ultimo_numero=_maior_numero_existente(db, ano)
+            )
+        )
+        db.execute(incremento)
+    
+    ultimo = db.execute(
+        select(OsSequencia.ultimo_numero).where(OsSequencia.ano == ano)
+    ).scalar_one()
+    
+    return ultimo - quantidade + 1
+
+
+def formatar_numero_os(numero: int, ano: int = None) -> str:
+    """Format a sequence number as OS-YYYY-NNN"""
+    ano = ano or datetime.now().year
+    return f"OS-{ano}-{numero:03d}"
@@ -0,0 +1,201 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, literal, select, text, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..database import SessionLocal
+from ..models.ordem_servico import OrdemServico
+from ..models.dashboard_rollup import DashboardRollup
+from .dashboard_cache import dashboard_cache
+from .etag_service import incrementar_versao
+
+DIMENSOES = ["dia", "status", "cidade", "motivo_abertura", "tipo_os", "tecnico_executor_id"]
+MEDIDAS = [
+    "total",
+    "soma_espera_min", "qtd_espera",
+    "soma_execucao_min", "qtd_execucao",
+    "soma_total_min", "qtd_total",
+]
+
+
+def _minutos(fim, inicio) -> Optional[float]:
+    if not fim or not inicio:
+        return None
+    return (fim - inicio).total_seconds() / 60
+
+
+def snapshot(os: OrdemServico) -> Optional[dict]:
+    """
+    Contribution of an OS to the rollups in its current state.
+    
+    Take one before and one after a change and pass both to `aplicar`.
+    """
+    if os is None or os.criado_em is None:
+        return None
+    
+    linha = {
+        "dia": os.criado_em.date(),
+        "status": os.status,
+        "cidade": os.cidade or "",
+        "motivo_abertura": os.motivo_abertura or "",
+        "tipo_os": os.tipo_os or "normal",
+        "tecnico_executor_id": os.tecnico_executor_id or 0,
+        "total": 1,
+    }
+    
+    # Average times only consider completed OS (same rule as the dashboard)
+    tempos = {"espera": None, "execucao": None, "total": None}
+    if os.status == "concluido":
+        tempos["espera"] = _minutos(os.iniciado_em, os.criado_em)
+        tempos["execucao"] = _minutos(os.concluido_em, os.iniciado_em)
+        tempos["total"] = _minutos(os.concluido_em, os.criado_em)
+    for nome, valor in tempos.items():
+        linha[f"soma_{nome}_min"] = valor or 0.0
+        linha[f"qtd_{nome}"] = 1 if valor is not None else 0
+    
+    return linha
+
+
+def _upsert(db: Session, linha: dict, sinal: int) -> None:
+    """Add (sinal=1) or remove (sinal=-1) one contribution"""
+    valores = dict(linha)
+    for medida in MEDIDAS:
+        valores[medida] = valores[medida] * sinal
+    
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(DashboardRollup).values(**valores)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=DIMENSOES,
+        set_={m: getattr(DashboardRollup, m) + getattr(stmt.excluded, m) for m in MEDIDAS}
+    )
+    db.execute(stmt)
+
+
+def aplicar(db: Session, antes: Optional[dict], depois: Optional[dict]) -> None:
+    """Move an OS contribution from `antes` to `depois` (either may be None)"""
+    if antes == depois:
+        return
+    if antes:
+        _upsert(db, antes, -1)
+    if depois:
+        _upsert(db, depois, 1)
+
+
+def _acumular(acumulado: dict, linha: dict, sinal: int = 1) -> None:
+    """Add (sinal=1) or remove (sinal=-1) a snapshot in the rollup row of its dimensions"""
+    chave = tuple(linha[d] for d in DIMENSOES)
+    if chave not in acumulado:
+        acumulado[chave] = {**{d: linha[d] for d in DIMENSOES}, **{m: 0 for m in MEDIDAS}}
+    for medida in MEDIDAS:
+        acumulado[chave][medida] += linha[medida] * sinal
+
+
+def aplicar_lote(db: Session, mudancas: List[Tuple[Optional[dict], Optional[dict]]]) -> None:
+    """
+    `aplicar` for many (antes, depois) pairs at once.
+    
+    Contributions are netted per dimension row first, so there is one upsert
+    per distinct row (and none where they cancel out).
+    """
+    acumulado = {}
+    for antes, depois in mudancas:
+        if antes == depois:
+            continue
+        if antes:
+            _acumular(acumulado, antes, -1)
+        if depois:
+            _acumular(acumulado, depois, 1)
+    for linha in acumulado.values():
+        if any(linha[m] for m in MEDIDAS):
+            _upsert(db, linha, 1)
+
+
+def reconstruir(db: Session) -> int:
+    """
+    Rebuild all rollups from ordens_servico (backfill / repair).
+    
+    Returns:
+        int: Number of OS processed
+    """
+    # Segura as escritas nos rollups até o commit, para que uma O.S gravada
+    # durante a reconstrução não se perca nem conte em dobro (no SQLite o
+    # DELETE já pega o lock de escrita do banco)
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE dashboard_rollups IN EXCLUSIVE MODE"))
+    db.query(DashboardRollup).delete()
+    
+    acumulado = {}
+    processadas = 0
+    for os in db.query(OrdemServico).yield_per(1000):
+        linha = snapshot(os)
+        if not linha:
+            continue
+        _acumular(acumulado, linha)
+        processadas += 1
+    
+    if acumulado:
+        db.bulk_insert_mappings(DashboardRollup, list(acumulado.values()))
+    # O dashboard muda sem mudar nenhuma O.S: nova versão para o ETag
+    incrementar_versao(db.connection())
+    db.commit()
+    dashboard_cache.invalidate()
+    return processadas
+
+
+def divergencias(db: Session) -> Dict[str, Tuple[int, int]]:
+    """
+    Statuses whose rollup total disagrees with COUNT(*) of ordens_servico,
+    as {status: (orders, rollup total)}.
+    
+    Catches rows inserted, deleted or moved between statuses outside the OS
+    routes (scripts, manual SQL). Both sides come from one statement, so a
+    write committed meanwhile can't show up as a false mismatch.
+    """
+    contagens = union_all(
+        select(literal("os").label("origem"), OrdemServico.status, func.count().label("total"))
+        .group_by(OrdemServico.status),
+        select(literal("rollup").label("origem"), DashboardRollup.status, func.sum(DashboardRollup.total).label("total"))
+        .group_by(DashboardRollup.status),
+    )
+    por_status = {}
+    for origem, status, total in db.execute(contagens):
+        por_status.setdefault(status, [0, 0])[origem == "rollup"] = int(total or 0)
+    return {status: tuple(totais) for status, totais in por_status.items() if totais[0] != totais[1]}
+
+
+def precisa_reconstruir(db: Session) -> bool:
+    """True when the rollups are missing (first start after upgrade) or out of sync"""
+    return bool(divergencias(db))
+
+
+def conferir() -> Optional[int]:
+    """
+    Rebuild the rollups if they drifted from ordens_servico.
+    
+    Returns:
+        int: Number of OS processed, or None if they were consistent
+    """
+    db = SessionLocal()
+    try:
+        diferencas = divergencias(db)
+        if not diferencas:
+            return None
+        print(f"[AVISO] Rollups do dashboard divergem das O.S (status: (O.S, rollup)): {diferencas}")
+        return reconstruir(db)
+    finally:
+        db.close()
+
+
+async def monitorar_rollups(intervalo: float) -> None:
+    """
+    Background check (started in the lifespan): every `intervalo` seconds,
+    compare the rollups with the orders and rebuild them on a mismatch.
+    """
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            processadas = await asyncio.to_thread(conferir)
+            if processadas is not None:
+                print(f"[OK] Rollups do dashboard reconstruidos ({processadas} O.S)")
+        except Exception as e:
+            print(f"[AVISO] Falha ao conferir rollups do dashboard: {e}")
@@ -0,0 +1,200 @@
+from typing import List, Optional, Tuple
+from sqlalchemy import text, inspect, func, or_, literal, Float, Integer
+from sqlalchemy.orm import Session, Query
+from ..models.user import User
+from ..models.ordem_servico import OrdemServico
+
+# Tabela FTS5 usada no modo local (SQLite)
+FTS_TABLE = "ordens_servico_fts"
+
+# Tokenizer trigram casa substrings (equivalente ao ILIKE '%termo%'), mas só
+# com termos de 3+ caracteres
+FTS_MIN_TERM = 3
+
+# Definido em configurar_indice_busca (lifespan)
+_fts_disponivel = False
+
+
+def _nome_tecnico(user: Optional[User]) -> str:
+    if not user:
+        return ""
+    return f"{user.username or ''} {user.nome or ''}"
+
+
+def texto_busca(os: OrdemServico, tecnico_campo: Optional[User], tecnico_executor: Optional[User]) -> str:
+    """Build the denormalized, lowercase text searched by list_os"""
+    partes = [
+        os.numero_os,
+        os.cidade,
+        os.pppoe_cliente,
+        os.motivo_abertura,
+        os.porta_placa_olt,
+        _nome_tecnico(tecnico_campo),
+        _nome_tecnico(tecnico_executor),
+    ]
+    return " ".join(p.strip() for p in partes if p and p.strip()).lower()
+
+
+def indexar_os(db: Session, os: OrdemServico) -> None:
+    """
+    Refresh the search text of an OS (call after flush, before commit).
+
+    Postgres indexes busca_texto directly; SQLite also mirrors it into FTS5.
+    """
+    tecnico_campo = db.get(User, os.tecnico_campo_id) if os.tecnico_campo_id else None
+    tecnico_executor = db.get(User, os.tecnico_executor_id) if os.tecnico_executor_id else None
+    os.busca_texto = texto_busca(os, tecnico_campo, tecnico_executor)
+
+    if _fts_disponivel:
+        db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": os.id})
+        db.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, busca_texto) VALUES (:id, :texto)"),
+            {"id": os.id, "texto": os.busca_texto}
+        )
+
+
+def indexar_lote(db: Session, linhas: List[Tuple[int, str]]) -> None:
+    """
+    Mirror many (id, busca_texto) pairs into FTS5 (no-op on Postgres).
+    
+    For bulk writes that set busca_texto in the statement itself instead of
+    calling indexar_os per OS: one executemany each for DELETE and INSERT.
+    """
+    if _fts_disponivel and linhas:
+        db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), [{"id": os_id} for os_id, _ in linhas])
+        db.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, busca_texto) VALUES (:id, :texto)"),
+            [{"id": os_id, "texto": texto} for os_id, texto in linhas]
+        )
+
+
+def remover_indice_os(db: Session, os_id: int) -> None:
+    """Drop an OS from the FTS5 mirror (no-op on Postgres)"""
+    if _fts_disponivel:
+        db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": os_id})
+
+
+def reindexar_por_tecnico(db: Session, user_id: int) -> None:
+    """Refresh the search text of every OS linked to a user (after rename)"""
+    ordens = (
+        db.query(OrdemServico)
+        .filter(or_(OrdemServico.tecnico_campo_id == user_id, OrdemServico.tecnico_executor_id == user_id))
+        .all()
+    )
+    for os in ordens:
+        indexar_os(db, os)
+
+
+def aplicar_busca(query: Query, db: Session, termo: str):
+    """
+    Restrict a list_os query to OS matching `termo`.
+
+    Returns:
+        tuple: (filtered query, rank expression to order by - lower is better)
+    """
+    termo = termo.strip().lower()
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        # Served by the GIN tsvector and pg_trgm indexes on busca_texto
+        documento = func.to_tsvector("simple", func.coalesce(OrdemServico.busca_texto, ""))
+        consulta = func.plainto_tsquery("simple", termo)
+        query = query.filter(
+            or_(
+                documento.op("@@")(consulta),
+                OrdemServico.busca_texto.ilike(f"%{termo}%")
+            )
+        )
+        return query, -func.ts_rank(documento, consulta)
+
+    if _fts_disponivel and len(termo) >= FTS_MIN_TERM:
+        frase = '"' + termo.replace('"', '""') + '"'
+        resultados = (
+            text(f"SELECT rowid AS os_id, rank AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :frase")
+            .bindparams(frase=frase)
+            .columns(os_id=Integer, rank=Float)
+            .subquery()
+        )
+        query = query.join(resultados, resultados.c.os_id == OrdemServico.id)
+        return query, resultados.c.rank
+
+    # Termos curtos (ou SQLite sem FTS5): substring simples no texto desnormalizado
+    query = query.filter(OrdemServico.busca_texto.like(f"%{termo}%"))
+    return query, literal(0)
+
+
+def _backfill(conn) -> int:
+    """Compute busca_texto for rows that don't have it yet"""
+    total = 0
+    with Session(bind=conn) as db:
+        while True:
+            lote = (
+                db.query(OrdemServico)
+                .filter(OrdemServico.busca_texto.is_(None))
+                .limit(500)
+                .all()
+            )
+            if not lote:
+                break
+            for os in lote:
+                os.busca_texto = texto_busca(os, os.tecnico_campo, os.tecnico_executor)
+            db.flush()
+            total += len(lote)
+    return total
+
+
+def configurar_indice_busca(engine) -> None:
+    """
+    Create the search column/indexes if missing and backfill existing rows.
+
+    - Postgres: pg_trgm GIN index (ILIKE) + GIN tsvector index (ranking)
+    - SQLite: FTS5 trigram table mirroring busca_texto
+    """
+    global _fts_disponivel
+
+    colunas = [c["name"] for c in inspect(engine).get_columns("ordens_servico")]
+    with engine.begin() as conn:
+        if "busca_texto" not in colunas:
+            conn.execute(text("ALTER TABLE ordens_servico ADD COLUMN busca_texto TEXT"))
+
+        if engine.dialect.name == "postgresql":
+            try:
+                with conn.begin_nested():
+                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                    conn.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_ordens_servico_busca_trgm "
+                        "ON ordens_servico USING GIN (busca_texto gin_trgm_ops)"
+                    ))
+            except Exception as e:
+                print(f"[AVISO] pg_trgm indisponivel, ILIKE da busca sem indice: {e}")
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_ordens_servico_busca_tsv "
+                "ON ordens_servico USING GIN (to_tsvector('simple', coalesce(busca_texto, '')))"
+            ))
+
+        atualizadas = _backfill(conn)
+
+        if engine.dialect.name == "sqlite":
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    "USING fts5(busca_texto, tokenize='trigram')"
+                ))
+                _fts_disponivel = True
+            except Exception as e:
+                print(f"[AVISO] FTS5 indisponivel, busca usara LIKE: {e}")
+
+        if _fts_disponivel:
+            indexadas = conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+            esperadas = conn.execute(
+                text("SELECT count(*) FROM ordens_servico WHERE busca_texto IS NOT NULL")
+            ).scalar()
+            if atualizadas or indexadas != esperadas:
+                conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+                conn.execute(text(
+                    f"INSERT INTO {FTS_TABLE} (rowid, busca_texto) "
+                    "SELECT id, busca_texto FROM ordens_servico WHERE busca_texto IS NOT NULL"
+                ))
+
+    if atualizadas:
+        print(f"[OK] Indice de busca preenchido para {atualizadas} O.S")
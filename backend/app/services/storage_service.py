@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import BinaryIO, Dict, Optional, Tuple
+from fastapi import UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy.dialects import postgresql, sqlite
+from ..config import get_settings
+from ..database import SessionLocal
+from ..models.foto import Foto
+from . import cloudinary_service
+from .imagem_service import preparar_imagem, gerar_miniatura, tamanho_upload, checar_tamanho
+
+settings = get_settings()
+
+# Bloco de leitura ao copiar/gerar o hash
+COPIA_CHUNK_SIZE = 64 * 1024
+
+# Extensões aceitas quando a foto sobe sem processamento: /media é servido na
+# mesma origem do painel, então nada de .html/.svg/.js
+EXTENSOES_IMAGEM = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".heic"}
+
+# Sufixo das miniaturas do armazenamento local (<hash>_thumb.jpg)
+SUFIXO_MINIATURA = "_thumb.jpg"
+
+
+class CloudinaryStorage:
+    """Photos on Cloudinary (streamed upload, thumbnails as derived URLs)"""
+
+    nome = "cloudinary"
+
+    async def salvar(self, file: UploadFile, pasta: str) -> str:
+        return await cloudinary_service.upload_image(file, folder=pasta)
+
+    def thumbnail_url(self, url: str) -> Optional[str]:
+        return cloudinary_service.thumbnail_url(url)
+
+    def disponivel(self, url: str) -> bool:
+        return True
+
+
+class LocalStorage:
+    """
+    Content-addressed photos on the local filesystem, served under /media.
+
+    A photo is stored once per content: <dir>/ab/cd/<sha256><ext>, where ab/cd
+    are the first hex digits of the hash (keeps directories small). Uploading
+    the same bytes again returns the existing URL. A JPEG thumbnail is written
+    next to it as <sha256>_thumb.jpg. Files are never deleted: the same content
+    may be referenced by several OS.
+    """
+
+    nome = "local"
+
+    def __init__(self, diretorio: str, url_base: str):
+        self.diretorio = os.path.abspath(diretorio)
+        self.url_base = url_base.rstrip("/")
+        self._tmp = os.path.join(self.diretorio, "tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+
+    def _caminho(self, digest: str, extensao: str) -> str:
+        return os.path.join(self.diretorio, digest[:2], digest[2:4], digest + extensao)
+
+    def _gravar(self, origem: BinaryIO, extensao: str) -> Tuple[str, bool]:
+        """
+        Copy `origem` into the store while hashing it (runs in the threadpool)
+
+        Returns:
+            tuple: (final path, True if the content was new)
+        """
+        temporario = os.path.join(self._tmp, uuid.uuid4().hex)
+        sha256 = hashlib.sha256()
+        try:
+            with open(temporario, "wb") as destino:
+                while True:
+                    bloco = origem.read(COPIA_CHUNK_SIZE)
+                    if not bloco:
+                        break
+                    sha256.update(bloco)
+                    destino.write(bloco)
+
+            caminho = self._caminho(sha256.hexdigest(), extensao)
+            if os.path.exists(caminho):
+                os.remove(temporario)
+                return caminho, False
+
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            os.replace(temporario, caminho)  # atômico: nunca serve arquivo pela metade
+            return caminho, True
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    async def _miniatura(self, caminho: str) -> None:
+        miniatura = os.path.splitext(caminho)[0] + SUFIXO_MINIATURA
+        if os.path.exists(miniatura):
+            return
+        temporario = os.path.join(self._tmp, uuid.uuid4().hex + ".jpg")
+        if await gerar_miniatura(caminho, temporario):
+            os.replace(temporario, miniatura)
+
+    async def salvar(self, file: UploadFile, pasta: str) -> str:
+        # `pasta` só organiza o Cloudinary; aqui o endereço é o conteúdo
+        checar_tamanho(tamanho_upload(file))
+
+        try:
+            processada = await preparar_imagem(file)
+            if processada:
+                caminho_processado, nome, _ = processada
+                try:
+                    with open(caminho_processado, "rb") as origem:
+                        caminho, novo = await run_in_threadpool(self._gravar, origem, os.path.splitext(nome)[1])
+                finally:
+                    os.remove(caminho_processado)
+            else:
+                extensao = os.path.splitext(file.filename or "")[1].lower() or ".jpg"
+                if extensao not in EXTENSOES_IMAGEM:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Formato de imagem não suportado ({extensao})"
+                    )
+                await file.seek(0)
+                caminho, novo = await run_in_threadpool(self._gravar, file.file, extensao)
+
+            if novo:
+                await self._miniatura(caminho)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Erro ao salvar a imagem: {str(e)}"
+            )
+
+        relativo = os.path.relpath(caminho, self.diretorio).replace(os.sep, "/")
+        return f"{self.url_base}/{relativo}"
+
+    def thumbnail_url(self, url: str) -> Optional[str]:
+        if not url.startswith(self.url_base + "/"):
+            return None
+        relativo = url[len(self.url_base) + 1:]
+        miniatura = os.path.splitext(relativo)[0] + SUFIXO_MINIATURA
+        if not os.path.exists(os.path.join(self.diretorio, miniatura)):
+            return None
+        return f"{self.url_base}/{miniatura}"
+
+    def disponivel(self, url: str) -> bool:
+        """False if `url` is ours but the file is gone (e.g. media dir wiped)"""
+        if not url.startswith(self.url_base + "/"):
+            return True
+        return os.path.exists(os.path.join(self.diretorio, url[len(self.url_base) + 1:]))
+
+
+class MidiaEstatica(StaticFiles):
+    """/media mount: a path's content never changes, so browsers may cache it forever"""
+
+    async def get_response(self, path, scope):
+        resposta = await super().get_response(path, scope)
+        if resposta.status_code == 200:
+            resposta.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        resposta.headers["X-Content-Type-Options"] = "nosniff"
+        return resposta
+
+
+def _criar_storage():
+    if settings.storage_backend == "local":
+        return LocalStorage(settings.local_storage_dir, settings.local_storage_url)
+    if settings.storage_backend != "cloudinary":
+        print(f"[AVISO] STORAGE_BACKEND invalido ({settings.storage_backend}), usando cloudinary")
+    return CloudinaryStorage()
+
+
+storage = _criar_storage()
+
+# Cloudinary continua resolvendo as miniaturas de fotos antigas depois de
+# trocar para o armazenamento local
+_cloudinary = storage if isinstance(storage, CloudinaryStorage) else CloudinaryStorage()
+
+
+# Uploads em andamento por hash: envios simultâneos da mesma foto esperam o primeiro
+_em_andamento: Dict[str, asyncio.Future] = {}
+
+
+def _sha256_upload(file: UploadFile) -> str:
+    file.file.seek(0)
+    sha256 = hashlib.sha256()
+    for bloco in iter(lambda: file.file.read(COPIA_CHUNK_SIZE), b""):
+        sha256.update(bloco)
+    file.file.seek(0)
+    return sha256.hexdigest()
+
+
+def _buscar_foto(digest: str) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        foto = db.get(Foto, digest)
+        return foto.url if foto else None
+    finally:
+        db.close()
+
+
+def _registrar_foto(digest: str, url: str, tamanho: int) -> None:
+    db = SessionLocal()
+    try:
+        dialeto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        db.execute(
+            dialeto.insert(Foto)
+            .values(sha256=digest, url=url, tamanho=tamanho)
+            .on_conflict_do_update(index_elements=["sha256"], set_={"url": url})
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _salvar_deduplicado(file: UploadFile, pasta: str, digest: str, tamanho: int) -> str:
+    try:
+        url = await run_in_threadpool(_buscar_foto, digest)
+    except Exception as e:
+        print(f"[AVISO] Indice de fotos indisponivel, enviando sem deduplicar: {e}")
+        return await storage.salvar(file, pasta)
+    if url and storage.disponivel(url):
+        return url
+
+    url = await storage.salvar(file, pasta)
+    try:
+        await run_in_threadpool(_registrar_foto, digest, url, tamanho)
+    except Exception as e:
+        print(f"[AVISO] Falha ao registrar foto no indice: {e}")
+    return url
+
+
+async def salvar_foto(file: UploadFile, pasta: str = "os-sistema") -> str:
+    """
+    Store an uploaded photo on the configured backend (STORAGE_BACKEND)
+    
+    Identical bytes are stored once: the SHA-256 of the upload is looked up in
+    the `fotos` table first and a hit returns the existing URL without
+    processing or uploading anything.
+
+    Returns:
+        str: The URL to persist on the OS
+    """
+    tamanho = tamanho_upload(file)
+    checar_tamanho(tamanho)
+    digest = await run_in_threadpool(_sha256_upload, file)
+
+    pendente = _em_andamento.get(digest)
+    if pendente is not None:
+        return await asyncio.shield(pendente)
+
+    # Registrado antes de qualquer await: quem chegar depois espera este
+    futuro = asyncio.get_running_loop().create_future()
+    _em_andamento[digest] = futuro
+    try:
+        url = await _salvar_deduplicado(file, pasta, digest, tamanho)
+        futuro.set_result(url)
+        return url
+    except asyncio.CancelledError:
+        futuro.cancel()
+        raise
+    except Exception as e:
+        futuro.set_exception(e)
+        futuro.exception()  # marca como lida se ninguém estava esperando
+        raise
+    finally:
+        del _em_andamento[digest]
+
+
+def thumbnail_url(url: Optional[str]) -> Optional[str]:
+    """Thumbnail URL of a stored photo (any backend), or None"""
+    if not url:
+        return None
+    if isinstance(storage, LocalStorage):
+        miniatura = storage.thumbnail_url(url)
+        if miniatura:
+            return miniatura
+    return _cloudinary.thumbnail_url(url)
@@ -0,0 +1,90 @@
+"""
+Benchmark de carga das rotas de leitura (lista, detalhe e dashboard).
+
+Dispara N clientes concorrentes contra uma API já em execução e mede
+throughput e latência, para comparar DB_ASYNC=false (threadpool) com
+DB_ASYNC=true (asyncpg/aiosqlite) no mesmo banco:
+
+    DB_ASYNC=false uvicorn app.main:app --port 8000
+    python benchmark_carga.py --url http://localhost:8000 --clientes 100 500 1000
+
+    DB_ASYNC=true uvicorn app.main:app --port 8000
+    python benchmark_carga.py --url http://localhost:8000 --clientes 100 500 1000
+
+Requer httpx (pip install httpx). Rode o gerador de carga em outra máquina
+(ou pelo menos outro núcleo) para que ele não dispute CPU com o servidor.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+ROTAS = ["/api/v1/os?limit=20", "/api/v1/os/{os_id}", "/api/v1/relatorios/dashboard"]
+
+
+async def rodada(client: httpx.AsyncClient, base: str, headers: dict, os_id: int, clientes: int, duracao: float):
+    latencias = []
+    erros = 0
+    fim = time.perf_counter() + duracao
+
+    async def cliente(indice: int):
+        nonlocal erros
+        while time.perf_counter() < fim:
+            rota = ROTAS[indice % len(ROTAS)].format(os_id=os_id)
+            inicio = time.perf_counter()
+            try:
+                resposta = await client.get(base + rota, headers=headers)
+                if resposta.status_code == 200:
+                    latencias.append(time.perf_counter() - inicio)
+                else:
+                    erros += 1
+            except httpx.HTTPError:
+                erros += 1
+            indice += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(i) for i in range(clientes)))
+    decorrido = time.perf_counter() - inicio
+
+    latencias.sort()
+    if not latencias:
+        print(f"clientes={clientes:5d}  nenhuma resposta 200 ({erros} erros)")
+        return
+    p50 = latencias[len(latencias) // 2] * 1000
+    p99 = latencias[int(len(latencias) * 0.99)] * 1000
+    print(
+        f"clientes={clientes:5d}  {len(latencias) / decorrido:8.1f} req/s  "
+        f"p50 {p50:8.1f} ms  p99 {p99:8.1f} ms  erros {erros}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga das rotas de leitura")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--senha", default="admin123")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--duracao", type=float, default=10.0, help="segundos por rodada")
+    args = parser.parse_args()
+
+    limites = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=60, limits=limites) as client:
+        login = await client.post(
+            f"{args.url}/api/v1/auth/login",
+            json={"username": args.usuario, "password": args.senha}
+        )
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        ordens = (await client.get(f"{args.url}/api/v1/os?limit=1", headers=headers)).json()
+        if not ordens:
+            print("❌ Nenhuma O.S no banco - crie algumas antes do benchmark")
+            return
+
+        for clientes in args.clientes:
+            await rodada(client, args.url, headers, ordens[0]["id"], clientes, args.duracao)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
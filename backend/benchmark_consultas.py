@@ -0,0 +1,283 @@
+"""
+Benchmark das consultas pesadas em tabelas de vários tamanhos.
+
+Gera N O.S sintéticas num banco novo (SQLite temporário, ou o banco de
+--database-url, cujas tabelas são RECRIADAS: use um banco descartável) e
+mede cada variante da consulta, com a mediana de --repeticoes execuções:
+
+    python benchmark_consultas.py busca --linhas 10000 100000 1000000
+    python benchmark_consultas.py busca --database-url postgresql://.../bench
+    python benchmark_consultas.py dashboard --linhas 10000 100000 1000000
+
+busca: caminho antigo de GET /os?search= (9 ILIKE '%termo%' com dois joins
+em users + DISTINCT) contra o índice de busca atual (FTS5 trigram no SQLite,
+GIN tsvector + pg_trgm no Postgres).
+
+dashboard: GET /relatorios/dashboard sem cache em três versões: a original
+(7 consultas), a de passada única (SUM(CASE) + UNION ALL, 2 consultas) e a
+atual, que lê os rollups (reconstruídos antes da medição).
+
+Resultados no SQLite 3.40 (ms por consulta, mediana de 5):
+
+    busca      linhas     ILIKE    índice
+               10.000      11.6       3.0
+              100.000      93.2      19.1
+            1.000.000    1482.5     174.6
+
+    dashboard  linhas  original  passada única  rollups
+               10.000      28.2           22.2     40.0
+              100.000     284.4          226.1    192.5
+            1.000.000    2901.0         2361.3   1387.1
+
+Os dados sintéticos espalham as O.S por 365 dias x 40 técnicos x 10
+cidades, então quase toda O.S vira uma linha de rollup (9.966 linhas para
+10.000 O.S): é o pior caso para os rollups.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import case, create_engine, desc, func, insert, literal, null, or_, select, union_all
+from sqlalchemy.orm import Session, aliased
+
+from app.database import Base
+from app.models.user import User
+from app.models.ordem_servico import OrdemServico
+from app.models import dashboard_rollup, foto, foto_pendente, os_sequencia, versao_tabela  # noqa: F401 (tabelas do Base)
+from app.routes.relatorios import _calcular_dashboard
+from app.services import rollup_service, search_service
+
+CIDADES = ["Sorocaba", "Votorantim", "Itu", "Salto", "Piedade", "Ibiúna", "Tatuí", "Boituva", "Porto Feliz", "Mairinque"]
+MOTIVOS = ["Caixa sem sinal", "Ampliação de atendimento", "Sinal Alto", None]
+TIPOS = ["normal", "normal", "normal", "rompimento", "manutencao"]
+TECNICOS = 40
+
+# Termos da busca: comum (cidade), raro (pppoe de um cliente) e técnico
+TERMOS = ["votorantim", "cliente00123", "tecnico07"]
+
+LOTE_INSERT = 5000
+
+
+def criar_banco(url: str, linhas: int, semente: int = 42):
+    """Create the tables and fill them with `linhas` synthetic orders"""
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    aleatorio = random.Random(semente)
+
+    with Session(engine) as db:
+        tecnicos = [
+            User(id=i, username=f"tecnico{i:02d}", nome=f"Técnico {i:02d}", password_hash="x", role="execucao")
+            for i in range(1, TECNICOS + 1)
+        ]
+        db.add_all(tecnicos)
+        db.commit()
+        por_id = {t.id: t for t in tecnicos}
+
+        inicio = datetime(2025, 1, 1)
+        lote = []
+        for numero in range(1, linhas + 1):
+            criado_em = inicio + timedelta(minutes=numero * 525600 / linhas)
+            status = aleatorio.choices(["aguardando", "em_andamento", "concluido"], [1, 1, 8])[0]
+            executor = aleatorio.randint(1, TECNICOS) if status != "aguardando" else None
+            iniciado_em = criado_em + timedelta(minutes=aleatorio.randint(5, 600)) if executor else None
+            linha = dict(
+                numero_os=f"OS-{criado_em.year}-{numero:07d}",
+                tecnico_campo_id=aleatorio.randint(1, TECNICOS),
+                tecnico_executor_id=executor,
+                foto_caixa="https://fotos/caixa.jpg",
+                pppoe_cliente=f"cliente{aleatorio.randint(0, linhas // 3):05d}",
+                motivo_abertura=aleatorio.choice(MOTIVOS),
+                cidade=aleatorio.choice(CIDADES),
+                tipo_os=aleatorio.choice(TIPOS),
+                porta_placa_olt=f"{aleatorio.randint(1, 16)}/{aleatorio.randint(1, 64)}",
+                status=status,
+                criado_em=criado_em,
+                iniciado_em=iniciado_em,
+                concluido_em=iniciado_em + timedelta(minutes=aleatorio.randint(10, 300)) if status == "concluido" else None,
+            )
+            linha["busca_texto"] = search_service.texto_busca(
+                OrdemServico(**linha), por_id[linha["tecnico_campo_id"]], por_id.get(executor)
+            )
+            lote.append(linha)
+            if len(lote) == LOTE_INSERT:
+                db.execute(insert(OrdemServico.__table__), lote)
+                lote = []
+        if lote:
+            db.execute(insert(OrdemServico.__table__), lote)
+        db.commit()
+
+    # Índices de busca (e a tabela FTS5 no SQLite), como no startup da API
+    search_service.configurar_indice_busca(engine)
+    return engine
+
+
+def busca_ilike(db: Session, termo: str):
+    """GET /os?search= before the search index (nine ILIKE + DISTINCT)"""
+    padrao = f"%{termo}%"
+    campo = aliased(User)
+    executor = aliased(User)
+    return (
+        db.query(OrdemServico)
+        .outerjoin(campo, OrdemServico.tecnico_campo_id == campo.id)
+        .outerjoin(executor, OrdemServico.tecnico_executor_id == executor.id)
+        .filter(or_(
+            OrdemServico.numero_os.ilike(padrao),
+            OrdemServico.cidade.ilike(padrao),
+            OrdemServico.pppoe_cliente.ilike(padrao),
+            OrdemServico.motivo_abertura.ilike(padrao),
+            OrdemServico.porta_placa_olt.ilike(padrao),
+            campo.username.ilike(padrao),
+            campo.nome.ilike(padrao),
+            executor.username.ilike(padrao),
+            executor.nome.ilike(padrao),
+        ))
+        .distinct()
+        .order_by(desc(OrdemServico.criado_em), desc(OrdemServico.id))
+        .limit(21)
+        .all()
+    )
+
+
+def busca_indice(db: Session, termo: str):
+    """GET /os?search= through search_service.aplicar_busca"""
+    query, rank = search_service.aplicar_busca(db.query(OrdemServico), db, termo)
+    return (
+        query.order_by(rank, desc(OrdemServico.criado_em), desc(OrdemServico.id))
+        .limit(21)
+        .all()
+    )
+
+
+def dashboard_original(db: Session):
+    """GET /relatorios/dashboard before the rewrite (seven statements)"""
+    concluido = OrdemServico.status == "concluido"
+    minutos = lambda fim, inicio: func.extract("epoch", fim - inicio) / 60  # noqa: E731
+    db.query(OrdemServico.status, func.count(OrdemServico.id)).group_by(OrdemServico.status).all()
+    for motivo in ("Caixa sem sinal", "Ampliação de atendimento", "Sinal Alto"):
+        db.query(OrdemServico).filter(OrdemServico.motivo_abertura == motivo).count()
+    db.query(
+        func.avg(minutos(OrdemServico.iniciado_em, OrdemServico.criado_em)),
+        func.avg(minutos(OrdemServico.concluido_em, OrdemServico.iniciado_em)),
+        func.avg(minutos(OrdemServico.concluido_em, OrdemServico.criado_em)),
+    ).filter(concluido).first()
+    (
+        db.query(User.nome, func.count(OrdemServico.id),
+                 func.avg(minutos(OrdemServico.concluido_em, OrdemServico.iniciado_em)))
+        .join(OrdemServico, OrdemServico.tecnico_executor_id == User.id)
+        .filter(concluido)
+        .group_by(User.id, User.nome)
+        .all()
+    )
+    (
+        db.query(OrdemServico.cidade, func.count(OrdemServico.id))
+        .filter(OrdemServico.cidade.is_not(None))
+        .group_by(OrdemServico.cidade)
+        .all()
+    )
+
+
+def dashboard_passada_unica(db: Session):
+    """GET /relatorios/dashboard with SUM(CASE) aggregates and one UNION ALL"""
+    concluido = OrdemServico.status == "concluido"
+    contar = lambda condicao: func.sum(case((condicao, 1), else_=0))  # noqa: E731
+    if db.get_bind().dialect.name == "sqlite":
+        minutos = lambda fim, inicio: (func.julianday(fim) - func.julianday(inicio)) * 1440  # noqa: E731
+    else:
+        minutos = lambda fim, inicio: func.extract("epoch", fim - inicio) / 60  # noqa: E731
+    db.query(
+        func.count(OrdemServico.id),
+        contar(OrdemServico.status == "aguardando"),
+        contar(OrdemServico.status == "em_andamento"),
+        contar(concluido),
+        contar(OrdemServico.motivo_abertura == "Caixa sem sinal"),
+        contar(OrdemServico.motivo_abertura == "Ampliação de atendimento"),
+        contar(OrdemServico.motivo_abertura == "Sinal Alto"),
+        func.avg(case((concluido, minutos(OrdemServico.iniciado_em, OrdemServico.criado_em)))),
+        func.avg(case((concluido, minutos(OrdemServico.concluido_em, OrdemServico.iniciado_em)))),
+        func.avg(case((concluido, minutos(OrdemServico.concluido_em, OrdemServico.criado_em)))),
+    ).one()
+    por_tecnico = (
+        select(literal("tecnico"), User.nome, func.count(OrdemServico.id),
+               func.avg(minutos(OrdemServico.concluido_em, OrdemServico.iniciado_em)))
+        .join(OrdemServico, OrdemServico.tecnico_executor_id == User.id)
+        .where(concluido)
+        .group_by(User.id, User.nome)
+    )
+    por_cidade = (
+        select(literal("cidade"), OrdemServico.cidade, func.count(OrdemServico.id), null())
+        .where(OrdemServico.cidade.is_not(None))
+        .group_by(OrdemServico.cidade)
+    )
+    db.execute(union_all(por_tecnico, por_cidade)).all()
+
+
+def preparar_rollups(engine) -> None:
+    """Fill the dashboard rollups the way reconstruir_rollups.py does"""
+    with Session(engine) as db:
+        rollup_service.reconstruir(db)
+
+
+# modo: (variantes, argumentos de cada consulta, preparo extra do banco)
+MODOS = {
+    "busca": ([("ILIKE", busca_ilike), ("índice", busca_indice)], [(termo,) for termo in TERMOS], None),
+    "dashboard": (
+        [("original", dashboard_original), ("passada única", dashboard_passada_unica), ("rollups", _calcular_dashboard)],
+        [()],
+        preparar_rollups,
+    ),
+}
+
+
+def medir(engine, variantes, argumentos, repeticoes: int) -> dict:
+    """Median ms of one query (averaged over `argumentos`) for each variant"""
+    tempos = {}
+    for nome, consulta in variantes:
+        amostras = []
+        for _ in range(repeticoes + 1):
+            with Session(engine) as db:
+                inicio = time.perf_counter()
+                for argumento in argumentos:
+                    consulta(db, *argumento)
+                amostras.append((time.perf_counter() - inicio) * 1000 / len(argumentos))
+        # A primeira execução só aquece o cache de páginas
+        tempos[nome] = statistics.median(amostras[1:])
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das consultas pesadas por tamanho de tabela")
+    parser.add_argument("modo", choices=sorted(MODOS))
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--database-url", help="banco descartável (as tabelas são recriadas); padrão: SQLite temporário")
+    args = parser.parse_args()
+
+    variantes, argumentos, preparar = MODOS[args.modo]
+    print(f"{'linhas':>9}  " + "  ".join(f"{nome:>14}" for nome, _ in variantes) + "   (ms por consulta, mediana)")
+    for linhas in args.linhas:
+        diretorio = tempfile.mkdtemp(prefix="benchmark-consultas-")
+        url = args.database_url or f"sqlite:///{diretorio}/benchmark.db"
+        inicio = time.perf_counter()
+        engine = criar_banco(url, linhas)
+        if preparar:
+            preparar(engine)
+        preparo = time.perf_counter() - inicio
+        tempos = medir(engine, variantes, argumentos, args.repeticoes)
+        engine.dispose()
+        if not args.database_url:
+            os.remove(f"{diretorio}/benchmark.db")
+        print(f"{linhas:>9}  " + "  ".join(f"{tempos[nome]:>14.1f}" for nome, _ in variantes)
+              + f"   (dados gerados em {preparo:.0f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Script para reconstruir os rollups do dashboard (tabela dashboard_rollups)
+a partir de todas as O.S existentes.
+
+Os rollups só são atualizados pelas rotas de O.S da API. A API compara o
+total por status dos rollups com COUNT(*) das O.S na subida e a cada
+ROLLUP_VERIFICACAO_SECONDS (padrão 600) e os reconstrói se divergirem, o que
+cobre O.S inseridas, removidas ou com status alterado por fora.
+
+Rode este script depois de qualquer escrita fora da API (scripts, SQL manual,
+importações) que altere cidade, motivo, tipo, técnico executor ou horários de
+O.S existentes: isso não muda as contagens por status e não é detectado.
+    python reconstruir_rollups.py
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent))
+
+from app.database import SessionLocal, engine, Base
+from app.services import rollup_service
+
+
+def main():
+    print("🔧 Verificando tabelas...")
+    Base.metadata.create_all(bind=engine)
+    
+    db = SessionLocal()
+    try:
+        print("🔄 Reconstruindo rollups do dashboard...")
+        processadas = rollup_service.reconstruir(db)
+        print(f"✅ Rollups reconstruídos a partir de {processadas} O.S")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Erro ao reconstruir rollups: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Testes da API contra um SQLite temporário.
+
+Rodar a partir de backend/:
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Configuração antes de importar o app (settings é lido na importação)
+_tmp = tempfile.mkdtemp(prefix="os-testes-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/testes.db"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["LOCAL_STORAGE_DIR"] = os.path.join(_tmp, "media")
+os.environ["IMAGEM_PROCESSAR"] = "false"  # sem pool de processos nos testes
+os.environ["TELEGRAM_BOT_TOKEN"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    resposta = client.post("/api/v1/auth/login", json={"username": "admin", "password": "admin123"})
+    return {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+
+def nova_os(**campos) -> dict:
+    """Payload mínimo de POST /os"""
+    return {"tecnico_campo_id": 1, "foto_caixa": "http://fotos/caixa.jpg", "cidade": "Sorocaba", **campos}
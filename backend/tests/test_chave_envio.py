@@ -0,0 +1,65 @@
+"""Idempotência por chave_envio quando o mesmo envio chega em paralelo"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import app.routes.os as rotas
+from app.database import SessionLocal
+from app.models.ordem_servico import OrdemServico
+from conftest import nova_os
+
+
+def _gravar_antes_do_insert(monkeypatch, chave: str, funcao: str = "_generate_numero_os"):
+    """Another request stores `chave` after the pre-check, before our INSERT"""
+    original = getattr(rotas, funcao)
+    gravada = []
+
+    def concorrente_e_reservar(db, *args, **kwargs):
+        if not gravada:
+            outra = SessionLocal()
+            try:
+                outra.add(OrdemServico(numero_os=f"OS-CONC-{chave[:8]}", tecnico_campo_id=1, foto_caixa="x", chave_envio=chave))
+                outra.commit()
+            finally:
+                outra.close()
+            gravada.append(chave)
+        return original(db, *args, **kwargs)
+
+    monkeypatch.setattr(rotas, funcao, concorrente_e_reservar)
+
+
+def test_reenvio_simultaneo_devolve_a_os_existente(client, admin_headers, monkeypatch):
+    chave = uuid.uuid4().hex
+    _gravar_antes_do_insert(monkeypatch, chave)
+
+    resposta = client.post("/api/v1/os", json=nova_os(chave_envio=chave), headers=admin_headers)
+
+    assert resposta.status_code == 200
+    assert resposta.json()["numero_os"] == f"OS-CONC-{chave[:8]}"
+
+
+def test_reenvios_em_paralelo_criam_uma_so_os(client, admin_headers):
+    chave = uuid.uuid4().hex
+
+    def enviar(_):
+        resposta = client.post("/api/v1/os", json=nova_os(chave_envio=chave), headers=admin_headers)
+        return resposta.status_code, resposta.json()["id"]
+
+    with ThreadPoolExecutor(10) as executor:
+        respostas = list(executor.map(enviar, range(30)))
+
+    assert sorted(codigo for codigo, _ in respostas) == [200] * 29 + [201]
+    assert len({os_id for _, os_id in respostas}) == 1
+
+
+def test_lote_com_chave_gravada_em_paralelo_devolve_a_existente(client, admin_headers, monkeypatch):
+    chave = uuid.uuid4().hex
+    _gravar_antes_do_insert(monkeypatch, chave, "reservar_numeros")
+    ordens = [nova_os(), nova_os(chave_envio=chave), nova_os(chave_envio=chave), nova_os()]
+
+    resposta = client.post("/api/v1/os/batch", json={"ordens": ordens}, headers=admin_headers)
+
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+    assert [r["status_code"] for r in corpo["resultados"]] == [201, 200, 200, 201]
+    assert {r["numero_os"] for r in corpo["resultados"][1:3]} == {f"OS-CONC-{chave[:8]}"}
+    assert (corpo["criadas"], corpo["existentes"]) == (2, 2)
@@ -0,0 +1,43 @@
+"""Só falhas de conexão abrem o circuito; disputa por lock não"""
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from app.database import db_breaker, get_db, _erro_de_conexao
+
+
+class DeadlockDetected(sqlite3.OperationalError):
+    """Stand-in for psycopg2.errors.DeadlockDetected (a TransactionRollbackError)"""
+
+
+def _erro_na_consulta(erro_dbapi: Exception) -> OperationalError:
+    return OperationalError("UPDATE ordens_servico SET status=?", (), erro_dbapi)
+
+
+@pytest.mark.parametrize("erro_dbapi", [
+    sqlite3.OperationalError("database is locked"),
+    DeadlockDetected("deadlock detected"),
+])
+def test_lock_e_deadlock_nao_abrem_o_circuito(erro_dbapi):
+    erro = _erro_na_consulta(erro_dbapi)
+    assert not _erro_de_conexao(erro)
+
+    for _ in range(db_breaker.limite_falhas + 1):
+        dependencia = get_db()
+        next(dependencia)
+        with pytest.raises(OperationalError):
+            dependencia.throw(erro)
+
+    assert db_breaker.estado()["state"] == "closed"
+    assert db_breaker.estado()["consecutive_failures"] == 0
+
+
+def test_falhas_de_conexao_contam():
+    with pytest.raises(OperationalError) as sem_conexao:
+        create_engine("sqlite:////diretorio/inexistente/os.db").connect()
+    assert _erro_de_conexao(sem_conexao.value)
+
+    caiu = DBAPIError("SELECT 1", (), Exception("server closed the connection unexpectedly"), connection_invalidated=True)
+    assert _erro_de_conexao(caiu)
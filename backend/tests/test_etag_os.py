@@ -0,0 +1,50 @@
+"""ETag de GET /os/{id}: 304 só quando a resposta seria a mesma"""
+from datetime import datetime, timedelta
+
+import app.models.ordem_servico as modelo
+from conftest import nova_os
+
+
+def _relogio_adiantado(monkeypatch, minutos: int):
+    class Adiantado(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime.utcnow() + timedelta(minutes=minutos)
+
+    monkeypatch.setattr(modelo, "datetime", Adiantado)
+
+
+def test_os_sem_prazo_revalida_com_304(client, admin_headers):
+    os_id = client.post("/api/v1/os", json=nova_os(), headers=admin_headers).json()["id"]
+    primeira = client.get(f"/api/v1/os/{os_id}", headers=admin_headers)
+
+    revalidacao = client.get(f"/api/v1/os/{os_id}", headers={**admin_headers, "If-None-Match": primeira.headers["etag"]})
+
+    assert revalidacao.status_code == 304
+
+
+def test_prazo_correndo_muda_a_etag_com_o_relogio(client, admin_headers, monkeypatch):
+    os_id = client.post(
+        "/api/v1/os",
+        json=nova_os(tipo_os="rompimento", prazo_horas=1),
+        headers=admin_headers
+    ).json()["id"]
+    primeira = client.get(f"/api/v1/os/{os_id}", headers=admin_headers)
+    etag = primeira.headers["etag"]
+    assert client.get(f"/api/v1/os/{os_id}", headers={**admin_headers, "If-None-Match": etag}).status_code == 304
+
+    # Sem nenhuma escrita na tabela, só o relógio andou
+    _relogio_adiantado(monkeypatch, 5)
+    depois = client.get(f"/api/v1/os/{os_id}", headers={**admin_headers, "If-None-Match": etag})
+    assert depois.status_code == 200
+    assert depois.json()["tempo_restante_min"] < primeira.json()["tempo_restante_min"]
+    assert depois.json()["tecnico_campo"]["id"] == 1
+
+    _relogio_adiantado(monkeypatch, 90)
+    vencida = client.get(f"/api/v1/os/{os_id}", headers={**admin_headers, "If-None-Match": depois.headers["etag"]})
+    assert vencida.status_code == 200
+    assert vencida.json()["prazo_vencido"] is True
+    # Vencido, o prazo não muda mais: volta a revalidar com 304
+    assert client.get(
+        f"/api/v1/os/{os_id}", headers={**admin_headers, "If-None-Match": vencida.headers["etag"]}
+    ).status_code == 304
@@ -0,0 +1,107 @@
+"""PATCH /os/{id}/finalizar-com-foto quando a O.S muda durante o upload"""
+import asyncio
+import os as sistema
+
+import pytest
+from sqlalchemy.orm import Session
+
+import app.routes.os as rotas
+from app.database import SessionLocal
+from app.models.ordem_servico import OrdemServico
+from app.services.storage_service import storage
+from conftest import nova_os
+
+
+@pytest.fixture
+def os_em_andamento(client, admin_headers):
+    os_id = client.post("/api/v1/os", json=nova_os(), headers=admin_headers).json()["id"]
+    client.patch(f"/api/v1/os/{os_id}/assumir", json={"tecnico_executor_id": 1}, headers=admin_headers)
+    return os_id
+
+
+def _durante_upload(monkeypatch, alterar):
+    """Run `alterar(db)` (committed) right after the photo is stored"""
+    salvar_original = rotas.salvar_foto
+    urls = []
+
+    async def salvar_e_alterar(*args, **kwargs):
+        url = await salvar_original(*args, **kwargs)
+        urls.append(url)
+        db = SessionLocal()
+        try:
+            alterar(db)
+            db.commit()
+        finally:
+            db.close()
+        return url
+
+    monkeypatch.setattr(rotas, "salvar_foto", salvar_e_alterar)
+    return urls
+
+
+def _finalizar(client, headers, os_id):
+    return client.patch(
+        f"/api/v1/os/{os_id}/finalizar-com-foto",
+        files={"foto_comprovacao": ("prova.jpg", sistema.urandom(2048), "image/jpeg")},
+        data={"observacoes": "ok"},
+        headers=headers
+    )
+
+
+def test_finaliza(client, admin_headers, os_em_andamento):
+    resposta = _finalizar(client, admin_headers, os_em_andamento)
+
+    assert resposta.status_code == 200
+    assert resposta.json()["status"] == "concluido"
+    assert storage.disponivel(resposta.json()["foto_comprovacao"])
+
+
+def test_banco_fora_do_event_loop(client, admin_headers, os_em_andamento, monkeypatch):
+    execute_original = Session.execute
+    no_event_loop = []
+
+    def execute_registrando(self, *args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            no_event_loop.append(True)
+        except RuntimeError:
+            no_event_loop.append(False)
+        return execute_original(self, *args, **kwargs)
+
+    monkeypatch.setattr(Session, "execute", execute_registrando)
+
+    assert _finalizar(client, admin_headers, os_em_andamento).status_code == 200
+    assert no_event_loop and not any(no_event_loop)
+
+
+def test_os_removida_durante_upload(client, admin_headers, os_em_andamento, monkeypatch):
+    urls = _durante_upload(monkeypatch, lambda db: db.query(OrdemServico).filter(OrdemServico.id == os_em_andamento).delete())
+
+    resposta = _finalizar(client, admin_headers, os_em_andamento)
+
+    assert resposta.status_code == 404
+    assert storage.disponivel(urls[0])
+
+
+def test_os_finalizada_por_outro_durante_upload(client, admin_headers, os_em_andamento, monkeypatch):
+    urls = _durante_upload(monkeypatch, lambda db: db.query(OrdemServico).filter(OrdemServico.id == os_em_andamento).update(
+        {"status": "concluido", "foto_comprovacao": "http://fotos/outra.jpg"}
+    ))
+
+    resposta = _finalizar(client, admin_headers, os_em_andamento)
+
+    assert resposta.status_code == 400
+    assert storage.disponivel(urls[0])
+    assert client.get(f"/api/v1/os/{os_em_andamento}", headers=admin_headers).json()["foto_comprovacao"] == "http://fotos/outra.jpg"
+
+
+def test_os_reatribuida_durante_upload(client, admin_headers, os_em_andamento, monkeypatch):
+    _durante_upload(monkeypatch, lambda db: db.query(OrdemServico).filter(OrdemServico.id == os_em_andamento).update(
+        {"tecnico_executor_id": 3}
+    ))
+
+    resposta = _finalizar(client, admin_headers, os_em_andamento)
+
+    assert resposta.status_code == 409
+    assert client.get(f"/api/v1/os/{os_em_andamento}", headers=admin_headers).json()["status"] == "em_andamento"
+
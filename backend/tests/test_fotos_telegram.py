@@ -0,0 +1,41 @@
+"""Foto do Telegram que esgota as tentativas deixa de aparecer como pendente"""
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models.foto_pendente import FotoPendente
+from app.models.ordem_servico import OrdemServico
+from app.services.eventos_service import event_broker
+from app.services.fotos_telegram_service import FOTO_FALHOU, _adiar
+from conftest import nova_os
+
+
+def _os_com_foto_pendente(client, admin_headers) -> dict:
+    os_id = client.post("/api/v1/os", json=nova_os(), headers=admin_headers).json()["id"]
+    db = SessionLocal()
+    try:
+        db.get(OrdemServico, os_id).foto_caixa = ""
+        pendente = FotoPendente(os_id=os_id, campo="foto_caixa", file_id="AgACAgEAAx")
+        db.add(pendente)
+        db.commit()
+        return {"id": pendente.id, "os_id": os_id, "campo": "foto_caixa", "file_id": pendente.file_id, "tentativas": 0}
+    finally:
+        db.close()
+
+
+def test_falha_intermediaria_continua_pendente(client, admin_headers):
+    pendente = _os_com_foto_pendente(client, admin_headers)
+
+    _adiar(pendente, "getFile recusado")
+
+    assert client.get(f"/api/v1/os/{pendente['os_id']}", headers=admin_headers).json()["foto_caixa"] == ""
+
+
+def test_ultima_tentativa_marca_a_foto_como_falha(client, admin_headers):
+    pendente = _os_com_foto_pendente(client, admin_headers)
+    pendente["tentativas"] = get_settings().fotos_telegram_tentativas - 1
+    ultimo_evento = event_broker._ultimo_id
+
+    _adiar(pendente, "getFile recusado")
+
+    assert client.get(f"/api/v1/os/{pendente['os_id']}", headers=admin_headers).json()["foto_caixa"] == FOTO_FALHOU
+    eventos = [e for e in event_broker._historico if e["id"] > ultimo_evento]
+    assert [(e["tipo"], e["os"]["id"]) for e in eventos] == [("atualizada", pendente["os_id"])]
@@ -0,0 +1,54 @@
+"""GET /os não pode voltar a fazer N+1 (uma consulta por técnico de cada linha)"""
+from typing import Tuple
+
+import pytest
+from sqlalchemy import event
+
+from app.database import engine
+from conftest import nova_os
+
+
+@pytest.fixture(scope="module")
+def ordens(client, admin_headers):
+    # Técnicos de campo e executores variados, para que um lazy load apareça
+    for i in range(30):
+        resposta = client.post(
+            "/api/v1/os",
+            json=nova_os(tecnico_campo_id=1 + i % 3, pppoe_cliente=f"consulta{i}"),
+            headers=admin_headers
+        )
+        if i % 2:
+            client.patch(
+                f"/api/v1/os/{resposta.json()['id']}/assumir",
+                json={"tecnico_executor_id": 1 + i % 4},
+                headers=admin_headers
+            )
+
+
+def _contar_consultas(client, headers, params) -> Tuple[int, int]:
+    """(SQL statements run, items returned) for one GET /os"""
+    comandos = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement)
+
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        resposta = client.get("/api/v1/os", params=params, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+    assert resposta.status_code == 200
+    return len(comandos), len(resposta.json())
+
+
+@pytest.mark.parametrize("busca", [None, "consulta"])
+def test_numero_de_consultas_nao_depende_do_tamanho_da_pagina(client, admin_headers, ordens, busca):
+    params = {"search": busca} if busca else {}
+    _contar_consultas(client, admin_headers, {**params, "limit": 1})  # aquece o cache de autenticação
+
+    consultas_1, linhas_1 = _contar_consultas(client, admin_headers, {**params, "limit": 1})
+    consultas_200, linhas_200 = _contar_consultas(client, admin_headers, {**params, "limit": 200})
+
+    assert linhas_1 == 1
+    assert linhas_200 >= 30
+    assert consultas_1 == consultas_200
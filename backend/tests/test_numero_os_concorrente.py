@@ -0,0 +1,25 @@
+"""Numeração das O.S sob criação concorrente (reservar_numeros)"""
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import nova_os
+
+REQUISICOES = 300
+THREADS = 40
+
+
+def _sufixo(numero_os: str) -> int:
+    return int(numero_os.rsplit("-", 1)[1])
+
+
+def test_post_os_paralelo_gera_numeros_unicos_e_sem_buracos(client, admin_headers):
+    def criar(_):
+        resposta = client.post("/api/v1/os", json=nova_os(), headers=admin_headers)
+        return resposta.status_code, resposta.json().get("numero_os")
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        respostas = list(executor.map(criar, range(REQUISICOES)))
+
+    assert [codigo for codigo, _ in respostas] == [201] * REQUISICOES
+    numeros = sorted(_sufixo(n) for _, n in respostas)
+    assert len(set(numeros)) == REQUISICOES
+    assert numeros == list(range(numeros[0], numeros[0] + REQUISICOES))
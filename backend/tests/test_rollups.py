@@ -0,0 +1,37 @@
+"""Rollups do dashboard se realinham após escritas fora das rotas de O.S"""
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.services import rollup_service
+from conftest import nova_os
+
+
+def _total_dashboard(client, headers) -> int:
+    return client.get("/api/v1/relatorios/dashboard", headers=headers).json()["totais"]["total"]
+
+
+def test_escrita_fora_das_rotas_e_corrigida(client, admin_headers):
+    client.post("/api/v1/os", json=nova_os(), headers=admin_headers)
+    rollup_service.conferir()  # outros testes também gravam direto no banco
+    assert rollup_service.conferir() is None
+    antes = _total_dashboard(client, admin_headers)
+
+    # Como um script ou SQL manual: a O.S entra sem passar pelos rollups
+    db = SessionLocal()
+    try:
+        db.execute(text(
+            "INSERT INTO ordens_servico (numero_os, tecnico_campo_id, foto_caixa, tipo_os, status, criado_em) "
+            "VALUES ('OS-MANUAL-1', 1, 'x', 'normal', 'aguardando', CURRENT_TIMESTAMP)"
+        ))
+        db.commit()
+        assert "aguardando" in rollup_service.divergencias(db)
+    finally:
+        db.close()
+
+    assert rollup_service.conferir() is not None
+    assert _total_dashboard(client, admin_headers) == antes + 1
+    db = SessionLocal()
+    try:
+        assert rollup_service.divergencias(db) == {}
+    finally:
+        db.close()
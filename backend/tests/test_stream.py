@@ -0,0 +1,58 @@
+"""/os/stream: ticket curto em vez do JWT na URL e visibilidade por papel"""
+import pytest
+from fastapi import HTTPException
+
+import app.routes.os as rotas
+from app.models.user import User
+
+TECNICO = User(id=3, username="tecnico1", role="execucao")
+
+
+def _evento(status, tecnico_executor_id, status_anterior, tipo="assumida"):
+    return {
+        "id": 1,
+        "tipo": tipo,
+        "os": {"id": 10, "numero_os": "OS-2026-010", "status": status, "tipo_os": "normal",
+               "cidade": "Sorocaba", "tecnico_executor_id": tecnico_executor_id},
+        "status_anterior": status_anterior,
+        "em": "2026-10-18T12:00:00",
+    }
+
+
+def test_ticket_abre_o_stream_mas_nao_vale_como_token(client, admin_headers):
+    resposta = client.post("/api/v1/os/stream/ticket", headers=admin_headers)
+    assert resposta.status_code == 200
+    ticket = resposta.json()["ticket"]
+
+    assert rotas._usuario_do_stream(ticket, None).username == "admin"
+    assert client.get("/api/v1/os", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+
+
+def test_token_de_acesso_nao_serve_como_ticket(client, admin_headers):
+    token = admin_headers["Authorization"].split()[1]
+
+    with pytest.raises(HTTPException) as erro:
+        rotas._usuario_do_stream(token, None)
+    assert erro.value.status_code == 401
+    # O JWT na query string não é mais aceito
+    assert client.get("/api/v1/os/stream", params={"token": token}).status_code == 401
+
+
+def test_execucao_so_ve_a_fila_e_as_proprias():
+    assert rotas._evento_para(_evento("aguardando", None, None, "criada"), TECNICO)["os"]["cidade"] == "Sorocaba"
+    assert rotas._evento_para(_evento("em_andamento", 3, "aguardando"), TECNICO)["tipo"] == "assumida"
+    assert rotas._evento_para(_evento("concluido", 5, "em_andamento", "finalizada"), TECNICO) is None
+
+
+def test_assumida_por_outro_chega_so_como_remocao():
+    evento = rotas._evento_para(_evento("em_andamento", 5, "aguardando"), TECNICO)
+
+    assert evento["tipo"] == "removida"
+    assert evento["os"] == {"id": 10}
+
+
+def test_admin_ve_tudo():
+    admin = User(id=1, username="admin", role="admin")
+    evento = _evento("em_andamento", 5, "aguardando")
+
+    assert rotas._evento_para(evento, admin) is evento
@@ -6,10 +6,17 @@ const API_BASE_URL = window.location.origin.includes('localhost') || window.loca
     ? 'http://localhost:8000/api/v1'
     : window.location.origin + '/api/v1';
 
+const ETAG_CACHE_MAX = 50;
+
+// Espera antes de pedir um novo ticket do stream de O.S
+const STREAM_RECONNECT_MS = 3000;
+
 class APIClient {
     constructor() {
         this.token = localStorage.getItem('access_token');
         this.user = JSON.parse(localStorage.getItem('user') || 'null');
+        // Últimas respostas por URL, revalidadas com If-None-Match
+        this.etagCache = new Map();
     }
 
     /**
@@ -44,6 +51,36 @@ class APIClient {
         return response.json();
     }
 
+    /**
+     * GET condicional: envia o ETag da última resposta da mesma URL
+     * (If-None-Match) e, em 304, reaproveita o corpo já recebido.
+     * Retorna { data, headers }.
+     */
+    async conditionalGet(url) {
+        const headers = this.getHeaders();
+        const cached = this.etagCache.get(url);
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
+
+        const response = await fetch(url, { headers });
+        if (response.status === 304 && cached) {
+            return cached;
+        }
+
+        const data = await this.handleResponse(response);
+        const entry = { data, headers: response.headers, etag: response.headers.get('ETag') };
+        this.etagCache.delete(url);
+        if (entry.etag) {
+            this.etagCache.set(url, entry);
+            // Mantém só as URLs mais recentes
+            if (this.etagCache.size > ETAG_CACHE_MAX) {
+                this.etagCache.delete(this.etagCache.keys().next().value);
+            }
+        }
+        return entry;
+    }
+
     /**
      * Authentication
      */
@@ -68,6 +105,7 @@ class APIClient {
     logout() {
         this.token = null;
         this.user = null;
+        this.etagCache.clear();
         localStorage.removeItem('access_token');
         localStorage.removeItem('user');
         window.location.href = 'index.html';
@@ -84,7 +122,7 @@ class APIClient {
     /**
      * Ordens de Serviço
      */
-    async getOrdensList(filters = {}) {
+    ordensUrl(filters = {}) {
         const params = new URLSearchParams();
 
         if (filters.status) params.append('status_filter', filters.status);
@@ -93,15 +131,28 @@ class APIClient {
         if (filters.search) params.append('search', filters.search);
         if (filters.limit) params.append('limit', filters.limit);
         if (filters.offset) params.append('offset', filters.offset);
+        if (filters.cursor) params.append('cursor', filters.cursor);
 
         const queryString = params.toString();
-        const url = `${API_BASE_URL}/os${queryString ? '?' + queryString : ''}`;
+        return `${API_BASE_URL}/os${queryString ? '?' + queryString : ''}`;
+    }
 
-        const response = await fetch(url, {
-            headers: this.getHeaders(),
-        });
+    async getOrdensList(filters = {}) {
+        const { data } = await this.conditionalGet(this.ordensUrl(filters));
+        return data;
+    }
 
-        return this.handleResponse(response);
+    /**
+     * Página de O.S com paginação por cursor.
+     * Retorna { items, next_cursor, has_more } a partir dos headers X-Next-Cursor / X-Has-More.
+     */
+    async getOrdensPage(filters = {}) {
+        const { data, headers } = await this.conditionalGet(this.ordensUrl(filters));
+        return {
+            items: data,
+            next_cursor: headers.get('X-Next-Cursor'),
+            has_more: headers.get('X-Has-More') === 'true',
+        };
     }
 
     async getOrdensRompimentoManutencao() {
@@ -114,11 +165,8 @@ class APIClient {
     }
 
     async getOrdemById(id) {
-        const response = await fetch(`${API_BASE_URL}/os/${id}`, {
-            headers: this.getHeaders(),
-        });
-
-        return this.handleResponse(response);
+        const { data } = await this.conditionalGet(`${API_BASE_URL}/os/${id}`);
+        return data;
     }
 
     async assumirOrdem(id, tecnicoExecutorId) {
@@ -144,6 +192,41 @@ class APIClient {
         return this.handleResponse(response);
     }
 
+    // Operações em lote: a resposta traz o resultado de cada O.S (resultados[].status_code)
+    async assumirOrdens(ids, tecnicoExecutorId) {
+        const response = await fetch(`${API_BASE_URL}/os/batch/assumir`, {
+            method: 'PATCH',
+            headers: this.getHeaders(),
+            body: JSON.stringify({ os_ids: ids, tecnico_executor_id: tecnicoExecutorId }),
+        });
+
+        return this.handleResponse(response);
+    }
+
+    async finalizarOrdens(ids, fotoComprovacao, observacoes = null) {
+        const response = await fetch(`${API_BASE_URL}/os/batch/finalizar`, {
+            method: 'PATCH',
+            headers: this.getHeaders(),
+            body: JSON.stringify({
+                os_ids: ids,
+                foto_comprovacao: fotoComprovacao,
+                observacoes: observacoes,
+            }),
+        });
+
+        return this.handleResponse(response);
+    }
+
+    async reatribuirOrdens(ids, tecnicoExecutorId) {
+        const response = await fetch(`${API_BASE_URL}/os/batch/reatribuir`, {
+            method: 'PATCH',
+            headers: this.getHeaders(),
+            body: JSON.stringify({ os_ids: ids, tecnico_executor_id: tecnicoExecutorId }),
+        });
+
+        return this.handleResponse(response);
+    }
+
     async finalizarOrdemComFoto(id, fotoFile, observacoes = null) {
         // Create FormData to send file
         const formData = new FormData();
@@ -187,11 +270,71 @@ class APIClient {
      * Dashboard / Reports
      */
     async getDashboard() {
-        const response = await fetch(`${API_BASE_URL}/relatorios/dashboard`, {
-            headers: this.getHeaders(),
-        });
+        const { data } = await this.conditionalGet(`${API_BASE_URL}/relatorios/dashboard`);
+        return data;
+    }
 
-        return this.handleResponse(response);
+    /**
+     * Atualizações em tempo real (Server-Sent Events)
+     *
+     * Chama onChange (com debounce) sempre que uma O.S é criada, assumida,
+     * finalizada, editada ou removida - substitui o polling das telas.
+     * O EventSource não envia headers: a conexão usa um ticket curto de
+     * POST /os/stream/ticket em vez do JWT na URL. O navegador reconecta
+     * sozinho com Last-Event-ID; se o ticket já expirou, a conexão é
+     * fechada e reaberta com um ticket novo a partir do último evento.
+     */
+    subscribeOrdens(onChange, debounceMs = 500) {
+        if (!this.token || typeof EventSource === 'undefined') return null;
+
+        let source = null;
+        let lastEventId = null;
+        let closed = false;
+        let timer = null;
+        const notify = (event) => {
+            if (event.lastEventId) lastEventId = event.lastEventId;
+            clearTimeout(timer);
+            timer = setTimeout(() => onChange(event), debounceMs);
+        };
+
+        const connect = async () => {
+            let ticket;
+            try {
+                const response = await fetch(`${API_BASE_URL}/os/stream/ticket`, {
+                    method: 'POST',
+                    headers: this.getHeaders(),
+                });
+                ({ ticket } = await this.handleResponse(response));
+            } catch (error) {
+                if (!closed) setTimeout(connect, STREAM_RECONNECT_MS);
+                return;
+            }
+            if (closed) return;
+
+            const params = new URLSearchParams({ ticket });
+            if (lastEventId) params.append('last_event_id', lastEventId);
+            source = new EventSource(`${API_BASE_URL}/os/stream?${params}`);
+            ['criada', 'assumida', 'finalizada', 'atualizada', 'removida', 'resync'].forEach((tipo) => {
+                source.addEventListener(tipo, notify);
+            });
+            source.onerror = () => {
+                // CLOSED: o navegador desistiu (ticket expirado na reconexão)
+                if (source.readyState === EventSource.CLOSED && !closed) {
+                    setTimeout(connect, STREAM_RECONNECT_MS);
+                }
+            };
+        };
+
+        const subscription = {
+            close() {
+                closed = true;
+                clearTimeout(timer);
+                if (source) source.close();
+            },
+        };
+        window.addEventListener('beforeunload', () => subscription.close());
+        connect();
+        return subscription;
     }
 
     /**
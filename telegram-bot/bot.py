@@ -14,7 +14,6 @@ Fluxo de conversação:
 import logging
 import threading
 from http.server import BaseHTTPRequestHandler, HTTPServer
-import os
 import sys
 from datetime import datetime, timedelta, timezone
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, KeyboardButton
@@ -27,7 +26,9 @@ from telegram.ext import (
     filters,
 )
 import config
-from services import upload_photo_to_cloudinary, create_os_via_api, check_api_health
+from services import upload_photo, create_os_batch_via_api, check_api_health, close_client, OSRejeitada
+from outbox import Outbox
+import webhook
 import time
 import asyncio
 
@@ -55,6 +56,10 @@ logger = logging.getLogger(__name__)
 # User data default
 TECNICO_ID_DEFAULT = 1  # Admin ID
 
+# O.S confirmadas aguardando entrega à API (ver processar_outbox)
+outbox = Outbox(config.OUTBOX_PATH)
+_outbox_lock = asyncio.Lock()
+
 # Menu helpers
 def get_main_menu_keyboard():
     return ReplyKeyboardMarkup(
@@ -129,7 +134,8 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "🤖 *Status do Sistema*\n\n"
         f"✅ *Bot:* Ativo e Online\n"
         f"📡 *API:* {'✅ Online' if api_status else '❌ Offline'}\n"
-        f"⏱️ *Latência:* {latency}ms\n\n"
+        f"⏱️ *Latência:* {latency}ms\n"
+        f"📮 *O.S na fila de envio:* {outbox.total()}\n\n"
         f"🏠 *Ambiente:* Render (Free Tier)\n"
         "> Nota: Se a API estiver offline, ela pode estar acordando (hibernação)."
     )
@@ -139,7 +145,7 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def abrir_os(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start the OS opening process by requesting location"""
     logger.info(f"Bot: Comando 'abrir_os' recebido de {update.effective_user.username}")
-    context.user_data.clear()
+    limpar_conversa(context)
     context.user_data["tipo_os"] = "normal"
     
     location_keyboard = ReplyKeyboardMarkup(
@@ -162,7 +168,7 @@ async def abrir_os(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def abrir_rompimento(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Inicia fluxo de Rompimento - mesmo fluxo de abrir_os, mas já seta tipo_os"""
     logger.info(f"Bot: Comando 'Rompimento' recebido de {update.effective_user.username}")
-    context.user_data.clear()
+    limpar_conversa(context)
     context.user_data["tipo_os"] = "rompimento"  # Pré-define, mas pode mudar se escolher outro motivo
     
     # Mesmo fluxo: pedir localização primeiro
@@ -186,7 +192,7 @@ async def abrir_rompimento(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def abrir_manutencao(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Inicia fluxo de Manutenções - mesmo fluxo de abrir_os, mas já seta tipo_os"""
     logger.info(f"Bot: Comando 'Manutenções' recebido de {update.effective_user.username}")
-    context.user_data.clear()
+    limpar_conversa(context)
     context.user_data["tipo_os"] = "manutencao"  # Pré-define, mas pode mudar se escolher outro motivo
     
     # Mesmo fluxo: pedir localização primeiro
@@ -448,6 +454,73 @@ async def receive_motivo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return POWER_METER
 
+# Fotos: download + upload em background. O handler só guarda o file_id e
+# responde na hora; `confirmation` espera as tarefas pendentes.
+FOTO_LABELS = {
+    "foto_power_meter": "Power Meter",
+    "foto_caixa": "Caixa / Local",
+    "print_os_cliente": "Print O.S",
+}
+
+async def _baixar_e_enviar(bot, file_id: str, filename: str) -> str:
+    """Download a Telegram photo and upload it, retrying with backoff"""
+    for tentativa in range(1, config.PHOTO_UPLOAD_RETRIES + 1):
+        try:
+            photo_file = await bot.get_file(file_id)
+            photo_bytes = await photo_file.download_as_bytearray()
+            return await upload_photo(bytes(photo_bytes), filename=filename)
+        except Exception as e:
+            if tentativa == config.PHOTO_UPLOAD_RETRIES:
+                raise
+            logger.warning(f"⚠️ Upload {filename} falhou (tentativa {tentativa}): {e}")
+            await asyncio.sleep(2 ** tentativa)
+
+def agendar_upload(context: ContextTypes.DEFAULT_TYPE, campo: str, file_id: str, filename: str):
+    """Start (or restart) the background upload of a photo field"""
+    if config.PHOTO_STORAGE == "telegram":
+        # Sem download aqui: o backend busca a foto pelo file_id depois de criar a O.S
+        context.user_data.setdefault("fotos_telegram", {})[campo] = file_id
+        return
+    uploads = context.user_data.setdefault("uploads", {})
+    anterior = uploads.get(campo)
+    if anterior and not anterior["tarefa"].done():
+        anterior["tarefa"].cancel()
+    tarefa = asyncio.create_task(_baixar_e_enviar(context.bot, file_id, filename))
+    tarefa.add_done_callback(_registrar_falha)
+    uploads[campo] = {"file_id": file_id, "filename": filename, "tarefa": tarefa}
+
+def _registrar_falha(tarefa: asyncio.Task):
+    # Lê a exceção mesmo se a conversa foi abandonada (evita "never retrieved")
+    if not tarefa.cancelled() and tarefa.exception():
+        logger.warning(f"⚠️ Upload em background falhou: {tarefa.exception()}")
+
+async def aguardar_uploads(context: ContextTypes.DEFAULT_TYPE) -> list:
+    """
+    Wait for every pending photo upload and store the URLs in user_data.
+
+    Returns the labels of the photos that failed; those are scheduled again,
+    so confirming once more retries only them.
+    """
+    uploads = context.user_data.get("uploads", {})
+    campos = list(uploads)
+    resultados = await asyncio.gather(*(uploads[c]["tarefa"] for c in campos), return_exceptions=True)
+
+    falhas = []
+    for campo, resultado in zip(campos, resultados):
+        if isinstance(resultado, BaseException):
+            falhas.append(FOTO_LABELS.get(campo, campo))
+            agendar_upload(context, campo, uploads[campo]["file_id"], uploads[campo]["filename"])
+        else:
+            context.user_data[campo] = resultado
+    return falhas
+
+def limpar_conversa(context: ContextTypes.DEFAULT_TYPE):
+    """Cancel pending uploads and reset the conversation data"""
+    for upload in context.user_data.get("uploads", {}).values():
+        if not upload["tarefa"].done():
+            upload["tarefa"].cancel()
+    context.user_data.clear()
+
 async def receive_power_meter(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive and process power meter photo"""
     if not update.message.photo:
@@ -456,12 +529,7 @@ async def receive_power_meter(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     photo = update.message.photo[-1]
     try:
-        photo_file = await context.bot.get_file(photo.file_id)
-        photo_bytes = await photo_file.download_as_bytearray()
-        
-        await update.message.reply_text("📤 Fazendo upload...")
-        photo_url = upload_photo_to_cloudinary(photo_bytes, filename=f"pm_{update.effective_user.id}")
-        context.user_data["foto_power_meter"] = photo_url
+        agendar_upload(context, "foto_power_meter", photo.file_id, f"pm_{update.effective_user.id}")
         
         tipo_os = context.user_data.get("tipo_os", "normal")
         
@@ -506,22 +574,15 @@ async def receive_caixa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     tipo_os = context.user_data.get("tipo_os", "normal")
     
     try:
-        photo_file = await context.bot.get_file(photo.file_id)
-        photo_bytes = await photo_file.download_as_bytearray()
-        
-        await update.message.reply_text("📤 Fazendo upload...")
-        
-        # Nome do arquivo baseado no tipo
+        # Nome do arquivo baseado no tipo (mesmo campo foto_caixa para os três)
         if tipo_os == "rompimento":
-            photo_url = upload_photo_to_cloudinary(photo_bytes, filename=f"rompimento_{update.effective_user.id}")
-            context.user_data["foto_caixa"] = photo_url  # Usa mesmo campo, mas é foto do rompimento
+            agendar_upload(context, "foto_caixa", photo.file_id, f"rompimento_{update.effective_user.id}")
             
             # Para rompimento: pular print O.S e PPPOE, ir direto para confirmação
             await show_confirmation_rompimento(update, context)
             return CONFIRMACAO
         elif tipo_os == "manutencao":
-            photo_url = upload_photo_to_cloudinary(photo_bytes, filename=f"manutencao_{update.effective_user.id}")
-            context.user_data["foto_caixa"] = photo_url  # Usa mesmo campo, mas é foto do local da manutenção
+            agendar_upload(context, "foto_caixa", photo.file_id, f"manutencao_{update.effective_user.id}")
             
             # Para manutenção: pular print O.S, mas pedir PPPOE
             await update.message.reply_text(
@@ -532,8 +593,7 @@ async def receive_caixa(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return PPPOE
         else:
             # O.S normal: continuar com print O.S
-            photo_url = upload_photo_to_cloudinary(photo_bytes, filename=f"cx_{update.effective_user.id}")
-            context.user_data["foto_caixa"] = photo_url
+            agendar_upload(context, "foto_caixa", photo.file_id, f"cx_{update.effective_user.id}")
             
             await update.message.reply_text(
                 "✅ Foto Caixa recebida!\n\n"
@@ -572,12 +632,7 @@ async def receive_print_os(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     photo = update.message.photo[-1]
     try:
-        photo_file = await context.bot.get_file(photo.file_id)
-        photo_bytes = await photo_file.download_as_bytearray()
-        
-        await update.message.reply_text("📤 Fazendo upload...")
-        photo_url = upload_photo_to_cloudinary(photo_bytes, filename=f"print_{update.effective_user.id}")
-        context.user_data["print_os_cliente"] = photo_url
+        agendar_upload(context, "print_os_cliente", photo.file_id, f"print_{update.effective_user.id}")
         
         await update.message.reply_text(
             "✅ Print O.S recebido!\n\n"
@@ -666,6 +721,19 @@ async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     response = update.message.text.strip()
     if "Confirmar" in response:
         await update.message.reply_text("📤 Enviando O.S...", reply_markup=ReplyKeyboardRemove())
+        
+        # Fotos ainda subindo em background: espera todas (falhas são reagendadas)
+        falhas = await aguardar_uploads(context)
+        if falhas:
+            keyboard = ReplyKeyboardMarkup([["✅ Confirmar"], ["❌ Cancelar Operação"]], one_time_keyboard=True, resize_keyboard=True)
+            await update.message.reply_text(
+                f"❌ Falha no envio da(s) foto(s): *{', '.join(falhas)}*.\n"
+                "Já estamos tentando de novo, toque em *Confirmar* para reenviar.",
+                parse_mode="Markdown",
+                reply_markup=keyboard
+            )
+            return CONFIRMACAO
+        
         try:
             tipo_os = context.user_data.get("tipo_os", "normal")
             prazo_fim = None
@@ -677,7 +745,7 @@ async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
             os_data = {
                 "tecnico_campo_id": TECNICO_ID_DEFAULT,
                 "foto_power_meter": context.user_data.get("foto_power_meter"),  # Opcional (não existe para rompimento/manutenção)
-                "foto_caixa": context.user_data["foto_caixa"],  # Pode ser foto do rompimento/manutenção
+                "foto_caixa": context.user_data.get("foto_caixa"),  # Pode ser foto do rompimento/manutenção
                 "localizacao_lat": context.user_data["localizacao_lat"],
                 "localizacao_lng": context.user_data["localizacao_lng"],
                 "localizacao_precisao": context.user_data.get("localizacao_precisao"),
@@ -696,26 +764,20 @@ async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             if context.user_data.get("pppoe_cliente"):
                 os_data["pppoe_cliente"] = context.user_data["pppoe_cliente"]
-            result = await create_os_via_api(os_data)
             
-            # Mensagem com informações adicionais para rompimento/manutenção
-            tipo_label = {"rompimento": "🔧 Rompimento", "manutencao": "⚙️ Manutenção"}.get(tipo_os, "📋 O.S Normal")
-            msg = f"✅ *{tipo_label} criada!*\nNº: *{result['numero_os']}*\n"
-            if tipo_os in ["rompimento", "manutencao"]:
-                horas = context.user_data.get("prazo_horas")
-                porta = context.user_data.get("porta_placa_olt")
-                if horas:
-                    msg += f"⏰ Prazo: *{horas} horas*\n"
-                if porta:
-                    msg += f"🔌 Porta: *{porta}*\n"
-            msg += "\nEm breve um técnico assumirá a execução."
+            if context.user_data.get("fotos_telegram"):
+                os_data["fotos_telegram"] = context.user_data["fotos_telegram"]
+            
+            # Gravado no outbox antes de responder: a entrega é do worker
+            outbox.add(update.effective_chat.id, os_data)
+            context.application.create_task(processar_outbox(context))
             
             await update.message.reply_text(
-                msg,
+                "✅ *O.S recebida!*\nVocê receberá o número assim que ela for registrada no sistema.",
                 parse_mode="Markdown",
                 reply_markup=get_main_menu_keyboard()
             )
-            context.user_data.clear()
+            limpar_conversa(context)
             return ConversationHandler.END
         except Exception as e:
             logger.error(f"Error creating OS: {e}")
@@ -725,10 +787,66 @@ async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Cancelado.", reply_markup=get_main_menu_keyboard())
         return ConversationHandler.END
 
+def _mensagem_os_criada(os_data: dict, numero_os: str) -> str:
+    """Message sent to the technician once the API assigned the OS number"""
+    tipo_os = os_data.get("tipo_os", "normal")
+    tipo_label = {"rompimento": "🔧 Rompimento", "manutencao": "⚙️ Manutenção"}.get(tipo_os, "📋 O.S Normal")
+    msg = f"✅ *{tipo_label} criada!*\nNº: *{numero_os}*\n"
+    if tipo_os in ["rompimento", "manutencao"]:
+        horas = os_data.get("prazo_horas")
+        porta = os_data.get("porta_placa_olt")
+        if horas:
+            msg += f"⏰ Prazo: *{horas} horas*\n"
+        if porta:
+            msg += f"🔌 Porta: *{porta}*\n"
+    msg += "\nEm breve um técnico assumirá a execução."
+    return msg
+
+async def _avisar_tecnico(context: ContextTypes.DEFAULT_TYPE, chat_id: int, texto: str):
+    try:
+        await context.bot.send_message(chat_id, texto, parse_mode="Markdown", reply_markup=get_main_menu_keyboard())
+    except Exception as e:
+        logger.error(f"📮 Falha ao avisar o chat {chat_id}: {e}")
+
+async def processar_outbox(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Deliver due outbox entries to the API
+    
+    Runs right after each confirmation and periodically from the JobQueue.
+    Entries are sent in batches (one POST /os/batch each); transient failures
+    are retried with exponential backoff and refusals (4xx) are reported to
+    the technician.
+    """
+    if _outbox_lock.locked():
+        return  # outra execução já está esvaziando a fila
+    async with _outbox_lock:
+        while True:
+            lote = outbox.pendentes(config.OUTBOX_BATCH_SIZE)
+            if not lote:
+                return
+            try:
+                resultados = await create_os_batch_via_api([envio["dados"] for envio in lote])
+            except Exception as e:
+                resultados = [e] * len(lote)
+            for envio, resultado in zip(lote, resultados):
+                if isinstance(resultado, OSRejeitada):
+                    outbox.remover(envio["id"])
+                    await _avisar_tecnico(context, envio["chat_id"], f"❌ Erro ao criar O.S: {resultado}")
+                elif isinstance(resultado, BaseException):
+                    atraso = min(
+                        config.OUTBOX_BACKOFF_SECONDS * 2 ** envio["tentativas"],
+                        config.OUTBOX_BACKOFF_MAX_SECONDS
+                    )
+                    outbox.adiar(envio["id"], atraso, str(resultado))
+                    logger.warning(f"📮 Envio {envio['id']} falhou ({resultado}), nova tentativa em {atraso}s")
+                else:
+                    outbox.remover(envio["id"])
+                    await _avisar_tecnico(context, envio["chat_id"], _mensagem_os_criada(envio["dados"], resultado["numero_os"]))
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancel conversation"""
     await update.message.reply_text("❌ Operação cancelada.", reply_markup=get_main_menu_keyboard())
-    context.user_data.clear()
+    limpar_conversa(context)
     return ConversationHandler.END
 
 async def api_heartbeat(context: ContextTypes.DEFAULT_TYPE):
@@ -747,8 +865,22 @@ def main():
     if not config.TELEGRAM_BOT_TOKEN:
         logger.error("❌ TOKEN não configurado!")
         return
+    if config.BOT_MODE == "webhook" and not config.WEBHOOK_URL:
+        logger.error("❌ BOT_MODE=webhook exige WEBHOOK_URL!")
+        return
     
-    application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+    async def post_shutdown(application):
+        """Fecha o cliente HTTP compartilhado com a API"""
+        await close_client()
+    
+    application = (
+        Application.builder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .base_url(f"{config.TELEGRAM_API_URL}/bot")
+        .base_file_url(f"{config.TELEGRAM_API_URL}/file/bot")
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     async def prazo_handler_wrapper(update, context):
         """Wrapper para escolher handler correto baseado no tipo_os"""
@@ -809,6 +941,14 @@ def main():
     if application.job_queue:
         application.job_queue.run_repeating(api_heartbeat, interval=480, first=10)
         logger.info("💓 Heartbeat da API agendado (8min).")
+        # Reentrega do outbox (inclui envios que sobraram da execução anterior)
+        application.job_queue.run_repeating(processar_outbox, interval=config.OUTBOX_INTERVAL_SECONDS, first=2)
+        logger.info(f"📮 Outbox agendado ({config.OUTBOX_INTERVAL_SECONDS}s, {outbox.total()} pendente(s)).")
+    
+    if config.BOT_MODE == "webhook":
+        logger.info("🤖 Bot configurado. Iniciando webhook...")
+        asyncio.run(webhook.servir(application, {"bot_outbox_pendentes": outbox.total}))
+        return
     
     logger.info("🤖 Bot configurado. Iniciando polling...")
     try:
@@ -841,7 +981,7 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
 
 def run_health_check_server():
     try:
-        port = int(os.environ.get("PORT", "10000"))
+        port = config.PORT
         server = HTTPServer(('0.0.0.0', port), HealthCheckHandler)
         logger.info(f"📡 Servidor Health Check rodando na porta {port}")
         server.serve_forever()
@@ -850,8 +990,9 @@ def run_health_check_server():
 
 if __name__ == "__main__":
     logger.info("🎬 Iniciando processo principal do Bot...")
-    # Health check em thread separada
-    threading.Thread(target=run_health_check_server, daemon=True).start()
+    # Health check em thread separada (no webhook o próprio servidor do bot responde)
+    if config.BOT_MODE != "webhook":
+        threading.Thread(target=run_health_check_server, daemon=True).start()
     
     # NAO REINICIAR AUTOMATICAMENTE - deixar o launcher controlar
     try:
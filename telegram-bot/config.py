@@ -12,13 +12,58 @@ except UnicodeEncodeError:
 # Telegram
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+# Servidor da Bot API (troque por http://localhost:8081 para usar o fake_telegram.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+
+# Recebimento de updates: "polling" (getUpdates) ou "webhook" (Telegram chama WEBHOOK_URL)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # URL pública do bot, ex: https://os-sistema-bot.onrender.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Padrão: derivado do token
+
+# Porta HTTP (health check no polling; webhook + health + métricas no webhook)
+PORT = int(os.getenv("PORT", "10000"))
+
 # API Backend
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 API_ENDPOINT_CREATE_OS = f"{API_BASE_URL}/api/v1/os"
+API_ENDPOINT_CREATE_OS_BATCH = f"{API_BASE_URL}/api/v1/os/batch"
+API_ENDPOINT_FOTOS = f"{API_BASE_URL}/api/v1/fotos"
+API_ENDPOINT_LOGIN = f"{API_BASE_URL}/api/v1/auth/login"
+
+# Usuário com que o bot abre as O.S
+API_USERNAME = os.getenv("API_USERNAME", "admin")
+API_PASSWORD = os.getenv("API_PASSWORD", "admin123")
+
+# Cliente HTTP compartilhado: conexões mantidas abertas entre envios
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", "10"))
+API_KEEPALIVE_SECONDS = float(os.getenv("API_KEEPALIVE_SECONDS", "60"))
+
+# Renova o token este tanto antes de expirar
+API_TOKEN_REFRESH_SECONDS = int(os.getenv("API_TOKEN_REFRESH_SECONDS", "300"))
 
 # Cloudinary
 CLOUDINARY_URL = os.getenv("CLOUDINARY_URL")
 
+# Onde as fotos são salvas: "cloudinary" (direto, pelo SDK), "api" (POST /fotos
+# do backend, que usa o armazenamento configurado nele: Cloudinary ou disco local)
+# ou "telegram" (só o file_id vai na O.S; o backend baixa e salva em background,
+# exige TELEGRAM_BOT_TOKEN no backend)
+PHOTO_STORAGE = os.getenv("PHOTO_STORAGE", "cloudinary" if CLOUDINARY_URL else "api")
+
+# Tentativas de download+upload de cada foto (em background, com backoff)
+PHOTO_UPLOAD_RETRIES = int(os.getenv("PHOTO_UPLOAD_RETRIES", "3"))
+
+# Índice local hash -> URL das fotos já enviadas (evita reenviar a mesma foto)
+PHOTO_INDEX_PATH = os.getenv("PHOTO_INDEX_PATH", "fotos_index.db")
+
+# Fila local das O.S confirmadas: entregues à API em background, com backoff
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.db")
+OUTBOX_INTERVAL_SECONDS = int(os.getenv("OUTBOX_INTERVAL_SECONDS", "10"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "10"))
+OUTBOX_BACKOFF_SECONDS = int(os.getenv("OUTBOX_BACKOFF_SECONDS", "5"))
+OUTBOX_BACKOFF_MAX_SECONDS = int(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "600"))
+
 # Validation
 MAX_LOCATION_PRECISION_METERS = 5.0  # Maximum acceptable GPS precision
 MIN_POWER_METER_DBM = -21.0  # Minimum acceptable power meter value
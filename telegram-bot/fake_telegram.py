@@ -0,0 +1,166 @@
+"""
+Fake Telegram Bot API for testing the bot offline.
+
+Implements the few Bot API methods the bot uses (getMe, setWebhook,
+deleteWebhook, getUpdates, sendMessage, getFile + file download) and a
+control API to play the technician:
+
+    POST /_fake/updates   {"chat_id": 42, "text": "/start"}
+                          {"chat_id": 42, "location": {"latitude": -23.5, "longitude": -46.6}}
+                          {"chat_id": 42, "foto": true}
+    GET  /_fake/mensagens?chat_id=42   messages the bot sent
+
+Updates are POSTed to the registered webhook or queued for getUpdates.
+
+Uso:
+    python fake_telegram.py --port 8081
+    TELEGRAM_API_URL=http://localhost:8081 BOT_MODE=webhook WEBHOOK_URL=http://localhost:10000 python bot.py
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import time
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+BOT_USER = {"id": 1000, "is_bot": True, "first_name": "OS Bot (fake)", "username": "os_fake_bot"}
+
+_ids = itertools.count(1)
+_webhook = {"url": "", "secret_token": None}
+_fila = asyncio.Queue()  # updates aguardando getUpdates (sem webhook)
+_mensagens = []
+_arquivos = {}
+
+
+def _foto_teste() -> bytes:
+    try:
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGB", (640, 480), (200, 120, 40)).save(buffer, "JPEG")
+        return buffer.getvalue()
+    except ImportError:
+        return b"\xff\xd8\xff\xe0fake-jpeg\xff\xd9"
+
+
+def _ok(resultado) -> JSONResponse:
+    return JSONResponse({"ok": True, "result": resultado})
+
+
+def _chat(chat_id: int) -> dict:
+    return {"id": chat_id, "type": "private", "first_name": "Tecnico", "username": f"tecnico{chat_id}"}
+
+
+async def _parametros(request: Request) -> dict:
+    """Bot API parameters: query string, JSON body or a form with JSON-encoded values (PTB)"""
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return {**request.query_params, **await request.json()}
+    parametros = {}
+    for nome, valor in [*request.query_params.items(), *(await request.form()).items()]:
+        try:
+            parametros[nome] = json.loads(valor)
+        except (TypeError, ValueError):
+            parametros[nome] = valor
+    return parametros
+
+
+async def bot_api(request: Request) -> Response:
+    metodo = request.path_params["metodo"].lower()
+    p = await _parametros(request)
+
+    if metodo == "getme":
+        return _ok(BOT_USER)
+    if metodo == "setwebhook":
+        _webhook.update(url=p.get("url", ""), secret_token=p.get("secret_token"))
+        return _ok(True)
+    if metodo == "deletewebhook":
+        _webhook.update(url="", secret_token=None)
+        return _ok(True)
+    if metodo == "getwebhookinfo":
+        return _ok({"url": _webhook["url"], "has_custom_certificate": False, "pending_update_count": _fila.qsize()})
+    if metodo == "getupdates":
+        if _webhook["url"]:
+            return JSONResponse({"ok": False, "error_code": 409, "description": "Conflict: can't use getUpdates method while webhook is active"}, status_code=409)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(_fila.get(), timeout=min(float(p.get("timeout") or 0), 10.0)))
+        except asyncio.TimeoutError:
+            pass
+        while not _fila.empty():
+            updates.append(_fila.get_nowait())
+        return _ok(updates)
+    if metodo == "sendmessage":
+        mensagem = {
+            "message_id": next(_ids),
+            "date": int(time.time()),
+            "chat": _chat(int(p["chat_id"])),
+            "from": BOT_USER,
+            "text": p.get("text", ""),
+        }
+        _mensagens.append(mensagem)
+        return _ok(mensagem)
+    if metodo == "getfile":
+        return _ok({"file_id": p["file_id"], "file_unique_id": p["file_id"], "file_path": f"photos/{p['file_id']}.jpg"})
+    # Demais métodos (setMyCommands, sendChatAction...): aceita e ignora
+    return _ok(True)
+
+
+async def baixar_arquivo(request: Request) -> Response:
+    file_id = request.path_params["caminho"].rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    if file_id not in _arquivos:
+        return Response(status_code=404)
+    return Response(_arquivos[file_id], media_type="image/jpeg")
+
+
+async def enviar_update(request: Request) -> Response:
+    """Control API: build an update as if the technician had sent it"""
+    p = await request.json()
+    chat_id = int(p.get("chat_id", 42))
+    mensagem = {"message_id": next(_ids), "date": int(time.time()), "chat": _chat(chat_id), "from": {**_chat(chat_id), "is_bot": False}}
+    if "text" in p:
+        mensagem["text"] = p["text"]
+        if p["text"].startswith("/"):
+            mensagem["entities"] = [{"type": "bot_command", "offset": 0, "length": len(p["text"].split()[0])}]
+    if "location" in p:
+        mensagem["location"] = p["location"]
+    if p.get("foto"):
+        file_id = f"foto{next(_ids)}"
+        _arquivos[file_id] = _foto_teste()
+        mensagem["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 480, "file_size": len(_arquivos[file_id])}]
+    update = {"update_id": next(_ids), "message": mensagem}
+
+    if _webhook["url"]:
+        cabecalhos = {"X-Telegram-Bot-Api-Secret-Token": _webhook["secret_token"]} if _webhook["secret_token"] else {}
+        async with httpx.AsyncClient() as client:
+            resposta = await client.post(_webhook["url"], json=update, headers=cabecalhos)
+        return JSONResponse({"update": update, "webhook_status": resposta.status_code})
+    await _fila.put(update)
+    return JSONResponse({"update": update, "webhook_status": None})
+
+
+async def listar_mensagens(request: Request) -> Response:
+    chat_id = request.query_params.get("chat_id")
+    return JSONResponse([m for m in _mensagens if chat_id is None or str(m["chat"]["id"]) == chat_id])
+
+
+app = Starlette(
+    routes=[
+        Route("/bot{token}/{metodo}", bot_api, methods=["GET", "POST"]),
+        Route("/file/bot{token}/{caminho:path}", baixar_arquivo),
+        Route("/_fake/updates", enviar_update, methods=["POST"]),
+        Route("/_fake/mensagens", listar_mensagens),
+    ]
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,77 @@
+"""
+Durable outbox of OS submissions.
+
+The confirmation is written here and acknowledged at once; a JobQueue worker
+(bot.processar_outbox) delivers pending entries to the API with exponential
+backoff, so a cold or slow API never makes the technician start over. Each
+entry carries a `chave_envio` that the API uses to ignore resends.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+
+class Outbox:
+    """SQLite queue of OS payloads waiting to be delivered (thread-safe)"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS envios ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "chat_id INTEGER NOT NULL, "
+            "dados TEXT NOT NULL, "
+            "tentativas INTEGER NOT NULL DEFAULT 0, "
+            "proxima_tentativa REAL NOT NULL, "
+            "ultimo_erro TEXT, "
+            "criado_em TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self._conn.commit()
+
+    def add(self, chat_id: int, dados: dict) -> int:
+        """Queue an OS for delivery, due immediately"""
+        dados = dict(dados, chave_envio=uuid.uuid4().hex)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO envios (chat_id, dados, proxima_tentativa) VALUES (?, ?, ?)",
+                (chat_id, json.dumps(dados), time.time())
+            )
+            self._conn.commit()
+        return cursor.lastrowid
+
+    def pendentes(self, limite: int) -> List[dict]:
+        """Oldest entries whose next attempt is due"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chat_id, dados, tentativas FROM envios "
+                "WHERE proxima_tentativa <= ? ORDER BY id LIMIT ?",
+                (time.time(), limite)
+            ).fetchall()
+        return [
+            {"id": id_, "chat_id": chat_id, "dados": json.loads(dados), "tentativas": tentativas}
+            for id_, chat_id, dados, tentativas in rows
+        ]
+
+    def adiar(self, id_: int, atraso: float, erro: Optional[str] = None) -> None:
+        """Record a failed attempt and schedule the next one `atraso` seconds from now"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE envios SET tentativas = tentativas + 1, proxima_tentativa = ?, ultimo_erro = ? "
+                "WHERE id = ?",
+                (time.time() + atraso, erro, id_)
+            )
+            self._conn.commit()
+
+    def remover(self, id_: int) -> None:
+        """Drop a delivered (or permanently rejected) entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM envios WHERE id = ?", (id_,))
+            self._conn.commit()
+
+    def total(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM envios").fetchone()[0]
@@ -0,0 +1,38 @@
+"""
+Local SHA-256 -> URL index of uploaded photos.
+
+Technicians often resend the same gallery photo (e.g. the same print of the
+client OS on several orders); a hit skips the upload entirely.
+"""
+import sqlite3
+import threading
+from typing import Optional
+
+
+class PhotoIndex:
+    """Small SQLite table shared by the bot's handlers (thread-safe)"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fotos ("
+            "sha256 TEXT PRIMARY KEY, "
+            "url TEXT NOT NULL, "
+            "criado_em TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self._conn.commit()
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT url FROM fotos WHERE sha256 = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, digest: str, url: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO fotos (sha256, url) VALUES (?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET url = excluded.url",
+                (digest, url)
+            )
+            self._conn.commit()
@@ -1,9 +1,15 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
 import httpx
 import cloudinary
 import cloudinary.uploader
 from io import BytesIO
 import config
 import logging
+from photo_index import PhotoIndex
 
 logger_bot = logging.getLogger(__name__)
 
@@ -11,14 +17,89 @@ logger_bot = logging.getLogger(__name__)
 if config.CLOUDINARY_URL:
     cloudinary.config(cloudinary_url=config.CLOUDINARY_URL)
 
+photo_index = PhotoIndex(config.PHOTO_INDEX_PATH)
+
+
+class OSRejeitada(Exception):
+    """The API refused the OS itself (4xx): resending the same payload won't help"""
+
+# Cliente HTTP único do bot: conexões keep-alive reaproveitadas entre envios
+_client = None
+
+# Token do bot em cache até pouco antes de expirar
+_token = None
+_token_exp = 0.0
+_token_lock = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared connection-pooled client (created on first use)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=45.0,
+            limits=httpx.Limits(
+                max_connections=config.API_MAX_CONNECTIONS,
+                max_keepalive_connections=config.API_MAX_CONNECTIONS,
+                keepalive_expiry=config.API_KEEPALIVE_SECONDS
+            )
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client (bot shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _token_expiry(token: str) -> float:
+    """`exp` claim of a JWT (no signature check: only used to schedule the refresh)"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        # Sem exp legível: renova no próximo intervalo padrão
+        return time.time() + config.API_TOKEN_REFRESH_SECONDS
+
+
+async def get_token(force: bool = False) -> str:
+    """
+    Bot access token, logging in only when there is none or it is about to expire
+    
+    Concurrent callers share a single login.
+    """
+    global _token, _token_exp, _token_lock
+    if _token_lock is None:
+        _token_lock = asyncio.Lock()
+    
+    async with _token_lock:
+        if force or _token is None or time.time() >= _token_exp - config.API_TOKEN_REFRESH_SECONDS:
+            _token = await _login(get_client())
+            _token_exp = _token_expiry(_token)
+        return _token
+
+
+async def _request_autenticado(method: str, url: str, **kwargs) -> httpx.Response:
+    """Authenticated request; a 401 (token revoked/rotated) logs in again and retries once"""
+    token = await get_token()
+    response = await get_client().request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+    if response.status_code == 401:
+        logger_bot.warning("🔑 Token recusado pela API, renovando login.")
+        token = await get_token(force=True)
+        response = await get_client().request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+    return response
+
 
 async def check_api_health() -> bool:
     """Check if the backend API is reachable"""
     try:
         base_url = config.API_BASE_URL.rstrip("/")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{base_url}/keepalive", timeout=10.0)
-            return response.status_code == 200
+        response = await get_client().get(f"{base_url}/keepalive", timeout=10.0)
+        return response.status_code == 200
     except Exception as e:
         logger_bot.debug(f"Health check failed: {e}")
         return False
@@ -42,64 +123,147 @@ def upload_photo_to_cloudinary(photo_bytes: bytes, filename: str = "photo") -> s
         raise Exception(f"Erro ao fazer upload: {str(e)}")
 
 
+async def _login(client: httpx.AsyncClient) -> str:
+    """Log in to the API as the bot user and return the access token"""
+    auth_url = config.API_ENDPOINT_LOGIN
+    logger_bot.info(f"🔑 Bot iniciando login em: {auth_url}")
+    
+    login_response = await client.post(
+        auth_url,
+        json={"username": config.API_USERNAME, "password": config.API_PASSWORD}
+    )
+    
+    logger_bot.info(f"📡 Resposta Login: {login_response.status_code}")
+    
+    if login_response.status_code != 200:
+        logger_bot.error(f"❌ Falha no login do Bot: {login_response.text}")
+        raise Exception("Falha na autenticação com o servidor.")
+        
+    logger_bot.info("✅ Token obtido com sucesso.")
+    return login_response.json()["access_token"]
+
+
+async def upload_photo_via_api(photo_bytes: bytes, filename: str = "photo") -> str:
+    """
+    Upload a photo through the backend (POST /fotos), which stores it on its
+    configured backend (Cloudinary or local storage)
+    """
+    try:
+        response = await _request_autenticado(
+            "POST",
+            config.API_ENDPOINT_FOTOS,
+            files={"foto": (f"{filename}.jpg", photo_bytes, "image/jpeg")},
+            data={"pasta": "os-sistema/telegram"},
+            timeout=60.0
+        )
+        if response.status_code != 201:
+            raise Exception(f"API retornou {response.status_code}: {response.text}")
+        return response.json()["url"]
+    except Exception as e:
+        raise Exception(f"Erro ao fazer upload: {str(e)}")
+
+
+async def upload_photo(photo_bytes: bytes, filename: str = "photo") -> str:
+    """
+    Upload a photo to the configured storage (PHOTO_STORAGE) and return its URL
+    
+    Photos already sent (same bytes) reuse the stored URL without uploading.
+    """
+    digest = hashlib.sha256(photo_bytes).hexdigest()
+    url = photo_index.get(digest)
+    if url:
+        logger_bot.info(f"♻️ Foto repetida, reutilizando: {url}")
+        return url
+    
+    # Hash no nome: fotos diferentes do mesmo técnico não sobrescrevem umas às outras
+    filename = f"{filename}_{digest[:16]}"
+    if config.PHOTO_STORAGE == "api":
+        url = await upload_photo_via_api(photo_bytes, filename)
+    else:
+        # SDK síncrono: fora do event loop para não travar os outros usuários
+        url = await asyncio.to_thread(upload_photo_to_cloudinary, photo_bytes, filename)
+    
+    photo_index.put(digest, url)
+    return url
+
+
 async def create_os_via_api(os_data: dict) -> dict:
     """
-    Create an Ordem de Serviço via API (Authenticating as Admin)
+    Create an Ordem de Serviço via API (authenticated as the bot user)
+    
+    Raises OSRejeitada when the API refuses the payload; any other error is
+    transient (timeout, connection, 5xx) and the call can be retried.
     """
-    async with httpx.AsyncClient(timeout=45.0) as client:
-        try:
-            # 1. Login to get token
-            clean_endpoint = config.API_ENDPOINT_CREATE_OS.rstrip("/")
-            if clean_endpoint.endswith("/os"):
-                base_url = clean_endpoint[:-3]
-            else:
-                base_url = clean_endpoint
-                
-            auth_url = f"{base_url}/auth/login"
-            logger_bot.info(f"🔑 Bot iniciando login em: {auth_url}")
-            
-            login_response = await client.post(
-                auth_url,
-                json={"username": "admin", "password": "admin123"}
-            )
-            
-            logger_bot.info(f"📡 Resposta Login: {login_response.status_code}")
-            
-            if login_response.status_code != 200:
-                logger_bot.error(f"❌ Falha no login do Bot: {login_response.text}")
-                raise Exception("Falha na autenticação com o servidor.")
-                
-            token = login_response.json()["access_token"]
-            logger_bot.info("✅ Token obtido com sucesso.")
-            
-            # 2. Create OS with Token
-            logger_bot.info(f"📤 Enviando O.S para: {config.API_ENDPOINT_CREATE_OS}")
-            response = await client.post(
-                config.API_ENDPOINT_CREATE_OS,
-                json=os_data,
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            
-            logger_bot.info(f"📡 Resposta Criação O.S: {response.status_code}")
-            
-            if response.status_code == 201:
-                res_json = response.json()
-                logger_bot.info(f"✅ O.S criada com sucesso: {res_json.get('numero_os')}")
-                return res_json
-            else:
-                try:
-                    error_detail = response.json().get("detail", "Erro desconhecido")
-                except:
-                    error_detail = response.text
-                logger_bot.error(f"❌ API retornou erro {response.status_code}: {error_detail}")
-                raise Exception(f"Servidor retornou erro: {error_detail}")
+    try:
+        logger_bot.info(f"📤 Enviando O.S para: {config.API_ENDPOINT_CREATE_OS}")
+        response = await _request_autenticado("POST", config.API_ENDPOINT_CREATE_OS, json=os_data)
         
-        except httpx.TimeoutException:
-            logger_bot.error("❌ Timeout ao conectar com a API")
-            raise Exception("O servidor demorou muito para responder. Tente novamente.")
-        except httpx.RequestError as e:
-            logger_bot.error(f"❌ Erro de conexão com a API: {str(e)}")
-            raise Exception("Não foi possível conectar ao servidor. Tente novamente em instantes.")
-        except Exception as e:
-            logger_bot.error(f"❌ Erro inesperado: {str(e)}")
-            raise e
+        logger_bot.info(f"📡 Resposta Criação O.S: {response.status_code}")
+        
+        # 200: reenvio de uma chave_envio que a API já tinha registrado
+        if response.status_code in (200, 201):
+            res_json = response.json()
+            logger_bot.info(f"✅ O.S criada com sucesso: {res_json.get('numero_os')}")
+            return res_json
+        else:
+            try:
+                error_detail = response.json().get("detail", "Erro desconhecido")
+            except:
+                error_detail = response.text
+            logger_bot.error(f"❌ API retornou erro {response.status_code}: {error_detail}")
+            if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                raise OSRejeitada(f"Servidor recusou a O.S: {error_detail}")
+            raise Exception(f"Servidor retornou erro: {error_detail}")
+    
+    except httpx.TimeoutException:
+        logger_bot.error("❌ Timeout ao conectar com a API")
+        raise Exception("O servidor demorou muito para responder. Tente novamente.")
+    except httpx.RequestError as e:
+        logger_bot.error(f"❌ Erro de conexão com a API: {str(e)}")
+        raise Exception("Não foi possível conectar ao servidor. Tente novamente em instantes.")
+    except OSRejeitada:
+        raise
+    except Exception as e:
+        logger_bot.error(f"❌ Erro inesperado: {str(e)}")
+        raise e
+
+
+async def create_os_batch_via_api(ordens: list) -> list:
+    """
+    Create many Ordens de Serviço in one POST /os/batch (outbox backlog)
+    
+    Returns one entry per order, in order: the API result (with numero_os)
+    or an OSRejeitada. Raises when the whole call fails (transient).
+    """
+    try:
+        logger_bot.info(f"📤 Enviando lote de {len(ordens)} O.S para: {config.API_ENDPOINT_CREATE_OS_BATCH}")
+        response = await _request_autenticado("POST", config.API_ENDPOINT_CREATE_OS_BATCH, json={"ordens": ordens})
+    except httpx.TimeoutException:
+        logger_bot.error("❌ Timeout ao conectar com a API")
+        raise Exception("O servidor demorou muito para responder. Tente novamente.")
+    except httpx.RequestError as e:
+        logger_bot.error(f"❌ Erro de conexão com a API: {str(e)}")
+        raise Exception("Não foi possível conectar ao servidor. Tente novamente em instantes.")
+    
+    logger_bot.info(f"📡 Resposta Criação em lote: {response.status_code}")
+    
+    # API sem /os/batch, ou uma O.S inválida derrubando o lote inteiro (422):
+    # enviadas uma a uma, só a inválida é recusada
+    if response.status_code in (404, 405, 422):
+        return await asyncio.gather(*(create_os_via_api(o) for o in ordens), return_exceptions=True)
+    if response.status_code != 200:
+        try:
+            error_detail = response.json().get("detail", "Erro desconhecido")
+        except:
+            error_detail = response.text
+        logger_bot.error(f"❌ API retornou erro {response.status_code}: {error_detail}")
+        raise Exception(f"Servidor retornou erro: {error_detail}")
+    
+    resultados = []
+    for item in response.json()["resultados"]:
+        # 200: reenvio de uma chave_envio que a API já tinha registrado
+        if item["status_code"] in (200, 201):
+            resultados.append(item)
+        else:
+            resultados.append(OSRejeitada(f"Servidor recusou a O.S: {item['detail']}"))
+    return resultados
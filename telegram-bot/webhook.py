@@ -0,0 +1,118 @@
+"""
+Webhook mode (BOT_MODE=webhook): Telegram POSTs each update to this process.
+
+A small Starlette app served by uvicorn on the bot's own event loop receives
+the updates and hands them to the PTB Application, and also answers the
+platform health check and /metrics. No getUpdates long polling, so two
+instances never fight over the token ("Conflict: terminated by other
+getUpdates request"): the last one to call setWebhook receives the updates.
+"""
+import contextlib
+import hashlib
+import logging
+import signal
+import time
+from typing import Callable, Dict, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class _Servidor(uvicorn.Server):
+    """
+    uvicorn re-raises SIGINT/SIGTERM once serve() returns, killing the process
+    before the Application shuts down; here the signal only stops the server
+    """
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        anteriores = {sinal: signal.signal(sinal, self.handle_exit) for sinal in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            yield
+        finally:
+            for sinal, handler in anteriores.items():
+                signal.signal(sinal, handler)
+
+
+def segredo_webhook() -> str:
+    """Secret Telegram echoes in X-Telegram-Bot-Api-Secret-Token (WEBHOOK_SECRET or derived from the token)"""
+    return config.WEBHOOK_SECRET or hashlib.sha256(config.TELEGRAM_BOT_TOKEN.encode()).hexdigest()
+
+
+def criar_app(application: Application, metricas_extras: Optional[Dict[str, Callable[[], float]]] = None) -> Starlette:
+    """ASGI app: POST WEBHOOK_PATH (updates), GET / and /health, GET /metrics"""
+    segredo = segredo_webhook()
+    inicio = time.monotonic()
+    contadores = {"bot_updates_recebidos_total": 0, "bot_updates_rejeitados_total": 0}
+
+    async def receber_update(request: Request) -> Response:
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != segredo:
+            contadores["bot_updates_rejeitados_total"] += 1
+            return Response(status_code=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except Exception as e:
+            logger.warning(f"📨 Update inválido recebido no webhook: {e}")
+            contadores["bot_updates_rejeitados_total"] += 1
+            return Response(status_code=400)
+        # Responde já: o processamento segue na fila do PTB, no mesmo event loop
+        await application.update_queue.put(update)
+        contadores["bot_updates_recebidos_total"] += 1
+        return Response()
+
+    async def health(request: Request) -> Response:
+        return PlainTextResponse("Bot is alive!")
+
+    async def metricas(request: Request) -> Response:
+        valores = dict(contadores)
+        valores["bot_update_queue_tamanho"] = application.update_queue.qsize()
+        valores["bot_uptime_segundos"] = round(time.monotonic() - inicio, 1)
+        for nome, obter in (metricas_extras or {}).items():
+            valores[nome] = obter()
+        return PlainTextResponse("".join(f"{nome} {valor}\n" for nome, valor in valores.items()))
+
+    return Starlette(routes=[
+        Route(config.WEBHOOK_PATH, receber_update, methods=["POST"]),
+        Route("/", health),
+        Route("/health", health),
+        Route("/metrics", metricas),
+    ])
+
+
+async def servir(application: Application, metricas_extras: Optional[Dict[str, Callable[[], float]]] = None) -> None:
+    """Register the webhook with Telegram and serve until the process is stopped"""
+    url = config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH
+    servidor = _Servidor(uvicorn.Config(
+        criar_app(application, metricas_extras),
+        host="0.0.0.0",
+        port=config.PORT,
+        log_level="warning"
+    ))
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        # Sem deleteWebhook na saída: numa troca de instância a nova já registrou o dela
+        await application.bot.set_webhook(
+            url=url,
+            allowed_updates=Update.ALL_TYPES,
+            secret_token=segredo_webhook()
+        )
+        logger.info(f"📨 Webhook registrado em {url} (porta {config.PORT})")
+        await application.start()
+        try:
+            await servidor.serve()
+        finally:
+            await application.stop()
+            logger.info("📨 Servidor do webhook parado.")
+    if application.post_shutdown:
+        await application.post_shutdown(application)